@@ -30,8 +30,16 @@ class GeometricMatchInfo(object):
 
 class SymbolicMatchLibrary(object):
     @staticmethod
-    def matches_instance(symb_instance, instance):
-        return symb_instance == instance
+    def matches_instance(symb_instance, instance, max_distance=0):
+        if max_distance == 0:
+            return symb_instance == instance
+        return len(symb_instance) == len(instance) and SymbolicMatchLibrary.hamming_distance(symb_instance, instance) <= max_distance
+
+    @staticmethod
+    def hamming_distance(symb_instance, instance):
+        '''Returns the number of differing bits between two equally long bit strings.
+        '''
+        return bin(int(symb_instance, 2) ^ int(instance, 2)).count('1')
 
 class GeometricMatchLibrary(object):
     @staticmethod
@@ -45,3 +53,158 @@ class GeometricMatchLibrary(object):
             return GeometricMatchDescriptions.JUST_AS_FAR
         else:
             return GeometricMatchDescriptions.FARTHER
+
+class HammingBKTree(object):
+    '''A BK-tree of equally long bit strings, which finds all strings within
+    a given Hamming distance from a query string without comparing the query
+    with all strings in the tree.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self):
+        #each node is a list [bit string, packed bit string, dictionary of children indexed by distance]
+        self.root = None
+        self.size = 0
+
+    def add(self, bit_string):
+        code = int(bit_string, 2)
+        if self.root is None:
+            self.root = [bit_string, code, dict()]
+            self.size = 1
+            return
+
+        node = self.root
+        while True:
+            distance = bin(node[1] ^ code).count('1')
+            if distance == 0:
+                return
+
+            if distance not in node[2]:
+                node[2][distance] = [bit_string, code, dict()]
+                self.size += 1
+                return
+            node = node[2][distance]
+
+    def find(self, bit_string, max_distance):
+        '''Returns a list of (distance, bit string) tuples of the strings
+        whose Hamming distance from 'bit_string' is at most 'max_distance'.
+        '''
+        matches = list()
+        if self.root is None:
+            return matches
+
+        code = int(bit_string, 2)
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            distance = bin(node[1] ^ code).count('1')
+            if distance <= max_distance:
+                matches.append((distance, node[0]))
+
+            #by the triangle inequality, only the children whose distance from the node
+            #differs from 'distance' by at most 'max_distance' can contain matches
+            for child_distance, child in node[2].iteritems():
+                if abs(child_distance - distance) <= max_distance:
+                    nodes.append(child)
+        return matches
+
+class SymbolicMatchIndex(object):
+    '''An inverted index that maps a problem instance and a symbolic delta representation
+    to the objects whose learned representation for the instance is exactly the given one,
+    such that the symbolic matches of a pair of objects can be found without
+    comparing the pair with all memorised representations. Representations within
+    a given Hamming distance from a query are found using a 'HammingBKTree'
+    of the representations of each instance.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self):
+        #the version of the memory from which the index was built
+        self.version = None
+
+        #a dictionary in which each key is an (instance key, delta representation) tuple;
+        #the value corresponding to each key is a list of object keys
+        self.object_keys = dict()
+
+        #a dictionary of the indexed representations, in which each key is an (object key, instance key) tuple
+        self.representations = dict()
+
+        #a dictionary in which each key is an (instance key, representation length) tuple;
+        #the value corresponding to each key is a 'HammingBKTree' of the representations of the instance
+        self.trees = dict()
+
+        #a dictionary with the number of representations that were removed from each tree
+        self.removed_representations = dict()
+
+    def add(self, object_key, instance_key, representation):
+        self.remove(object_key, instance_key)
+        if not representation:
+            return
+
+        key = (instance_key, representation)
+        if key not in self.object_keys:
+            self.object_keys[key] = list()
+            self._get_tree(instance_key, len(representation)).add(representation)
+        self.object_keys[key].append(object_key)
+        self.representations[(object_key, instance_key)] = representation
+
+    def remove(self, object_key, instance_key):
+        representation = self.representations.pop((object_key, instance_key), None)
+        if representation is None:
+            return
+
+        key = (instance_key, representation)
+        self.object_keys[key].remove(object_key)
+        if len(self.object_keys[key]) == 0:
+            del self.object_keys[key]
+
+            #BK-trees don't support removals, so removed representations are skipped
+            #in the search results and a tree is rebuilt once half of its nodes are removed
+            tree_key = (instance_key, len(representation))
+            self.removed_representations[tree_key] += 1
+            if self.removed_representations[tree_key] * 2 > self.trees[tree_key].size:
+                self._rebuild_tree(tree_key)
+
+    def get_objects(self, instance_key, representation):
+        '''Returns a list of the keys of the objects whose learned representation
+        for 'instance_key' matches 'representation'.
+        '''
+        return self.object_keys.get((instance_key, representation), list())
+
+    def get_similar_objects(self, instance_key, representation, max_distance):
+        '''Returns a list of (distance, object key, representation) tuples of the objects
+        whose learned representation for 'instance_key' differs from 'representation'
+        in at most 'max_distance' bits. The list is sorted by distance.
+        '''
+        tree_key = (instance_key, len(representation))
+        if tree_key not in self.trees:
+            return list()
+
+        similar_objects = list()
+        for distance, indexed_representation in sorted(self.trees[tree_key].find(representation, max_distance)):
+            for object_key in self.object_keys.get((instance_key, indexed_representation), list()):
+                similar_objects.append((distance, object_key, indexed_representation))
+        return similar_objects
+
+    def clear(self):
+        self.version = None
+        self.object_keys = dict()
+        self.representations = dict()
+        self.trees = dict()
+        self.removed_representations = dict()
+
+    def _get_tree(self, instance_key, representation_length):
+        tree_key = (instance_key, representation_length)
+        if tree_key not in self.trees:
+            self.trees[tree_key] = HammingBKTree()
+            self.removed_representations[tree_key] = 0
+        return self.trees[tree_key]
+
+    def _rebuild_tree(self, tree_key):
+        self.trees[tree_key] = HammingBKTree()
+        self.removed_representations[tree_key] = 0
+        for instance_key, representation in self.object_keys:
+            if instance_key == tree_key[0] and len(representation) == tree_key[1]:
+                self.trees[tree_key].add(representation)
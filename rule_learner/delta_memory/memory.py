@@ -17,183 +17,192 @@
     along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
 '''
 
-import couchdb
-from matches import SymbolicMatchLibrary, GeometricMatchLibrary, GeometricMatchDescriptions, GeometricMatchInfo
+import uuid
+from storage import StorageTypes, StorageConflict, DocumentNotFound, create_storage
+from matches import SymbolicMatchIndex, GeometricMatchLibrary, GeometricMatchDescriptions, GeometricMatchInfo
 
 class MemoryDocumentKeys(object):
     OBJECTS = 'objects'
     SYMBOLIC_DATA = 'symbolic'
     GEOMETRIC_DATA = 'geometric'
+    SYMBOLIC_INDEX = 'symbolic_index'
+    GEOMETRIC_INDEX = 'geometric_index'
+    SYMBOLIC_LINKS = 'symbolic_links'
+    GEOMETRIC_LINKS = 'geometric_links'
     DATA = 'data'
     DELTA = 'delta'
     FULL = 'full'
     LINKS = 'links'
     DATA_FILE_NAMES = 'data_file_names'
     DATA_OBJECT_MAPPINGS = 'data_object_mappings'
+    DATA_VERSION = 'data_version'
     DELETED_INSTANCES = 'deleted_instances'
     TOTAL_RETRIEVALS = 'total_retrievals'
     SUCCESSFUL_RETRIEVALS = 'successful_retrievals'
 
 class DeltaMemory(object):
-    def __init__(self, db_name, knowledge_base):
+    '''An interface to a memory of learned delta models.
+
+    The memory consists of one document per object/instance pair and model type
+    ('MemoryDocumentKeys.SYMBOLIC_DATA' and 'MemoryDocumentKeys.GEOMETRIC_DATA'),
+    one document with the retrieval statistics of each pair
+    ('MemoryDocumentKeys.SYMBOLIC_LINKS' and 'MemoryDocumentKeys.GEOMETRIC_LINKS'),
+    and two index documents that map each object to its instances, such that
+    updating the model or the statistics of a pair only touches the documents of that pair.
+    The documents are kept in a 'delta_memory.storage.Storage' object.
+
+    Symbolic matches are looked up in an in-memory 'delta_memory.matches.SymbolicMatchIndex',
+    which is updated by 'add_symbolic_data' and 'remove_symbolic_instance' and rebuilt
+    if the symbolic data were changed by another 'DeltaMemory' object.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, db_name, knowledge_base, storage=None):
+        '''
+        Keyword arguments:
+        db_name -- Name of the memory database.
+        knowledge_base -- A 'knowledge_base.KnowledgeBase' object.
+        storage -- A 'delta_memory.storage.Storage' object in which the memory is kept;
+                   if None, a CouchDB database with the name 'db_name' is used (default None).
+
+        '''
         self.db_name = db_name
         self.kb = knowledge_base
+        self.symbolic_match_index = SymbolicMatchIndex()
+        self.storage = storage
+        if self.storage is None:
+            self.storage = create_storage(self.db_name, StorageTypes.COUCHDB)
 
-        self.db_server = couchdb.Server()
-        if self.db_name not in self.db_server:
-            self._create_db()
-        self.em = self.db_server[self.db_name]
+        if self.storage.has_document(MemoryDocumentKeys.SYMBOLIC_DATA):
+            raise RuntimeError('%s uses the old memory layout; run migrate_delta_memory.py to convert it' % self.db_name)
+        self._create_db()
 
     def _create_db(self):
-        db = self.db_server.create(self.db_name)
-        db[MemoryDocumentKeys.OBJECTS] = { MemoryDocumentKeys.OBJECTS : list() }
-        db[MemoryDocumentKeys.SYMBOLIC_DATA] = dict()
-        db[MemoryDocumentKeys.GEOMETRIC_DATA] = dict()
+        def create_objects(doc):
+            if MemoryDocumentKeys.OBJECTS in doc:
+                return False
+            doc[MemoryDocumentKeys.OBJECTS] = list()
+            return True
+        self._update_document(create_objects, MemoryDocumentKeys.OBJECTS)
+
+        self._add_to_index(MemoryDocumentKeys.SYMBOLIC_INDEX)
+        self._add_to_index(MemoryDocumentKeys.GEOMETRIC_INDEX)
 
     def add_object(self, object_key):
-        doc = self.em[MemoryDocumentKeys.OBJECTS]
-        if object_key not in doc[MemoryDocumentKeys.OBJECTS]:
+        def add_object_key(doc):
+            if object_key in doc[MemoryDocumentKeys.OBJECTS]:
+                return False
             doc[MemoryDocumentKeys.OBJECTS].append(object_key)
-            self.em.save(doc)
+            return True
+        self._update_document(add_object_key, MemoryDocumentKeys.OBJECTS)
 
-        doc = self.em[MemoryDocumentKeys.SYMBOLIC_DATA]
-        if object_key not in doc:
-            doc[object_key] = { MemoryDocumentKeys.DATA : dict(), MemoryDocumentKeys.LINKS : dict(), MemoryDocumentKeys.DELETED_INSTANCES : dict() }
-            self.em.save(doc)
-
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-        if object_key not in doc:
-            doc[object_key] = { MemoryDocumentKeys.DATA : dict(), MemoryDocumentKeys.DATA_FILE_NAMES : dict(), MemoryDocumentKeys.DATA_OBJECT_MAPPINGS : dict(), MemoryDocumentKeys.LINKS : dict(), MemoryDocumentKeys.DELETED_INSTANCES : dict() }
-            self.em.save(doc)
+        self._add_to_index(MemoryDocumentKeys.SYMBOLIC_INDEX, object_key)
+        self._add_to_index(MemoryDocumentKeys.GEOMETRIC_INDEX, object_key)
 
     def add_symbolic_data(self, object_key, instance_key, symbolic_data, full_symbolic_data):
-        doc = self.em[MemoryDocumentKeys.SYMBOLIC_DATA]
-        if object_key not in doc:
-            doc[object_key] = { MemoryDocumentKeys.DATA : dict(), MemoryDocumentKeys.LINKS : dict(), MemoryDocumentKeys.DELETED_INSTANCES : dict() }
-
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key] = dict()
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key][MemoryDocumentKeys.DELTA] = symbolic_data
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key][MemoryDocumentKeys.FULL] = full_symbolic_data
-
-        doc[object_key][MemoryDocumentKeys.LINKS][instance_key] = dict()
-        doc[object_key][MemoryDocumentKeys.LINKS][instance_key][object_key] = { MemoryDocumentKeys.TOTAL_RETRIEVALS : '0', MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS : '0' }
-
-        if instance_key not in doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES]:
-            doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES][instance_key] = list()
-        self.em.save(doc)
+        def set_data(doc):
+            doc[MemoryDocumentKeys.DELTA] = symbolic_data
+            doc[MemoryDocumentKeys.FULL] = full_symbolic_data
+            if MemoryDocumentKeys.DELETED_INSTANCES not in doc:
+                doc[MemoryDocumentKeys.DELETED_INSTANCES] = list()
+            return True
+        self._update_document(set_data, MemoryDocumentKeys.SYMBOLIC_DATA, object_key, instance_key)
+        self._reset_links(MemoryDocumentKeys.SYMBOLIC_LINKS, object_key, instance_key)
+
+        previous_version, version = self._add_to_index(MemoryDocumentKeys.SYMBOLIC_INDEX, object_key, instance_key, update_version=True)
+        if previous_version == self.symbolic_match_index.version:
+            self.symbolic_match_index.add(object_key, instance_key, symbolic_data)
+            self.symbolic_match_index.version = version
 
     def add_geometric_data(self, object_key, instance_key, geometric_data, data_file_names, data_object_mappings):
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-        if object_key not in doc:
-            doc[object_key] = { MemoryDocumentKeys.DATA : dict(), MemoryDocumentKeys.DATA_FILE_NAMES : dict(), MemoryDocumentKeys.DATA_OBJECT_MAPPINGS : dict(), MemoryDocumentKeys.LINKS : dict(), MemoryDocumentKeys.DELETED_INSTANCES : dict() }
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key] = geometric_data
-        doc[object_key][MemoryDocumentKeys.DATA_FILE_NAMES][instance_key] = data_file_names
-        doc[object_key][MemoryDocumentKeys.DATA_OBJECT_MAPPINGS][instance_key] = data_object_mappings
-
-        doc[object_key][MemoryDocumentKeys.LINKS][instance_key] = dict()
-        doc[object_key][MemoryDocumentKeys.LINKS][instance_key][object_key] = { MemoryDocumentKeys.TOTAL_RETRIEVALS : '0', MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS : '0' }
-
-        if instance_key not in doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES]:
-            doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES][instance_key] = list()
-        self.em.save(doc)
+        def set_data(doc):
+            doc[MemoryDocumentKeys.DATA] = geometric_data
+            doc[MemoryDocumentKeys.DATA_FILE_NAMES] = data_file_names
+            doc[MemoryDocumentKeys.DATA_OBJECT_MAPPINGS] = data_object_mappings
+            doc[MemoryDocumentKeys.DATA_VERSION] = uuid.uuid4().hex
+            if MemoryDocumentKeys.DELETED_INSTANCES not in doc:
+                doc[MemoryDocumentKeys.DELETED_INSTANCES] = list()
+            return True
+        self._update_document(set_data, MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key)
+        self._reset_links(MemoryDocumentKeys.GEOMETRIC_LINKS, object_key, instance_key)
+        self._add_to_index(MemoryDocumentKeys.GEOMETRIC_INDEX, object_key, instance_key)
 
     def add_gsm(self, object_key, instance_key, pdf, boundaries):
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key].append(pdf)
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key].append(boundaries)
-        self.em.save(doc)
+        def append_gsm(doc):
+            doc[MemoryDocumentKeys.DATA].append(pdf)
+            doc[MemoryDocumentKeys.DATA].append(boundaries)
+            return True
+        self._update_document(append_gsm, MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key, create=False)
 
     def update_symbolic_link(self, object1_key, object2_key, instance_key, success):
-        doc = self.em[MemoryDocumentKeys.SYMBOLIC_DATA]
-
-        #use arbitrary precision arithmetic instead of integers
-        total_retrievals = int(doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.TOTAL_RETRIEVALS])
-        successful_retrievals = int(doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS])
-
-        total_retrievals += 1
-        if success:
-            successful_retrievals += 1
-
-        doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.TOTAL_RETRIEVALS] = str(total_retrievals)
-        doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS] = str(successful_retrievals)
-
-        self.em.save(doc)
+        self._update_link(MemoryDocumentKeys.SYMBOLIC_LINKS, object1_key, object2_key, instance_key, success)
 
     def update_geometric_link(self, object1_key, object2_key, instance_key, success):
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-
-        #use arbitrary precision arithmetic instead of integers
-        total_retrievals = int(doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.TOTAL_RETRIEVALS])
-        successful_retrievals = int(doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS])
-
-        total_retrievals += 1
-        if success:
-            successful_retrievals += 1
-
-        doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.TOTAL_RETRIEVALS] = str(total_retrievals)
-        doc[object1_key][MemoryDocumentKeys.LINKS][instance_key][object2_key][MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS] = str(successful_retrievals)
-
-        self.em.save(doc)
+        self._update_link(MemoryDocumentKeys.GEOMETRIC_LINKS, object1_key, object2_key, instance_key, success)
 
     def remove_symbolic_instance(self, object_key, instance_key):
-        doc = self.em[MemoryDocumentKeys.SYMBOLIC_DATA]
-        if object_key not in doc:
+        if not self.storage.has_document(MemoryDocumentKeys.SYMBOLIC_DATA, object_key, instance_key):
             return
 
-        #adding the representation to the list of deleted ones in order to avoid learning it again
-        if instance_key not in doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES]:
-            doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES][instance_key] = list()
-        doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES][instance_key].append(doc[object_key][MemoryDocumentKeys.DATA][instance_key][FULL])
+        def remove_data(doc):
+            #adding the representation to the list of deleted ones in order to avoid learning it again
+            doc[MemoryDocumentKeys.DELETED_INSTANCES].append(doc[MemoryDocumentKeys.FULL])
 
-        #removing the representation
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key][MemoryDocumentKeys.DELTA] = ''
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key][MemoryDocumentKeys.FULL] = ''
-        doc[object_key][MemoryDocumentKeys.LINKS][instance_key] = dict()
+            #removing the representation
+            doc[MemoryDocumentKeys.DELTA] = ''
+            doc[MemoryDocumentKeys.FULL] = ''
+            return True
+        self._update_document(remove_data, MemoryDocumentKeys.SYMBOLIC_DATA, object_key, instance_key, create=False)
+        self._clear_links(MemoryDocumentKeys.SYMBOLIC_LINKS, object_key, instance_key)
 
-        self.em.save(doc)
+        previous_version, version = self._add_to_index(MemoryDocumentKeys.SYMBOLIC_INDEX, object_key, instance_key, update_version=True)
+        if previous_version == self.symbolic_match_index.version:
+            self.symbolic_match_index.remove(object_key, instance_key)
+            self.symbolic_match_index.version = version
 
     def remove_geometric_instance(self, object_key, instance_key):
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-        if object_key not in doc:
+        if not self.storage.has_document(MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key):
             return
 
-        #adding the representation to the list of deleted ones in order to avoid learning it again
-        if instance_key not in doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES]:
-            doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES][instance_key] = list()
-        doc[object_key][MemoryDocumentKeys.DELETED_INSTANCES][instance_key].append(doc[object_key][MemoryDocumentKeys.DATA][instance_key])
-
-        #removing the representation
-        doc[object_key][MemoryDocumentKeys.DATA][instance_key] = list()
-        doc[object_key][MemoryDocumentKeys.LINKS][instance_key] = dict()
+        def remove_data(doc):
+            #adding the representation to the list of deleted ones in order to avoid learning it again
+            doc[MemoryDocumentKeys.DELETED_INSTANCES].append(doc[MemoryDocumentKeys.DATA])
 
-        self.em.save(doc)
+            #removing the representation
+            doc[MemoryDocumentKeys.DATA] = list()
+            doc[MemoryDocumentKeys.DATA_VERSION] = uuid.uuid4().hex
+            return True
+        self._update_document(remove_data, MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key, create=False)
+        self._clear_links(MemoryDocumentKeys.GEOMETRIC_LINKS, object_key, instance_key)
 
     def get_symbolic_data(self, object_key, instance_key):
-        doc = self.em[MemoryDocumentKeys.SYMBOLIC_DATA]
-        data = doc[object_key][MemoryDocumentKeys.DATA][instance_key][MemoryDocumentKeys.DELTA]
-        return data
+        doc = self._get_document(MemoryDocumentKeys.SYMBOLIC_DATA, object_key, instance_key)
+        return doc[MemoryDocumentKeys.DELTA]
 
     def get_full_symbolic_data(self, object_key, instance_key):
-        doc = self.em[MemoryDocumentKeys.SYMBOLIC_DATA]
-        data = doc[object_key][MemoryDocumentKeys.DATA][instance_key][MemoryDocumentKeys.FULL]
-        return data
+        doc = self._get_document(MemoryDocumentKeys.SYMBOLIC_DATA, object_key, instance_key)
+        return doc[MemoryDocumentKeys.FULL]
 
     def get_geometric_data(self, object_key, instance_key):
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-        data = doc[object_key][MemoryDocumentKeys.DATA][instance_key]
-        return data
+        doc = self._get_document(MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key)
+        return doc[MemoryDocumentKeys.DATA]
 
     def get_data_file_names(self, object_key, instance_key):
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-        data_file_names = doc[object_key][MemoryDocumentKeys.DATA_FILE_NAMES][instance_key]
-        return data_file_names
+        doc = self._get_document(MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key)
+        return doc[MemoryDocumentKeys.DATA_FILE_NAMES]
 
     def get_data_object_mappings(self, object_key, instance_key):
-        doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
-        data_object_mappings = doc[object_key][MemoryDocumentKeys.DATA_OBJECT_MAPPINGS][instance_key]
-        return data_object_mappings
+        doc = self._get_document(MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key)
+        return doc[MemoryDocumentKeys.DATA_OBJECT_MAPPINGS]
 
-    def find_matches(self, obj, instance, new_objects, s):
+    def get_data_version(self, object_key, instance_key):
+        '''Returns a string that changes every time the geometric data of the given instance are rewritten.
+        '''
+        doc = self._get_document(MemoryDocumentKeys.GEOMETRIC_DATA, object_key, instance_key)
+        return doc.get(MemoryDocumentKeys.DATA_VERSION, None)
+
+    def find_matches(self, obj, instance, new_objects, s, max_distance=0):
         '''
         Keyword arguments:
         obj -- String description of a manipulated object.
@@ -201,66 +210,73 @@ class DeltaMemory(object):
         new_objects -- A list of 'utils.object.ObjectData' objects.
         s -- A dictionary in which each key is a binary tuple of indices from 'new_objects';
              the value corresponding to each key is a string defining the symbolic relations between the two objects.
+        max_distance -- Maximum Hamming distance between a string in 's' and a matching memorised representation;
+                        only exact matches are found if 'max_distance' is 0 (default 0).
         '''
 
-        symb_matches = self._find_symbolic_matches(obj, instance, s)
+        symb_matches = self._find_symbolic_matches(obj, instance, s, max_distance)
         if type(symb_matches) is list:
             return symb_matches, None
 
         geom_matches = self._find_geometric_matches(obj, instance, new_objects, symb_matches)
         return symb_matches, geom_matches
 
-    def _find_symbolic_matches(self, obj, instance, s):
+    def _find_symbolic_matches(self, obj, instance, s, max_distance=0):
         '''Finds all matches between the symbolic representations in 's'
-        and the memorised symbolic representations
+        and the memorised symbolic representations; the matches of each
+        representation are sorted by their Hamming distance from it.
 
         Keyword arguments:
         obj -- String description of a manipulated object.
         instance -- String description of a problem instance.
         s -- A dictionary in which each key is a binary tuple of object indices;
              the value corresponding to each key is a string defining the symbolic relations between the two objects.
+        max_distance -- Maximum Hamming distance between a string in 's' and a matching memorised representation (default 0).
 
         '''
         parent_instance = self.kb.get_parent_key(instance)
-        symb_doc = self.em[MemoryDocumentKeys.SYMBOLIC_DATA]
+        symb_index = self._get_document(MemoryDocumentKeys.SYMBOLIC_INDEX)
+        indexed_objects = symb_index[MemoryDocumentKeys.OBJECTS]
+        other_objects = [other_obj for other_obj in indexed_objects if other_obj != obj]
 
         if not s:
             symb_matches = list()
-            if obj in symb_doc:
-                for symb_key,symb_instance in symb_doc[obj][MemoryDocumentKeys.DATA].iteritems():
-                    if symb_key == instance or symb_key == parent_instance:
-                        symb_matches.append(symb_key)
+            if obj in indexed_objects:
+                for symb_key in self._get_candidate_instances(indexed_objects, obj, instance, parent_instance):
+                    symb_matches.append(symb_key)
 
-            for other_obj in symb_doc:
-                if other_obj != '_id' and other_obj != '_rev' and other_obj != obj:
-                    for symb_key,symb_instance in symb_doc[other_obj][MemoryDocumentKeys.DATA].iteritems():
-                        if symb_key == instance or symb_key == parent_instance:
-                            symb_matches.append(symb_key)
+            for other_obj in other_objects:
+                for symb_key in self._get_candidate_instances(indexed_objects, other_obj, instance, parent_instance):
+                    symb_matches.append(symb_key)
 
             return symb_matches
 
+        match_index = self._get_symbolic_match_index(symb_index)
+        candidate_instances = [instance]
+        if parent_instance is not None and parent_instance != instance:
+            candidate_instances.append(parent_instance)
+
         symb_matches = dict()
-        if obj in symb_doc:
-            #we look for matches in the learned instances for 'obj'
-            for key,new_instance in s.iteritems():
+        for key,new_instance in s.iteritems():
+            obj_matches = list()
+            other_matches = list()
+            for symb_key in candidate_instances:
+                for distance, matched_obj in self._get_matching_objects(match_index, symb_key, new_instance, max_distance):
+                    if matched_obj == obj:
+                        obj_matches.append((distance, symb_key))
+                    else:
+                        other_matches.append((distance, matched_obj, symb_key))
+
+            #we only use other models if we haven't found a match for the current object-instance combination;
+            #the matches of the closest other object are used in this case
+            if len(obj_matches) > 0:
+                symb_matches[key] = [symb_key for _, symb_key in sorted(obj_matches, key=lambda m: m[0])]
+            elif len(other_matches) > 0:
+                other_matches = sorted(other_matches, key=lambda m: m[0])
+                symb_matches[key] = [symb_key for _, matched_obj, symb_key in other_matches if matched_obj == other_matches[0][1]]
+            else:
                 symb_matches[key] = list()
 
-                for symb_key,symb_instance in symb_doc[obj][MemoryDocumentKeys.DATA].iteritems():
-                    if symb_key == instance or symb_key == parent_instance:
-                        if SymbolicMatchLibrary.matches_instance(new_instance, symb_instance[MemoryDocumentKeys.DELTA]):
-                            symb_matches[key].append(symb_key)
-
-        #we look for matches in every other learned instance
-        for other_obj in symb_doc:
-            if other_obj != '_id' and other_obj != '_rev' and other_obj != obj:
-                for key,new_instance in s.iteritems():
-                    #we only use other models if we haven't found a match for the current object-instance combination
-                    if len(symb_matches[key]) == 0:
-                        for symb_key,symb_instance in symb_doc[other_obj][MemoryDocumentKeys.DATA].iteritems():
-                            if symb_key == instance or symb_key == parent_instance:
-                                if SymbolicMatchLibrary.matches_instance(new_instance, symb_instance[MemoryDocumentKeys.DELTA]):
-                                    symb_matches[key].append(symb_key)
-
         return symb_matches
 
     def _find_geometric_matches(self, obj, instance, new_objects, symb_matches):
@@ -274,19 +290,22 @@ class DeltaMemory(object):
         symb_matches -- A dictionary of symbolic matches returned by 'self._find_symbolic_matches'.
 
         '''
-        parent_instance = self.kb.get_parent_key(instance)
-        geom_doc = self.em[MemoryDocumentKeys.GEOMETRIC_DATA]
+        geom_index = self._get_document(MemoryDocumentKeys.GEOMETRIC_INDEX)[MemoryDocumentKeys.OBJECTS]
         geom_matches = dict()
 
-        if obj in geom_doc:
+        if obj in geom_index:
+            geom_instance_data = dict()
             for key, instance_keys in symb_matches.iteritems():
                 for geom_key in instance_keys:
                     #we check if we have a geometric match between the current two objects
                     #only if we are dealing with a known instance
-                    if geom_key in geom_doc[obj][MemoryDocumentKeys.DATA]:
+                    if geom_key in geom_index[obj]:
+                        if geom_key not in geom_instance_data:
+                            geom_instance_data[geom_key] = self.get_geometric_data(obj, geom_key)
+
                         obj1 = new_objects[key[0]]
                         obj2 = new_objects[key[1]]
-                        match = GeometricMatchLibrary.matches_instance((obj1, obj2), geom_doc[obj][MemoryDocumentKeys.DATA][geom_key])
+                        match = GeometricMatchLibrary.matches_instance((obj1, obj2), geom_instance_data[geom_key])
 
                         #we check if there is a third object between the matched two in case we have a binary geometric match
                         for i,other_obj in enumerate(new_objects):
@@ -301,3 +320,138 @@ class DeltaMemory(object):
                         geom_matches[key].append(GeometricMatchInfo(geom_key, match))
 
         return geom_matches
+
+    def _get_candidate_instances(self, index, object_key, instance, parent_instance):
+        '''Returns the instances of 'object_key' in 'index' that are either 'instance' or 'parent_instance'.
+        '''
+        return [instance_key for instance_key in index[object_key] if instance_key == instance or instance_key == parent_instance]
+
+    def _get_matching_objects(self, match_index, instance_key, representation, max_distance):
+        '''Returns a list of (distance, object key) tuples of the objects whose learned representation
+        for 'instance_key' is within 'max_distance' bits from 'representation'.
+        '''
+        if max_distance == 0:
+            return [(0, object_key) for object_key in match_index.get_objects(instance_key, representation)]
+        return [(distance, object_key) for distance, object_key, _ in match_index.get_similar_objects(instance_key, representation, max_distance)]
+
+    def _get_symbolic_match_index(self, symb_index):
+        '''Returns 'self.symbolic_match_index', rebuilding it if
+        it doesn't belong to the current version of the memory.
+
+        Keyword arguments:
+        symb_index -- The symbolic index document.
+
+        '''
+        version = symb_index[MemoryDocumentKeys.DATA_VERSION]
+        if self.symbolic_match_index.version != version:
+            self.symbolic_match_index.clear()
+            for object_key, instance_keys in symb_index[MemoryDocumentKeys.OBJECTS].iteritems():
+                for instance_key in instance_keys:
+                    doc = self._get_document(MemoryDocumentKeys.SYMBOLIC_DATA, object_key, instance_key)
+                    self.symbolic_match_index.add(object_key, instance_key, doc[MemoryDocumentKeys.DELTA])
+            self.symbolic_match_index.version = version
+        return self.symbolic_match_index
+
+    def _add_to_index(self, index_type, object_key=None, instance_key=None, update_version=False):
+        '''Adds the given keys to the index document of type 'index_type'.
+
+        Keyword arguments:
+        index_type -- Either 'MemoryDocumentKeys.SYMBOLIC_INDEX' or 'MemoryDocumentKeys.GEOMETRIC_INDEX'.
+        object_key -- Key of the indexed object (default None).
+        instance_key -- Key of the indexed instance (default None).
+        update_version -- If True, the version of the index is changed even if
+                          the keys are already indexed; the version is also set
+                          if the index doesn't have one yet (default False).
+
+        Returns:
+        A tuple (previous_version, version) of the index versions before and after the update.
+
+        '''
+        versions = [None, None]
+        def add_keys(doc):
+            changed = False
+            if MemoryDocumentKeys.OBJECTS not in doc:
+                doc[MemoryDocumentKeys.OBJECTS] = dict()
+                changed = True
+
+            objects = doc[MemoryDocumentKeys.OBJECTS]
+            if object_key is not None and object_key not in objects:
+                objects[object_key] = list()
+                changed = True
+            if instance_key is not None and instance_key not in objects[object_key]:
+                objects[object_key].append(instance_key)
+                changed = True
+
+            versions[0] = versions[1] = doc.get(MemoryDocumentKeys.DATA_VERSION, None)
+            if update_version or versions[0] is None:
+                versions[1] = doc[MemoryDocumentKeys.DATA_VERSION] = uuid.uuid4().hex
+                changed = True
+            return changed
+        self._update_document(add_keys, index_type)
+        return versions[0], versions[1]
+
+    def _reset_links(self, links_type, object_key, instance_key):
+        def reset(doc):
+            doc[MemoryDocumentKeys.LINKS] = { object_key : { MemoryDocumentKeys.TOTAL_RETRIEVALS : '0', MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS : '0' } }
+            return True
+        self._update_document(reset, links_type, object_key, instance_key)
+
+    def _clear_links(self, links_type, object_key, instance_key):
+        def clear(doc):
+            doc[MemoryDocumentKeys.LINKS] = dict()
+            return True
+        self._update_document(clear, links_type, object_key, instance_key)
+
+    def _update_link(self, links_type, object1_key, object2_key, instance_key, success):
+        def update(doc):
+            link = doc[MemoryDocumentKeys.LINKS][object2_key]
+
+            #use arbitrary precision arithmetic instead of integers
+            total_retrievals = int(link[MemoryDocumentKeys.TOTAL_RETRIEVALS])
+            successful_retrievals = int(link[MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS])
+
+            total_retrievals += 1
+            if success:
+                successful_retrievals += 1
+
+            link[MemoryDocumentKeys.TOTAL_RETRIEVALS] = str(total_retrievals)
+            link[MemoryDocumentKeys.SUCCESSFUL_RETRIEVALS] = str(successful_retrievals)
+            return True
+        self._update_document(update, links_type, object1_key, instance_key, create=False)
+
+    def _get_document(self, doc_type, object_key=None, instance_key=None):
+        doc = self.storage.get_document(doc_type, object_key, instance_key)
+        if doc is None:
+            raise DocumentNotFound((doc_type, object_key, instance_key))
+        return doc
+
+    def _update_document(self, update_cb, doc_type, object_key=None, instance_key=None, create=True):
+        '''Applies 'update_cb' to the given document and saves the document
+        if 'update_cb' returns True; the update is repeated on the latest revision
+        of the document if another writer has saved the document in the meantime.
+
+        Keyword arguments:
+        update_cb -- A function that modifies the document given to it
+                     and returns True if the document has changed.
+        doc_type -- Type of the document that should be updated.
+        object_key -- Object key of the document (default None).
+        instance_key -- Instance key of the document (default None).
+        create -- If True, an empty document is created if the document doesn't exist;
+                  otherwise, 'delta_memory.storage.DocumentNotFound' is raised (default True).
+
+        '''
+        while True:
+            doc = self.storage.get_document(doc_type, object_key, instance_key)
+            if doc is None:
+                if not create:
+                    raise DocumentNotFound((doc_type, object_key, instance_key))
+                doc = dict()
+
+            if not update_cb(doc):
+                return
+
+            try:
+                self.storage.save_document(doc, doc_type, object_key, instance_key)
+                return
+            except StorageConflict:
+                pass
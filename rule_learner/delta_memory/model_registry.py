@@ -0,0 +1,235 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os.path
+from collections import OrderedDict
+import numpy as np
+from sklearn.externals import joblib
+
+from density_optimisation import kernel_trees, mapping_bundle
+
+class ModelRegistryEntry(object):
+    def __init__(self, version, models, size):
+        self.version = version
+        self.models = models
+        self.size = size
+        self.data_trees = None
+
+class ModelRegistry(object):
+    '''Keeps the learned geometric mappings of recently used object/instance pairs in memory
+    so that the mappings of an instance are only loaded from disk once.
+    The least recently used entries are discarded when the total size of the loaded
+    mappings exceeds a given budget; an entry is reloaded as soon as the geometric data
+    of its instance are rewritten in the delta memory.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, delta_memory, path, max_bytes=512*1024*1024):
+        '''
+        Keyword arguments:
+        delta_memory -- A 'delta_memory.memory.DeltaMemory' object.
+        path -- Path of the 'rule_learner' directory; the file names stored in the delta memory are relative to it.
+        max_bytes -- Upper bound on the total size (in bytes) of the kept mappings (default 512 MB).
+
+        '''
+        self.dm = delta_memory
+        self.path = path
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+
+    def get_models(self, object_key, instance_key):
+        '''Returns the learned geometric mappings of the given instance,
+        loading them only if they are not already in memory.
+
+        Returns:
+        A tuple (pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings).
+
+        '''
+        key = (object_key, instance_key)
+        version = self.dm.get_data_version(object_key, instance_key)
+        if version is None:
+            #instances learned before data versions were introduced are only reloaded if their files change
+            version = tuple(self.dm.get_data_file_names(object_key, instance_key))
+
+        if key in self.entries:
+            entry = self.entries.pop(key)
+            self.total_bytes -= entry.size
+            if entry.version == version:
+                self._add_entry(key, entry)
+                return entry.models
+
+        models = self._load_models(object_key, instance_key)
+        self._add_entry(key, ModelRegistryEntry(version, models, self._get_size(models)))
+        return models
+
+    def get_data_trees(self, object_key, instance_key):
+        '''Returns the trees over the mapping data of the given instance, which are
+        only loaded when they are requested for the first time (see 'kernel_trees.load_tree' and 'kernel_trees.load_trees').
+
+        Returns:
+        A tuple (pos_data_trees, neg_data_trees) of lists that are aligned with
+        the mapping data returned by 'get_models' (None for missing negative data).
+
+        '''
+        key = (object_key, instance_key)
+        models = self.get_models(object_key, instance_key)
+        if key in self.entries and self.entries[key].data_trees is not None:
+            return self.entries[key].data_trees
+
+        _, pos_mapping_data, _, neg_mapping_data, _ = models
+        bundle_file_name = self._get_bundle_file_name(object_key, instance_key)
+        if bundle_file_name is not None:
+            trees = kernel_trees.load_trees(pos_mapping_data + neg_mapping_data, self.path + bundle_file_name)
+            data_trees = (trees[:len(pos_mapping_data)], trees[len(pos_mapping_data):])
+        else:
+            _, pos_data_file_names, _, neg_data_file_names, _ = self._get_file_names(object_key, instance_key)
+            pos_data_trees = list()
+            neg_data_trees = list()
+            for data, file_name in zip(pos_mapping_data, pos_data_file_names):
+                pos_data_trees.append(kernel_trees.load_tree(data, self.path + file_name))
+            for data, file_name in zip(neg_mapping_data, neg_data_file_names):
+                if data is not None:
+                    neg_data_trees.append(kernel_trees.load_tree(data, self.path + file_name))
+                else:
+                    neg_data_trees.append(None)
+            data_trees = (pos_data_trees, neg_data_trees)
+
+        #the entry is re-added with the size of the trees, which may discard other entries
+        if key in self.entries:
+            entry = self.entries.pop(key)
+            self.total_bytes -= entry.size
+            entry.data_trees = data_trees
+            entry.size += sum(tree.get_size() for tree in _unique(data_trees[0] + data_trees[1]))
+            self._add_entry(key, entry)
+        return data_trees
+
+    def invalidate(self, object_key=None, instance_key=None):
+        '''Removes the mappings of the given instance from memory; all mappings
+        of 'object_key' are removed if 'instance_key' is None and
+        all mappings are removed if 'object_key' is None as well.
+        '''
+        for key in self.entries.keys():
+            if (object_key is None or key[0] == object_key) and (instance_key is None or key[1] == instance_key):
+                self.total_bytes -= self.entries.pop(key).size
+
+    def _add_entry(self, key, entry):
+        #entries that don't fit in the budget on their own are used once and not kept
+        if entry.size > self.max_bytes:
+            return
+
+        while self.total_bytes + entry.size > self.max_bytes:
+            _, lru_entry = self.entries.popitem(last=False)
+            self.total_bytes -= lru_entry.size
+
+        self.entries[key] = entry
+        self.total_bytes += entry.size
+
+    def _get_bundle_file_name(self, object_key, instance_key):
+        '''Returns the name of the mapping bundle of the given instance (see 'density_optimisation.mapping_bundle')
+        or None if the mappings of the instance are stored in separate files.
+        '''
+        for x in self.dm.get_data_file_names(object_key, instance_key):
+            if mapping_bundle.is_bundle(x):
+                return x
+        return None
+
+    def _get_file_names(self, object_key, instance_key):
+        '''Returns a tuple (pos_mapping_file_names, pos_data_file_names, neg_mapping_file_names, neg_data_file_names, object_mappings)
+        in which the file names are listed in the order in which the mappings are used by the optimiser.
+        '''
+        file_names = self.dm.get_data_file_names(object_key, instance_key)
+        mapping_file_names = [x for x in file_names if x.find('pkl') != -1]
+        mapping_data_file_names = [x for x in file_names if x.find('npy') != -1]
+        pos_mapping_file_names = list()
+        pos_data_file_names = list()
+        neg_mapping_file_names = list()
+        neg_data_file_names = list()
+
+        predicate_object_mappings = self.dm.get_data_object_mappings(object_key, instance_key)
+        object_mappings = list()
+        for pred, obj_mapping in predicate_object_mappings.iteritems():
+            for m in obj_mapping:
+                object_mappings.append(m)
+                for x in mapping_file_names:
+                    if ('_' + pred + '_') in x:
+                        if not 'not' in x:
+                            pos_mapping_file_names.append(x)
+                        else:
+                            neg_mapping_file_names.append(x)
+
+                for x in mapping_data_file_names:
+                    if ('_' + pred + '_') in x:
+                        if not 'not' in x:
+                            pos_data_file_names.append(x)
+                        else:
+                            neg_data_file_names.append(x)
+
+        return pos_mapping_file_names, pos_data_file_names, neg_mapping_file_names, neg_data_file_names, object_mappings
+
+    def _load_models(self, object_key, instance_key):
+        bundle_file_name = self._get_bundle_file_name(object_key, instance_key)
+        if bundle_file_name is not None:
+            return mapping_bundle.load_bundle(self.path + bundle_file_name)
+
+        pos_mapping_file_names, pos_data_file_names, neg_mapping_file_names, neg_data_file_names, object_mappings = self._get_file_names(object_key, instance_key)
+        pos_mappings = [joblib.load(self.path + x) for x in pos_mapping_file_names]
+        pos_mapping_data = [np.load(self.path + x) for x in pos_data_file_names]
+        neg_mappings = list()
+        neg_mapping_data = list()
+        for x in neg_mapping_file_names:
+            if os.path.isfile(self.path + x):
+                neg_mappings.append(joblib.load(self.path + x))
+            else:
+                neg_mappings.append(None)
+
+        for x in neg_data_file_names:
+            if os.path.isfile(self.path + x):
+                neg_mapping_data.append(np.load(self.path + x))
+            else:
+                neg_mapping_data.append(None)
+
+        return pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings
+
+    def _get_size(self, models):
+        '''Returns the approximate number of bytes occupied by the given mappings,
+        namely the size of the mapping data and the trees of the density estimators.
+        '''
+        pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, _ = models
+        size = 0
+        for data in _unique(pos_mapping_data + neg_mapping_data):
+            size += data.nbytes
+
+        for mapping in _unique(pos_mappings + neg_mappings):
+            if hasattr(mapping, 'tree_'):
+                for array in mapping.tree_.get_arrays():
+                    size += np.asarray(array).nbytes
+        return size
+
+
+def _unique(objects):
+    '''Returns the objects in 'objects' that aren't None, without the ones that appear
+    multiple times (the mappings of a bundle are shared by the predicates that use them).
+    '''
+    unique_objects = dict()
+    for x in objects:
+        if x is not None:
+            unique_objects[id(x)] = x
+    return unique_objects.values()
@@ -0,0 +1,199 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os.path
+import json
+import sqlite3
+
+class StorageTypes(object):
+    COUCHDB = 'couchdb'
+    SQLITE = 'sqlite'
+
+class StorageConflict(Exception):
+    '''Raised when a document is saved with an outdated revision.
+    '''
+    pass
+
+class DocumentNotFound(KeyError):
+    pass
+
+class Storage(object):
+    '''Interface of the document stores used by 'delta_memory.memory.DeltaMemory'
+    and 'knowledge_base.KnowledgeBase'.
+
+    Documents are dictionaries identified by a document type and, optionally,
+    an object key and an instance key. A document that was read from the storage
+    contains a '_rev' entry; saving a document whose '_rev' entry doesn't match
+    the stored revision raises a 'StorageConflict' exception.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def get_document(self, doc_type, object_key=None, instance_key=None):
+        '''Returns the requested document or None if the document doesn't exist.
+        '''
+        raise NotImplementedError()
+
+    def get_revision(self, doc_type, object_key=None, instance_key=None):
+        '''Returns the revision of the requested document without reading the document
+        or None if the document doesn't exist.
+        '''
+        raise NotImplementedError()
+
+    def save_document(self, doc, doc_type, object_key=None, instance_key=None):
+        '''Saves the given document and updates its '_rev' entry.
+        '''
+        raise NotImplementedError()
+
+    def delete_document(self, doc_type, object_key=None, instance_key=None):
+        raise NotImplementedError()
+
+    def has_document(self, doc_type, object_key=None, instance_key=None):
+        raise NotImplementedError()
+
+class CouchDBStorage(Storage):
+    '''Stores each document as a CouchDB document whose ID is
+    '<doc_type>:<object_key>:<instance_key>' or just '<doc_type>'
+    for documents without object and instance keys.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, db_name):
+        #couchdb is only imported here so that the embedded storage doesn't need it
+        import couchdb
+        self.couchdb = couchdb
+
+        self.db_name = db_name
+        self.db_server = couchdb.Server()
+        if self.db_name not in self.db_server:
+            self.db_server.create(self.db_name)
+        self.db = self.db_server[self.db_name]
+
+    @staticmethod
+    def get_document_id(doc_type, object_key=None, instance_key=None):
+        if object_key is None:
+            return doc_type
+        return '%s:%s:%s' % (doc_type, object_key, instance_key)
+
+    def get_document(self, doc_type, object_key=None, instance_key=None):
+        return self.db.get(self.get_document_id(doc_type, object_key, instance_key))
+
+    def get_revision(self, doc_type, object_key=None, instance_key=None):
+        #a HEAD request returns the revision of the document in the ETag header
+        try:
+            _, headers, _ = self.db.resource.head(self.get_document_id(doc_type, object_key, instance_key))
+        except self.couchdb.ResourceNotFound:
+            return None
+        return headers.get('etag', '').strip('"')
+
+    def save_document(self, doc, doc_type, object_key=None, instance_key=None):
+        doc['_id'] = self.get_document_id(doc_type, object_key, instance_key)
+        try:
+            self.db.save(doc)
+        except self.couchdb.ResourceConflict:
+            raise StorageConflict(doc['_id'])
+
+    def delete_document(self, doc_type, object_key=None, instance_key=None):
+        del self.db[self.get_document_id(doc_type, object_key, instance_key)]
+
+    def has_document(self, doc_type, object_key=None, instance_key=None):
+        return self.get_document_id(doc_type, object_key, instance_key) in self.db
+
+class SQLiteStorage(Storage):
+    '''Stores the documents as JSON strings in an embedded SQLite database,
+    in a table indexed by document type, object key, and instance key.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, file_name):
+        self.file_name = file_name
+        #the timeout allows multiple processes (e.g. the learners and the solver) to share the database
+        self.connection = sqlite3.connect(self.file_name, timeout=30.)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS documents (doc_type TEXT NOT NULL, object_key TEXT NOT NULL, instance_key TEXT NOT NULL, rev INTEGER NOT NULL, body TEXT NOT NULL, PRIMARY KEY (doc_type, object_key, instance_key))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS documents_object_instance ON documents (object_key, instance_key)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS documents_instance ON documents (instance_key)')
+
+    def get_document(self, doc_type, object_key=None, instance_key=None):
+        row = self.connection.execute('SELECT rev, body FROM documents WHERE doc_type=? AND object_key=? AND instance_key=?', \
+                                      self._get_keys(doc_type, object_key, instance_key)).fetchone()
+        if row is None:
+            return None
+
+        doc = json.loads(row[1])
+        doc['_rev'] = str(row[0])
+        return doc
+
+    def get_revision(self, doc_type, object_key=None, instance_key=None):
+        row = self.connection.execute('SELECT rev FROM documents WHERE doc_type=? AND object_key=? AND instance_key=?', \
+                                      self._get_keys(doc_type, object_key, instance_key)).fetchone()
+        if row is None:
+            return None
+        return str(row[0])
+
+    def save_document(self, doc, doc_type, object_key=None, instance_key=None):
+        keys = self._get_keys(doc_type, object_key, instance_key)
+        body = json.dumps(dict((key, value) for key, value in doc.iteritems() if key != '_rev'))
+        with self.connection:
+            if '_rev' in doc:
+                rev = int(doc['_rev']) + 1
+                cursor = self.connection.execute('UPDATE documents SET rev=?, body=? WHERE doc_type=? AND object_key=? AND instance_key=? AND rev=?', \
+                                                 (rev, body) + keys + (rev - 1,))
+                if cursor.rowcount == 0:
+                    raise StorageConflict(keys)
+            else:
+                rev = 1
+                try:
+                    self.connection.execute('INSERT INTO documents (doc_type, object_key, instance_key, rev, body) VALUES (?, ?, ?, ?, ?)', \
+                                            keys + (rev, body))
+                except sqlite3.IntegrityError:
+                    raise StorageConflict(keys)
+        doc['_rev'] = str(rev)
+
+    def delete_document(self, doc_type, object_key=None, instance_key=None):
+        with self.connection:
+            self.connection.execute('DELETE FROM documents WHERE doc_type=? AND object_key=? AND instance_key=?', \
+                                    self._get_keys(doc_type, object_key, instance_key))
+
+    def has_document(self, doc_type, object_key=None, instance_key=None):
+        row = self.connection.execute('SELECT 1 FROM documents WHERE doc_type=? AND object_key=? AND instance_key=?', \
+                                      self._get_keys(doc_type, object_key, instance_key)).fetchone()
+        return row is not None
+
+    def _get_keys(self, doc_type, object_key, instance_key):
+        #documents without object and instance keys are stored with empty keys
+        #since NULL values are never equal in SQLite
+        return (doc_type, object_key or '', instance_key or '')
+
+def create_storage(db_name, storage_type=StorageTypes.COUCHDB, db_dir=''):
+    '''Returns a 'Storage' object of the given type.
+
+    Keyword arguments:
+    db_name -- Name of the database.
+    storage_type -- One of the 'StorageTypes' constants (default StorageTypes.COUCHDB).
+    db_dir -- Directory of the database file for the embedded storage (default '').
+
+    '''
+    if storage_type == StorageTypes.COUCHDB:
+        return CouchDBStorage(db_name)
+    elif storage_type == StorageTypes.SQLITE:
+        return SQLiteStorage(os.path.join(db_dir, db_name + '.sqlite'))
+    raise ValueError('unknown storage type %s' % storage_type)
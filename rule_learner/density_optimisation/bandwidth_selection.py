@@ -0,0 +1,204 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import time
+import numpy as np
+from sklearn.neighbors import KernelDensity
+from multiprocessing import Pool, cpu_count
+
+'''Cross-validated bandwidth selection for kernel density estimators. The search starts
+at a rule-of-thumb bandwidth, brackets the maximum of the cross-validated log-likelihood
+by moving in steps of a constant factor, and then refines the bracket by a golden-section search
+over the logarithm of the bandwidth; the folds of each evaluated bandwidth are scored in parallel.
+
+Author -- Alex Mitrevski
+
+'''
+class BandwidthRules(object):
+    SCOTT = 'scott'
+    SILVERMAN = 'silverman'
+
+class BandwidthSelection(object):
+    def __init__(self, bandwidth, log_likelihood, evaluations, selection_time):
+        '''
+        Keyword arguments:
+        bandwidth -- The selected bandwidth.
+        log_likelihood -- Mean log-likelihood of the held-out folds for the selected bandwidth.
+        evaluations -- Number of bandwidths for which the folds were fitted and scored.
+        selection_time -- Duration of the selection (in seconds).
+
+        '''
+        self.bandwidth = bandwidth
+        self.log_likelihood = log_likelihood
+        self.evaluations = evaluations
+        self.selection_time = selection_time
+
+class BandwidthSelector(object):
+    '''Selects the bandwidth of a Gaussian kernel density estimator that maximises
+    the cross-validated log-likelihood of the data, using far fewer fits than a grid search.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, min_bandwidth=0.01, max_bandwidth=5.0, rule=BandwidthRules.SCOTT, max_folds=10, bracket_factor=3., tolerance=0.02, processes=None):
+        '''
+        Keyword arguments:
+        min_bandwidth -- Smallest bandwidth that can be selected (default 0.01).
+        max_bandwidth -- Largest bandwidth that can be selected (default 5.0).
+        rule -- Rule of thumb that gives the initial bandwidth; one of the 'BandwidthRules' constants (default BandwidthRules.SCOTT).
+        max_folds -- Maximum number of cross-validation folds; fewer folds are used if there are fewer data items (default 10).
+        bracket_factor -- Factor by which the bandwidth is changed while bracketing the maximum (default 3.0).
+        tolerance -- Relative width of the bandwidth interval at which the golden-section search stops (default 0.02).
+        processes -- Number of processes in which the folds are scored; if None, as many processes
+                     as there are CPUs are used, while a value of 1 scores the folds in the calling process (default None).
+
+        '''
+        self.min_bandwidth = min_bandwidth
+        self.max_bandwidth = max_bandwidth
+        self.rule = rule
+        self.max_folds = max_folds
+        self.bracket_factor = bracket_factor
+        self.tolerance = tolerance
+        self.processes = processes
+
+        self.pool = None
+        self.folds = None
+        self.scores = None
+
+    def select(self, data):
+        '''Returns a 'BandwidthSelection' object with the bandwidth selected for 'data' (a 2D 'numpy' array).
+        '''
+        start_time = time.time()
+        initial_bandwidth = self._clip(rule_of_thumb_bandwidth(data, self.rule))
+        fold_count = min(self.max_folds, data.shape[0])
+        if fold_count < 2:
+            return BandwidthSelection(initial_bandwidth, None, 0, time.time() - start_time)
+
+        #the folds are the same as the ones of an unshuffled k-fold cross-validation
+        self.folds = np.array_split(np.arange(data.shape[0]), fold_count)
+        self.scores = dict()
+
+        processes = self.processes
+        if processes is None:
+            processes = cpu_count()
+        processes = min(processes, fold_count)
+        if processes > 1:
+            #the workers get the data when they are started rather than with each fold
+            self.pool = Pool(processes, initializer=_set_selection_data, initargs=(data,))
+        else:
+            _set_selection_data(data)
+
+        try:
+            lower, upper = self._bracket_maximum(initial_bandwidth)
+            bandwidth = self._golden_section_search(lower, upper)
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+            else:
+                _set_selection_data(None)
+
+        return BandwidthSelection(bandwidth, self.scores[bandwidth], len(self.scores), time.time() - start_time)
+
+    def _bracket_maximum(self, bandwidth):
+        '''Returns a tuple (lower, upper) with bandwidths between which
+        the cross-validated log-likelihood has a maximum.
+        '''
+        lower = self._clip(bandwidth / self.bracket_factor)
+        upper = self._clip(bandwidth * self.bracket_factor)
+        score = self._score(bandwidth)
+
+        #we move the bracket towards the larger bandwidths as long as the likelihood increases
+        while self._score(upper) > score and upper < self.max_bandwidth:
+            lower, bandwidth, score = bandwidth, upper, self._score(upper)
+            upper = self._clip(upper * self.bracket_factor)
+        if self._score(upper) > score:
+            return bandwidth, upper
+
+        #otherwise, the maximum is either around the current bandwidth or at smaller bandwidths
+        while self._score(lower) > score and lower > self.min_bandwidth:
+            upper, bandwidth, score = bandwidth, lower, self._score(lower)
+            lower = self._clip(lower / self.bracket_factor)
+        return lower, upper
+
+    def _golden_section_search(self, lower, upper):
+        '''Returns the evaluated bandwidth with the largest likelihood after a golden-section search
+        for the maximum of the likelihood between 'lower' and 'upper' over the logarithms of the bandwidths.
+        '''
+        a = np.log(lower)
+        b = np.log(upper)
+        c = b - golden_ratio_inverse * (b - a)
+        d = a + golden_ratio_inverse * (b - a)
+        while b - a > np.log(1. + self.tolerance):
+            if self._score(np.exp(c)) > self._score(np.exp(d)):
+                b, d = d, c
+                c = b - golden_ratio_inverse * (b - a)
+            else:
+                a, c = c, d
+                d = a + golden_ratio_inverse * (b - a)
+
+        return max(self.scores.keys(), key=lambda bandwidth: self.scores[bandwidth])
+
+    def _score(self, bandwidth):
+        '''Returns the mean log-likelihood of the held-out folds for 'bandwidth';
+        the score of each bandwidth is only computed once.
+        '''
+        if bandwidth not in self.scores:
+            fold_args = [(bandwidth, test_idx) for test_idx in self.folds]
+            if self.pool is not None:
+                fold_scores = self.pool.map(_score_fold, fold_args)
+            else:
+                fold_scores = map(_score_fold, fold_args)
+            self.scores[bandwidth] = np.mean(fold_scores)
+        return self.scores[bandwidth]
+
+    def _clip(self, bandwidth):
+        return min(max(bandwidth, self.min_bandwidth), self.max_bandwidth)
+
+
+def rule_of_thumb_bandwidth(data, rule=BandwidthRules.SCOTT):
+    '''Returns the bandwidth of an isotropic Gaussian kernel given by Scott's or Silverman's rule of thumb,
+    using the mean standard deviation of the dimensions of 'data' (a 2D 'numpy' array).
+    '''
+    n, dim = data.shape
+    sigma = np.mean(np.std(data, axis=0))
+    if rule == BandwidthRules.SILVERMAN:
+        return (4. / (dim + 2.))**(1. / (dim + 4.)) * n**(-1. / (dim + 4.)) * sigma
+    return n**(-1. / (dim + 4.)) * sigma
+
+
+def _set_selection_data(data):
+    global _selection_data
+    _selection_data = data
+
+
+def _score_fold(args):
+    '''Fits a density estimator with the given bandwidth to all data except
+    the given fold and returns the log-likelihood of the fold.
+    '''
+    bandwidth, test_idx = args
+    train_mask = np.ones(_selection_data.shape[0], dtype=bool)
+    train_mask[test_idx] = False
+    kde = KernelDensity(bandwidth=bandwidth).fit(_selection_data[train_mask])
+    return kde.score(_selection_data[test_idx])
+
+
+golden_ratio_inverse = (np.sqrt(5.) - 1.) / 2.
+_selection_data = None
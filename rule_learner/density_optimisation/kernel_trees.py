@@ -0,0 +1,189 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os.path
+import numpy as np
+from sklearn.neighbors import KDTree
+from sklearn.externals import joblib
+
+'''Truncated kernel sums over the data of learned geometric mappings: only the data points
+whose kernels are not negligible relative to the kernel sum at a given point are found
+(using a KD-tree over the data) and taken into account, such that the cost of evaluating the
+optimised function depends on the density of the data around the evaluated states rather than on the size of the data.
+
+Author -- Alex Mitrevski
+
+'''
+class TruncatedKernels(object):
+    '''Describes the kernel truncation used by 'optimisation_utils._evaluate': the data points are
+    left out of the kernel sums only if the sum of their kernels is guaranteed to be smaller than
+    'tolerance' times the kernel sum, such that the relative error of the kernel sums (and thus the
+    absolute error of the log densities) is bounded by 'tolerance' at any distance from the data.
+
+    For a state whose nearest data point is at a distance d0, the kernel sum is at least exp(-d0^2 / scale),
+    while the N data points outside a radius r contribute at most N * exp(-r^2 / scale); all data points
+    within r^2 = d0^2 + scale * log(N / tolerance) are therefore used.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, state_trees, not_state_trees, tolerance=1e-4):
+        '''
+        Keyword arguments:
+        state_trees -- A list of 'MappingDataTree' objects in which the i-th element is a tree over the i-th positive mapping data.
+        not_state_trees -- A list of 'MappingDataTree' objects (or None for predicates without negative mappings)
+                           in which the i-th element is a tree over the i-th negative mapping data.
+        tolerance -- Upper bound on the relative error of the kernel sums (default 1e-4).
+
+        '''
+        self.state_trees = state_trees
+        self.not_state_trees = not_state_trees
+        self.tolerance = tolerance
+
+    def find_neighbours(self, tree, v, max_scale):
+        '''Returns a 'DataNeighbours' object with the data points of 'tree' that are relevant for
+        the kernels exp(-d^2 / scale) at the rows of 'v', where 'max_scale' is the largest 'scale'
+        of the kernels that are computed from the neighbours.
+        '''
+        #the bound holds for all scales up to 'max_scale'
+        nearest_distances = tree.find_nearest_distances(v)
+        radii = np.sqrt(nearest_distances**2 + max_scale * np.log(tree.data_count / self.tolerance))
+        return tree.find_neighbours(v, radii)
+
+
+class MappingDataTree(object):
+    '''A KD-tree over the data of a learned geometric mapping.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, data, leaf_size=40):
+        self.tree = KDTree(data, leaf_size=leaf_size)
+        self.data_count = data.shape[0]
+
+    def find_neighbours(self, v, radii):
+        '''Returns a 'DataNeighbours' object with the data points within 'radii[i]' of the i-th row of the 2D array 'v';
+        each radius should be larger than the distance between the respective row and its nearest data point.
+        '''
+        indices, distances = self.tree.query_radius(v, radii, return_distance=True)
+        counts = np.array([len(x) for x in indices], dtype=int)
+        return DataNeighbours(counts, np.concatenate(indices).astype(int), np.concatenate(distances)**2)
+
+    def find_nearest_distances(self, v):
+        '''Returns a 'numpy' array with the distance between each row of the 2D array 'v' and its nearest data point.
+        '''
+        nearest_distances, _ = self.tree.query(v, k=1)
+        return nearest_distances[:,0]
+
+    def get_size(self):
+        '''Returns the approximate number of bytes occupied by the tree.
+        '''
+        return sum(np.asarray(array).nbytes for array in self.tree.get_arrays())
+
+
+class DataNeighbours(object):
+    '''The data points found around a batch of states, stored in flat arrays
+    in which the neighbours of each state are contiguous.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, counts, data_indices, sq_distances):
+        '''
+        Keyword arguments:
+        counts -- A 'numpy' array with the number of neighbours of each state (at least one per state).
+        data_indices -- Indices of the neighbouring data points.
+        sq_distances -- Squared distances between the states and the neighbouring data points.
+
+        '''
+        self.offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        self.rows = np.repeat(np.arange(len(counts)), counts)
+        self.data_indices = data_indices
+        self.sq_distances = sq_distances
+
+    def log_kernel_sums(self, scale):
+        '''Returns the logarithms of the sums of the kernels exp(-d^2 / scale) of each state.
+        '''
+        log_kernels = -self.sq_distances / scale
+        max_log_kernels = np.maximum.reduceat(log_kernels, self.offsets)
+        return max_log_kernels + np.log(np.add.reduceat(np.exp(log_kernels - max_log_kernels[self.rows]), self.offsets))
+
+    def kernel_sums(self, data, scale):
+        '''Returns a tuple (kernel_sums, weighted_data_sums) with the sums of the kernels exp(-d^2 / scale)
+        of each state and the sums of the neighbouring data points of each state weighted by the kernels.
+        '''
+        kernels = np.exp(-self.sq_distances / scale)
+        weighted_data = kernels[:,np.newaxis] * data[self.data_indices]
+        return np.add.reduceat(kernels, self.offsets), np.add.reduceat(weighted_data, self.offsets, axis=0)
+
+
+def get_tree_file_name(data_file_name):
+    '''Returns the name of the file in which the tree over the data in 'data_file_name' is stored.
+    '''
+    return os.path.splitext(data_file_name)[0] + '_tree.pkl'
+
+
+def save_tree(data, data_file_name):
+    '''Builds a tree over 'data' and stores it next to 'data_file_name'.
+    '''
+    _dump(MappingDataTree(data), get_tree_file_name(data_file_name))
+
+
+def load_tree(data, data_file_name):
+    '''Loads the tree stored next to 'data_file_name'; the tree is built from 'data'
+    if the file doesn't exist (e.g. for mappings learned before the trees were stored)
+    or if it is older than the data.
+    '''
+    tree_file_name = get_tree_file_name(data_file_name)
+    if os.path.isfile(tree_file_name) and os.path.getmtime(tree_file_name) >= os.path.getmtime(data_file_name):
+        return joblib.load(tree_file_name)
+    return MappingDataTree(data)
+
+
+def save_trees(data_list, file_name):
+    '''Builds a tree over each array in 'data_list' (None elements are skipped)
+    and stores the trees in a single file next to 'file_name'.
+    '''
+    _dump(_build_trees(data_list), get_tree_file_name(file_name))
+
+
+def load_trees(data_list, file_name):
+    '''Loads the trees stored next to 'file_name' by 'save_trees'; the trees are
+    built from 'data_list' if the file doesn't exist or if it is older than 'file_name'.
+    '''
+    tree_file_name = get_tree_file_name(file_name)
+    if os.path.isfile(tree_file_name) and os.path.getmtime(tree_file_name) >= os.path.getmtime(file_name):
+        return joblib.load(tree_file_name)
+    return _build_trees(data_list)
+
+
+def _dump(obj, file_name):
+    #we write to a temporary file first so that concurrent readers never see a partially written file
+    tmp_file_name = file_name + '.tmp'
+    joblib.dump(obj, tmp_file_name)
+    os.rename(tmp_file_name, file_name)
+
+
+def _build_trees(data_list):
+    #the same tree is used for arrays that appear multiple times in 'data_list'
+    trees = dict()
+    for data in data_list:
+        if data is not None and id(data) not in trees:
+            trees[id(data)] = MappingDataTree(data)
+    return [trees[id(data)] if data is not None else None for data in data_list]
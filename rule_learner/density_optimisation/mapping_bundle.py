@@ -0,0 +1,191 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import struct
+import zipfile
+from io import BytesIO
+import numpy as np
+from sklearn.neighbors import KernelDensity
+
+'''Single-file storage of the learned geometric mappings of a problem instance. A bundle is an
+uncompressed 'numpy' .npz archive with the data, bandwidths, and kernel parameters of the
+positive and negative mapping of each predicate and with the object mappings in which the
+predicates are used; the data arrays are memory-mapped directly from the archive when it is loaded,
+so loading a bundle neither copies the data nor unpickles any density estimators.
+
+Author -- Alex Mitrevski
+
+'''
+class BundleKeys(object):
+    VERSION = 'version'
+    MAPPING_NAMES = 'mapping_names'
+    KERNELS = 'kernels'
+    METRICS = 'metrics'
+    BANDWIDTHS = 'bandwidths'
+    DATA = 'data_%d'
+    NOT_DATA = 'not_data_%d'
+    ENTRY_MAPPINGS = 'entry_mappings'
+    OBJECT_MAPPINGS = 'object_mappings'
+
+class MappingDensity(object):
+    '''A kernel density estimator over the data of a geometric mapping, which has the attributes of
+    'sklearn.neighbors.KernelDensity' used by the pose optimiser; an 'sklearn' estimator is only fitted
+    if the density has to be computed by 'score_samples' (i.e. for non-Gaussian kernels).
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, data, bandwidth, kernel='gaussian', metric='euclidean'):
+        self.data = data
+        self.bandwidth = bandwidth
+        self.kernel = kernel
+        self.metric = metric
+        self.estimator = None
+
+    def score_samples(self, x):
+        if self.estimator is None:
+            self.estimator = KernelDensity(bandwidth=self.bandwidth, kernel=self.kernel, metric=self.metric).fit(self.data)
+        return self.estimator.score_samples(x)
+
+
+def save_bundle(file_name, mapping_names, mappings, not_mappings, entry_mappings, object_mappings):
+    '''Saves the given mappings to a single bundle file.
+
+    Keyword arguments:
+    file_name -- Name of the bundle file (should have an .npz extension).
+    mapping_names -- A list with the names of the predicate mappings.
+    mappings -- A list of 'MappingDensity' objects with the positive mapping of each predicate.
+    not_mappings -- A list of 'MappingDensity' objects with the negative mapping of each predicate
+                    (None for predicates without negative data).
+    entry_mappings -- A list with the index of the predicate mapping used by each optimised predicate.
+    object_mappings -- A list of object index pairs in which the i-th element stores
+                       the objects of the i-th optimised predicate.
+
+    '''
+    bandwidths = np.full((len(mappings), 2), np.nan)
+    arrays = dict()
+    for i, (mapping, not_mapping) in enumerate(zip(mappings, not_mappings)):
+        bandwidths[i,0] = mapping.bandwidth
+        arrays[BundleKeys.DATA % i] = np.ascontiguousarray(mapping.data, dtype=float)
+        if not_mapping is not None:
+            bandwidths[i,1] = not_mapping.bandwidth
+            arrays[BundleKeys.NOT_DATA % i] = np.ascontiguousarray(not_mapping.data, dtype=float)
+
+    arrays[BundleKeys.VERSION] = np.array([bundle_version])
+    arrays[BundleKeys.MAPPING_NAMES] = np.array(mapping_names, dtype=str)
+    arrays[BundleKeys.KERNELS] = np.array([mapping.kernel for mapping in mappings], dtype=str)
+    arrays[BundleKeys.METRICS] = np.array([mapping.metric for mapping in mappings], dtype=str)
+    arrays[BundleKeys.BANDWIDTHS] = bandwidths
+    arrays[BundleKeys.ENTRY_MAPPINGS] = np.array(entry_mappings, dtype=int)
+    arrays[BundleKeys.OBJECT_MAPPINGS] = np.array(object_mappings, dtype=int).reshape(-1, 2)
+
+    #the arrays aren't compressed so that they can be memory-mapped; the bundle is written to
+    #a temporary file first so that processes that have memory-mapped an existing
+    #bundle keep reading its old contents rather than a partially written file
+    tmp_file_name = file_name + '.tmp'
+    with open(tmp_file_name, 'wb') as bundle_file:
+        np.savez(bundle_file, **arrays)
+    os.rename(tmp_file_name, file_name)
+
+
+def load_bundle(file_name):
+    '''Loads the mappings stored in a bundle file.
+
+    Returns:
+    A tuple (pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings) with one element
+    per optimised predicate in each list (see 'delta_memory.model_registry.ModelRegistry.get_models').
+
+    '''
+    arrays = _load_arrays(file_name)
+    version = int(arrays[BundleKeys.VERSION][0])
+    if version > bundle_version:
+        raise ValueError('%s has an unsupported bundle version %d' % (file_name, version))
+
+    mappings = list()
+    not_mappings = list()
+    for i in xrange(len(arrays[BundleKeys.MAPPING_NAMES])):
+        kernel = str(arrays[BundleKeys.KERNELS][i])
+        metric = str(arrays[BundleKeys.METRICS][i])
+        bandwidth, not_bandwidth = arrays[BundleKeys.BANDWIDTHS][i]
+        mappings.append(MappingDensity(arrays[BundleKeys.DATA % i], bandwidth, kernel, metric))
+        if BundleKeys.NOT_DATA % i in arrays:
+            not_mappings.append(MappingDensity(arrays[BundleKeys.NOT_DATA % i], not_bandwidth, kernel, metric))
+        else:
+            not_mappings.append(None)
+
+    pos_mappings = list()
+    pos_mapping_data = list()
+    neg_mappings = list()
+    neg_mapping_data = list()
+    object_mappings = list()
+    for mapping_idx, object_mapping in zip(arrays[BundleKeys.ENTRY_MAPPINGS], arrays[BundleKeys.OBJECT_MAPPINGS]):
+        pos_mappings.append(mappings[mapping_idx])
+        pos_mapping_data.append(mappings[mapping_idx].data)
+        neg_mappings.append(not_mappings[mapping_idx])
+        if not_mappings[mapping_idx] is not None:
+            neg_mapping_data.append(not_mappings[mapping_idx].data)
+        else:
+            neg_mapping_data.append(None)
+        object_mappings.append(tuple(int(x) for x in object_mapping))
+
+    return pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings
+
+
+def is_bundle(file_name):
+    return file_name.endswith(bundle_extension)
+
+
+def _load_arrays(file_name):
+    '''Returns a dictionary with the arrays of an .npz archive; the arrays
+    of uncompressed archive members are memory-mapped from the archive file.
+    '''
+    arrays = dict()
+    with open(file_name, 'rb') as archive_file:
+        archive = zipfile.ZipFile(archive_file)
+        for info in archive.infolist():
+            array_name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[array_name] = np.load(BytesIO(archive.read(info)))
+                continue
+
+            #the data of a member start after its local header, whose name and extra fields may differ from the central directory
+            archive_file.seek(info.header_offset)
+            local_header = archive_file.read(zip_local_header_size)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            archive_file.seek(info.header_offset + zip_local_header_size + name_length + extra_length)
+
+            version = np.lib.format.read_magic(archive_file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(archive_file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(archive_file)
+
+            if dtype.hasobject or int(np.prod(shape)) == 0:
+                arrays[array_name] = np.load(BytesIO(archive.read(info)))
+            else:
+                order = 'F' if fortran_order else 'C'
+                arrays[array_name] = np.memmap(archive_file, dtype=dtype, mode='r', offset=archive_file.tell(), shape=shape, order=order)
+        archive.close()
+    return arrays
+
+
+bundle_version = 1
+bundle_extension = '.npz'
+zip_local_header_size = 30
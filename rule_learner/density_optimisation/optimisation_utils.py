@@ -17,8 +17,10 @@
     along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import threading
 import numpy as np
 from scipy.optimize import minimize
+from multiprocessing import Pool, cpu_count
 
 '''Implements the geometric pose optimisation algorithm described in
 R. Dearden and C. Burbridge, "Manipulation planning using learned symbolic state abstractions," Robotics and Autonomous Systems, vol. 62, no. 3, pp. 355-365, 2014.
@@ -31,17 +33,17 @@ def convert_to_predicate_mapping(x, current_obj_mappings, obj_count):
     currently considered by the optimisation algorithm.
 
     Keyword arguments:
-    x -- A one-dimensional array storing object data.
+    x -- A one-dimensional array storing object data or a 2D array with one such vector per row.
     current_obj_mappings -- A one- or two-element array or tuple that stores
                             the object mapping of the current predicate.
     obj_count -- Number of objects in a given configuration.
 
     Returns:
-    v -- Object data corresponding to the predicate.
+    v -- Object data corresponding to the predicate (one row per row of 'x' if 'x' is a 2D array).
     indices -- Indices of 'x' from which 'v' originates.
 
     '''
-    v = np.zeros(mapping_vector_length)
+    v = np.zeros(x.shape[:-1] + (mapping_vector_length,))
     indices = dict()
 
     size_start_idx = 0
@@ -51,9 +53,9 @@ def convert_to_predicate_mapping(x, current_obj_mappings, obj_count):
         size_idx = size_start_idx + current_obj_mappings[0] * 3
         pos_idx = pos_start_idx + current_obj_mappings[0] * 3
         rotation_idx = rotation_start_idx + current_obj_mappings[0] * 4
-        v[0:3] = x[size_idx:size_idx+3]
-        v[3:6] = x[pos_idx:pos_idx+3]
-        v[6:] = x[rotation_idx:rotation_idx+3]
+        v[..., 0:3] = x[..., size_idx:size_idx+3]
+        v[..., 3:6] = x[..., pos_idx:pos_idx+3]
+        v[..., 6:] = x[..., rotation_idx:rotation_idx+3]
 
         element_counter = 0
         for i in xrange(size_idx, size_idx+3):
@@ -72,11 +74,11 @@ def convert_to_predicate_mapping(x, current_obj_mappings, obj_count):
         pos2_idx = pos_start_idx + current_obj_mappings[1] * 3
         rotation1_idx = rotation_start_idx + current_obj_mappings[0] * 4
         rotation2_idx = rotation_start_idx + current_obj_mappings[1] * 4
-        v[0:3] = x[size1_idx:size1_idx+3]
-        v[3:6] = x[size2_idx:size2_idx+3]
-        v[6:9] = x[pos1_idx:pos1_idx+3] - x[pos2_idx:pos2_idx+3]
-        v[9:13] = x[rotation1_idx:rotation1_idx+4]
-        v[13:] = x[rotation2_idx:rotation2_idx+4]
+        v[..., 0:3] = x[..., size1_idx:size1_idx+3]
+        v[..., 3:6] = x[..., size2_idx:size2_idx+3]
+        v[..., 6:9] = x[..., pos1_idx:pos1_idx+3] - x[..., pos2_idx:pos2_idx+3]
+        v[..., 9:13] = x[..., rotation1_idx:rotation1_idx+4]
+        v[..., 13:] = x[..., rotation2_idx:rotation2_idx+4]
 
         element_counter = 0
         for i in xrange(size1_idx, size1_idx+3):
@@ -103,42 +105,42 @@ def convert_bad_guess_to_mapping(x, guess, current_obj_mappings, obj_count):
     that is currently considered by the algorithm.
 
     Keyword arguments:
-    x -- A one-dimensional array storing object data.
+    x -- A one-dimensional array storing object data or a 2D array with one such vector per row.
     guess -- A 7D object pose (3D position and a quaternion rotation).
     current_obj_mappings -- A one- or two-element array or tuple that stores
                             the object mapping of the current predicate.
     obj_count -- Number of objects in a given configuration.
 
     Returns:
-    v -- Object data corresponding to the predicate.
+    v -- Object data corresponding to the predicate (one row per row of 'x' if 'x' is a 2D array).
     indices -- Indices of 'x' from which 'v' originates.
 
     '''
-    v = np.zeros(mapping_vector_length)
+    v = np.zeros(x.shape[:-1] + (mapping_vector_length,))
 
     size_start_idx = 0
     pos_start_idx = obj_count * 3
     rotation_start_idx = 2 * obj_count * 3
     if len(current_obj_mappings) == 1:
         size_idx = size_start_idx + current_obj_mappings[0] * 3
-        v[0:3] = x[size_idx:size_idx+3]
-        v[3:6] = guess[0:3]
-        v[6:] = guess[3:]
+        v[..., 0:3] = x[..., size_idx:size_idx+3]
+        v[..., 3:6] = guess[0:3]
+        v[..., 6:] = guess[3:]
     elif len(current_obj_mappings) == 2:
         size1_idx = size_start_idx + current_obj_mappings[0] * 3
         size2_idx = size_start_idx + current_obj_mappings[1] * 3
         pos2_idx = pos_start_idx + current_obj_mappings[1] * 3
         rotation2_idx = rotation_start_idx + current_obj_mappings[1] * 4
-        v[0:3] = x[size1_idx:size1_idx+3]
-        v[3:6] = x[size2_idx:size2_idx+3]
-        v[6:9] = guess[0:3] - x[pos2_idx:pos2_idx+3]
-        v[9:13] = guess[3:]
-        v[13:] = x[rotation2_idx:rotation2_idx+4]
+        v[..., 0:3] = x[..., size1_idx:size1_idx+3]
+        v[..., 3:6] = x[..., size2_idx:size2_idx+3]
+        v[..., 6:9] = guess[0:3] - x[..., pos2_idx:pos2_idx+3]
+        v[..., 9:13] = guess[3:]
+        v[..., 13:] = x[..., rotation2_idx:rotation2_idx+4]
 
     return v
 
 
-def f(x, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0):
+def f(x, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0, truncated_kernels=None):
     '''Function whose value is being optimised.
 
     Keyword arguments:
@@ -152,39 +154,16 @@ def f(x, state_given_geom, state_data, state_given_not_geom, not_state_data, obj
     non_constant_elements -- Indices of the elements in 'x' that can be modified.
     bad_guesses -- A 2D 'numpy' array of object poses that should be avoided by the optimisation algorithm.
     sign -- If equal to 1, the function will be minimised; if equal to -1, the function will be maximised (default 1.0).
+    truncated_kernels -- A 'kernel_trees.TruncatedKernels' object; if given, only the kernels that aren't negligible
+                         are summed, which is approximate, but doesn't depend on the size of the mapping data;
+                         if None, the kernels at all data points are summed (default None).
 
     '''
-    obj_count = len(np.unique(np.concatenate(object_mappings)))
-    guess_mask_values = list()
-    p = 0.
-    for i in xrange(len(state_given_geom)):
-        current_obj_mappings = object_mappings[i]
-        v,_ = convert_to_predicate_mapping(x, current_obj_mappings, obj_count)
-        p_temp = state_given_geom[i].score_samples(v)
-        p_not_temp = -1e100
-        if state_given_not_geom[i] is not None:
-            p_not_temp = state_given_not_geom[i].score_samples(v)
-        else:
-            p_not_temp = np.log(1. - np.exp(p_temp))
-
-        if bad_guesses.shape[0] == 0:
-            d = np.exp(p_temp) + np.exp(p_not_temp)
-            if d < 1e-100:
-                d = 1e-100
-            p += (p_temp - np.log(d))
-        else:
-            p_temp = np.exp(p_temp) / (np.exp(p_temp) + np.exp(p_not_temp))
-            for g in bad_guesses:
-                v_guess = convert_bad_guess_to_mapping(x, g, current_obj_mappings, obj_count)
-                mask_value = np.exp(-0.5 * v.dot(v_guess))
-                guess_mask_values.append(mask_value)
-            p_temp -= max(guess_mask_values)
-            p += np.log(p_temp)
-
-    return sign * p
+    p, _ = _evaluate(x[np.newaxis], state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, True, False, truncated_kernels)
+    return sign * p[0]
 
 
-def f_prime(x, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0):
+def f_prime(x, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0, truncated_kernels=None):
     '''Derivative of the function that is being optimised.
 
     Keyword arguments:
@@ -198,85 +177,360 @@ def f_prime(x, state_given_geom, state_data, state_given_not_geom, not_state_dat
     non_constant_elements -- Indices of the elements in 'x' that can be modified.
     bad_guesses -- A 2D 'numpy' array of object poses that should be avoided by the optimisation algorithm.
     sign -- If equal to 1, the function will be minimised; if equal to -1, the function will be maximised (default 1.0).
+    truncated_kernels -- A 'kernel_trees.TruncatedKernels' object; if given, only the kernels that aren't negligible
+                         are summed, which is approximate, but doesn't depend on the size of the mapping data;
+                         if None, the kernels at all data points are summed (default None).
 
     '''
-    predicate_count = len(state_given_geom)
+    _, derivatives = _evaluate(x[np.newaxis], state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, False, True, truncated_kernels)
+    return sign * derivatives[0]
+
+
+def f_and_f_prime(x, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0, truncated_kernels=None):
+    '''Returns a tuple (f(x), f_prime(x)), computing both from a single pass over the data of each predicate.
+    The keyword arguments are the same as the ones of 'f'.
+    '''
+    p, derivatives = _evaluate(x[np.newaxis], state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, True, True, truncated_kernels)
+    return sign * p[0], sign * derivatives[0]
+
+
+def f_and_f_prime_batch(states, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0, truncated_kernels=None):
+    '''Evaluates the optimised function and its derivative for multiple states at once.
+    The keyword arguments are the same as the ones of 'f', except that 'states'
+    is a 2D 'numpy' array in which each row is a state in the format of 'x'.
+
+    Returns:
+    values -- A 'numpy' array with the function value of each state.
+    derivatives -- A 2D 'numpy' array in which the i-th row is the derivative at 'states[i]'.
+
+    '''
+    p, derivatives = _evaluate(states, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, True, True, truncated_kernels)
+    return sign * p, sign * derivatives
+
+
+def find_geometric_state(x0, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0, truncated_kernels=None):
+    r = _minimise(x0, (state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign, truncated_kernels))
+    return r.x
+
+
+def create_optimisation_pool(processes=None):
+    '''Returns a pool of worker processes that can be reused by multiple 'find_geometric_states' calls.
+
+    Keyword arguments:
+    processes -- Number of worker processes; if None, as many processes as there are CPUs are used (default None).
+
+    '''
+    if processes is None:
+        processes = cpu_count()
+    return Pool(processes)
+
+
+def find_geometric_states(initial_guesses, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0, processes=None, truncated_kernels=None, pool=None):
+    '''Optimises all initial guesses and returns the optimised states ranked by the value of the optimised function.
+    The guesses are split between the worker processes, each of which optimises its guesses
+    in lockstep (see 'LockstepOptimiser'), such that the function is evaluated for all of them at once.
+
+    Keyword arguments:
+    initial_guesses -- A 2D 'numpy' array in which each row is an initial guess in the format of 'x'.
+    processes -- Number of worker processes; if None, as many processes as there are CPUs are used,
+                 while a value of 1 optimises the guesses in the calling process (default None).
+    pool -- A pool created by 'create_optimisation_pool' that should be used instead of
+            starting new worker processes; the problem is then sent with each batch of guesses (default None).
+    The other keyword arguments are the same as the ones of 'f'.
+
+    Returns:
+    states -- A 2D 'numpy' array of optimised states, starting with the best one.
+    values -- A 'numpy' array with the function values of the states (multiplied by 'sign').
+    guess_indices -- A 'numpy' array in which the i-th element is the index
+                     of the initial guess from which 'states[i]' originates.
 
-    data_item_counts = np.zeros(predicate_count, dtype=np.int32)
-    h_squared = np.ones(predicate_count)
+    '''
+    args = (state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign, truncated_kernels)
+    initial_guesses = np.asarray(initial_guesses, dtype=float)
+    if processes is None:
+        processes = cpu_count()
+    processes = min(processes, len(initial_guesses))
+
+    if processes <= 1:
+        states, values = _optimise_initial_guesses(initial_guesses, args)
+    elif pool is not None:
+        batches = [(batch, args) for batch in np.array_split(initial_guesses, processes)]
+        results = pool.map(_optimise_problem_batch, batches)
+        states = np.vstack([batch_states for batch_states, _ in results])
+        values = np.concatenate([batch_values for _, batch_values in results])
+    else:
+        #the workers get the problem when they are started rather than with each batch,
+        #so that the density estimators aren't sent to them for every optimisation
+        pool = Pool(processes, initializer=_set_optimisation_problem, initargs=(args,))
+        try:
+            results = pool.map(_optimise_initial_guess_batch, np.array_split(initial_guesses, processes))
+        finally:
+            pool.close()
+            pool.join()
+        states = np.vstack([batch_states for batch_states, _ in results])
+        values = np.concatenate([batch_values for _, batch_values in results])
+
+    guess_indices = np.argsort(values, kind='mergesort')
+    return states[guess_indices], values[guess_indices], guess_indices
+
+
+def _minimise(x0, args):
+    #with jac=True, the function value and the derivative at a given point are computed and cached together
+    return minimize(f_and_f_prime, x0, args=args, method='BFGS', jac=True, options={'disp': True})
+
+
+def _optimise_initial_guesses(initial_guesses, args):
+    '''Optimises the initial guesses (rows of a 2D 'numpy' array) and returns a tuple
+    (states, values) with the optimised states and their function values (multiplied by the sign in 'args').
+    '''
+    if len(initial_guesses) == 1:
+        r = _minimise(initial_guesses[0], args)
+        return np.array([r.x]), np.array([r.fun])
+    optimiser = LockstepOptimiser(args)
+    return optimiser.optimise(initial_guesses)
+
+
+def _set_optimisation_problem(args):
+    global _optimisation_problem
+    _optimisation_problem = args
+
+
+def _optimise_initial_guess_batch(initial_guesses):
+    return _optimise_initial_guesses(initial_guesses, _optimisation_problem)
+
+
+def _optimise_problem_batch(batch):
+    initial_guesses, args = batch
+    return _optimise_initial_guesses(initial_guesses, args)
+
+
+class LockstepOptimiser(object):
+    '''Optimises multiple initial guesses with separate BFGS optimisations that run in lockstep:
+    each optimisation runs in its own thread and waits after requesting a function evaluation,
+    such that the states requested by all optimisations can be evaluated together. Each guess
+    is thus optimised exactly as by 'find_geometric_state', but the function is evaluated
+    once per step for all guesses rather than once per step for every guess.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, args):
+        '''
+        Keyword arguments:
+        args -- A tuple with the arguments of 'f' that follow 'x'.
+
+        '''
+        self.args = args
+        self.condition = threading.Condition()
+        self.requests = dict()
+        self.results = dict()
+        self.running = 0
+        self.failure = None
+
+    def optimise(self, initial_guesses):
+        '''Returns a tuple (states, values) with the optimised states and their function values
+        (multiplied by the sign in 'self.args'), one per row of 'initial_guesses'.
+        '''
+        states = np.array(initial_guesses, dtype=float)
+        values = np.zeros(len(states))
+        errors = list()
+
+        self.running = len(states)
+        threads = list()
+        for i in xrange(len(states)):
+            thread = threading.Thread(target=self._optimise_guess, args=(i, states, values, errors))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        with self.condition:
+            while True:
+                #we wait until each running optimisation has requested an evaluation
+                while self.running > 0 and len(self.requests) < self.running:
+                    self.condition.wait()
+                if self.running == 0:
+                    break
+
+                guess_indices = sorted(self.requests.keys())
+                try:
+                    batch_values, batch_derivatives = f_and_f_prime_batch(np.array([self.requests[i] for i in guess_indices]), *self.args)
+                except Exception as e:
+                    self.failure = e
+                    self.condition.notify_all()
+                    break
+
+                for k, i in enumerate(guess_indices):
+                    self.results[i] = (batch_values[k], batch_derivatives[k])
+                self.requests.clear()
+                self.condition.notify_all()
+
+        for thread in threads:
+            thread.join()
+
+        if self.failure is not None:
+            raise self.failure
+        if len(errors) > 0:
+            raise errors[0]
+        return states, values
+
+    def _f_and_f_prime(self, x, guess_idx):
+        with self.condition:
+            self.requests[guess_idx] = np.array(x)
+            self.condition.notify_all()
+            while guess_idx not in self.results and self.failure is None:
+                self.condition.wait()
+            if self.failure is not None:
+                raise self.failure
+            return self.results.pop(guess_idx)
+
+    def _optimise_guess(self, guess_idx, states, values, errors):
+        try:
+            r = minimize(self._f_and_f_prime, states[guess_idx], args=(guess_idx,), method='BFGS', jac=True, options={'disp': True})
+            states[guess_idx] = r.x
+            values[guess_idx] = r.fun
+        except Exception as e:
+            errors.append(e)
+        finally:
+            with self.condition:
+                self.running -= 1
+                self.condition.notify_all()
+
+
+def _evaluate(states, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, compute_value, compute_derivatives, truncated_kernels=None):
+    '''Computes the values and/or the derivatives of the optimised function (without the sign)
+    for all rows of the 2D array 'states'. The squared distances between the current predicate mappings
+    and the data of each predicate are computed once (as matrix products) and used both
+    for the log densities and for the kernels of the derivative; if 'truncated_kernels' is given,
+    the distances are only computed for the data points found around the predicate mappings.
+
+    Returns:
+    p -- A 'numpy' array with the function values (None if 'compute_value' is False).
+    derivatives -- A 2D 'numpy' array with the derivatives (None if 'compute_derivatives' is False).
+
+    '''
+    predicate_count = len(state_given_geom)
     obj_count = len(np.unique(np.concatenate(object_mappings)))
-    predicate_vs = list()
-    predicate_index_mappings = list()
-    predicate_eval = np.zeros(predicate_count)
+    state_count = states.shape[0]
+    guess_mask_values = np.full(state_count, -np.inf)
 
-    neg_data_item_counts = np.zeros(predicate_count, dtype=np.int32)
-    not_h_squared = np.ones(predicate_count)
-    not_predicate_eval = np.zeros(predicate_count)
-    for i in xrange(predicate_count):
-        #positive mappings
-        data_item_counts[i] = state_given_geom[i].tree_.data.shape[0]
-        h_squared[i] = state_given_geom[i].bandwidth**2
+    p = None
+    derivatives = None
+    if compute_value:
+        p = np.zeros(state_count)
+    if compute_derivatives:
+        derivatives = np.zeros(states.shape)
+        non_constant_elements = set(non_constant_elements)
 
+    for i in xrange(predicate_count):
         current_obj_mappings = object_mappings[i]
-        v, indices = convert_to_predicate_mapping(x, current_obj_mappings, obj_count)
-        predicate_vs.append(v)
-        predicate_index_mappings.append(indices)
-        predicate_eval[i] = state_given_geom[i].score_samples(predicate_vs[i])
+        v, indices = convert_to_predicate_mapping(states, current_obj_mappings, obj_count)
 
-        #negative mappings
+        #the scales of the kernels exp(-d^2 / scale) that are computed for the positive and the negative data
+        scales = [2. * state_given_geom[i].bandwidth**2]
+        not_scales = None
         if state_given_not_geom[i] is not None:
-            neg_data_item_counts[i] = state_given_not_geom[i].tree_.data.shape[0]
-            h_squared[i] = state_given_not_geom[i].bandwidth**2
-            not_predicate_eval[i] = state_given_not_geom[i].score_samples(predicate_vs[i])
+            scales.append(state_given_not_geom[i].bandwidth**2)
+            not_scales = [2. * state_given_not_geom[i].bandwidth**2, 1.]
+
+        if truncated_kernels is None:
+            v_sq_norms = np.einsum('ij,ij->i', v, v)
+            distances = DataDistances(_squared_distances(state_data[i], v, v_sq_norms))
+            if state_given_not_geom[i] is not None:
+                not_distances = DataDistances(_squared_distances(not_state_data[i], v, v_sq_norms))
         else:
-            not_predicate_eval[i] = np.log(1 - np.exp(state_given_geom[i].score_samples(predicate_vs[i])))
+            distances = truncated_kernels.find_neighbours(truncated_kernels.state_trees[i], v, max(scales))
+            if state_given_not_geom[i] is not None:
+                not_distances = truncated_kernels.find_neighbours(truncated_kernels.not_state_trees[i], v, max(not_scales))
+
+        if compute_value:
+            p_temp = _log_density(state_given_geom[i], v, distances, state_data[i].shape[0])
+            if state_given_not_geom[i] is not None:
+                p_not_temp = _log_density(state_given_not_geom[i], v, not_distances, not_state_data[i].shape[0])
+            else:
+                p_not_temp = np.log(1. - np.exp(p_temp))
+
+            if bad_guesses.shape[0] == 0:
+                d = np.maximum(np.exp(p_temp) + np.exp(p_not_temp), 1e-100)
+                p += (p_temp - np.log(d))
+            else:
+                p_temp = np.exp(p_temp) / (np.exp(p_temp) + np.exp(p_not_temp))
+
+                #the mask is the largest value over the bad guesses of all predicates considered so far
+                for g in bad_guesses:
+                    v_guess = convert_bad_guess_to_mapping(states, g, current_obj_mappings, obj_count)
+                    mask_values = np.exp(-0.5 * np.einsum('ij,ij->i', v, v_guess))
+                    guess_mask_values = np.maximum(guess_mask_values, mask_values)
+                p_temp -= guess_mask_values
+                p += np.log(p_temp)
+
+        #the derivative only depends on the predicates with negative mappings,
+        #since the positive and negative terms of the other predicates cancel out
+        if compute_derivatives and state_given_not_geom[i] is not None:
+            #the kernels of the derivative use the squared bandwidth of the negative mapping for the positive data
+            #and a unit bandwidth for the negative data
+            #the kernel-weighted sums of the differences between the data and 'v' are computed
+            #as the weighted sums of the data minus the sums of the kernels times 'v'
+            kernel_sum, weighted_data_sum = distances.kernel_sums(state_data[i], scales[1])
+            not_kernel_sum, not_weighted_data_sum = not_distances.kernel_sums(not_state_data[i], not_scales[1])
+            n = weighted_data_sum - kernel_sum[:,np.newaxis] * v
+            not_n = not_weighted_data_sum - not_kernel_sum[:,np.newaxis] * v
+            n_sum = np.maximum(kernel_sum, 1e-100)
+
+            term_derivative = n / n_sum[:,np.newaxis]
+            not_term_derivative = (n + not_n) / (n_sum + not_kernel_sum)[:,np.newaxis]
+            for idx, j in indices.iteritems():
+                if idx in non_constant_elements:
+                    derivatives[:,idx] += (term_derivative[:,j] - not_term_derivative[:,j])
+
+    return p, derivatives
+
+
+def _squared_distances(data, v, v_sq_norms):
+    '''Returns a 2D 'numpy' array whose (k,i)-th element is the squared Euclidean distance
+    between the k-th row of 'v' and the i-th row of 'data'; 'v_sq_norms' are the squared norms of the rows of 'v'.
+    '''
+    sq_distances = np.einsum('ij,ij->i', data, data)[np.newaxis] - 2. * v.dot(data.T) + v_sq_norms[:,np.newaxis]
+    return np.maximum(sq_distances, 0.)
 
-    kernels = list()
-    not_kernels = list()
-    for i in xrange(predicate_count):
-        kernel = np.exp(-np.linalg.norm(state_data[i] - predicate_vs[i], axis=1)**2 / h_squared[i])
-        kernels.append(kernel)
 
-        if state_given_not_geom[i] is not None:
-            not_kernel = np.exp(-np.linalg.norm(not_state_data[i] - predicate_vs[i], axis=1)**2 / not_h_squared[i])
-            not_kernels.append(not_kernel)
-        else:
-            not_kernels.append(None)
-
-    dim = len(x)
-    derivatives = np.zeros(dim)
-    for _,idx in enumerate(non_constant_elements):
-        s = 0.
-        for i in xrange(predicate_count):
-            term_derivative = 0.
-            not_term_derivative = 0.
-            if idx in predicate_index_mappings[i]:
-                j = predicate_index_mappings[i][idx]
-                n = np.sum(kernels[i] * (state_data[i][:,j] - predicate_vs[i][j]))
-                n_sum = np.sum(kernels[i])
-                if n_sum < 1e-100:
-                    n_sum = 1e-100
-
-                term_derivative = n
-                term_derivative /= n_sum
-
-                if state_given_not_geom[i] is not None:
-                    not_term_derivative = n
-                    not_term_derivative += np.sum(not_kernels[i] * (not_state_data[i][:,j] - predicate_vs[i][j]))
-                    not_term_derivative /= (n_sum + np.sum(not_kernels[i]))
-                else:
-                    not_term_derivative = n
-                    not_term_derivative /= n_sum
-
-            s += (term_derivative - not_term_derivative)
-        derivatives[idx] = s
-
-    return sign * np.array(derivatives)
-
-
-def find_geometric_state(x0, state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign=1.0):
-    r = minimize(f, x0, args=(state_given_geom, state_data, state_given_not_geom, not_state_data, object_mappings, non_constant_elements, bad_guesses, sign), method='BFGS', jac=f_prime, options={'disp': True})
-    return r.x
+def _log_density(kde, v, distances, data_count):
+    '''Returns the logarithms of the densities of 'kde' at the rows of 'v', given the distances
+    between the rows of 'v' and the 'data_count' data points encoded by 'kde' (a 'DataDistances' or
+    'kernel_trees.DataNeighbours' object). The densities are computed directly from the distances
+    for Gaussian kernels with a Euclidean metric and by 'kde.score_samples' for all other density estimators.
+    '''
+    if kde.kernel != 'gaussian' or kde.metric != 'euclidean':
+        return kde.score_samples(v)
+
+    h = kde.bandwidth
+    dim = v.shape[1]
+    log_kernel_sums = distances.log_kernel_sums(2. * h**2)
+    return log_kernel_sums - np.log(data_count) - 0.5 * dim * np.log(2. * np.pi) - dim * np.log(h)
+
+
+class DataDistances(object):
+    '''The squared distances between a batch of states (rows) and all data points (columns) of a mapping.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, sq_distances):
+        self.sq_distances = sq_distances
+
+    def log_kernel_sums(self, scale):
+        '''Returns the logarithms of the sums of the kernels exp(-d^2 / scale) of each state.
+        '''
+        log_kernels = -self.sq_distances / scale
+        max_log_kernels = np.max(log_kernels, axis=1)
+        return max_log_kernels + np.log(np.sum(np.exp(log_kernels - max_log_kernels[:,np.newaxis]), axis=1))
+
+    def kernel_sums(self, data, scale):
+        '''Returns a tuple (kernel_sums, weighted_data_sums) with the sums of the kernels exp(-d^2 / scale)
+        of each state and the sums of the data points weighted by the kernels of each state.
+        '''
+        kernels = np.exp(-self.sq_distances / scale)
+        return np.sum(kernels, axis=1), kernels.dot(data)
 
 
 mapping_vector_length = 17
+_optimisation_problem = None
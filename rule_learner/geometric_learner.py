@@ -18,43 +18,66 @@
 '''
 
 import numpy as np
-from sklearn.neighbors import KernelDensity
-from sklearn.grid_search import GridSearchCV
-from sklearn.externals import joblib
 
+from copy import copy
 from os import makedirs
 from os.path import isdir
+from multiprocessing import Pool, cpu_count
+
+from density_optimisation import kernel_trees, mapping_bundle
+from density_optimisation.mapping_bundle import MappingDensity
+from density_optimisation.bandwidth_selection import BandwidthSelector
 
 class GeometricLearner(object):
     '''
     Author -- Alex Mitrevski
     '''
-    def __init__(self, predicates, manipulated_obj_predicates, manipulated_predicate_idx):
+    def __init__(self, predicates, manipulated_obj_predicates, manipulated_predicate_idx, bandwidth_selector=None, processes=None):
+        '''
+        Keyword arguments:
+        predicates -- A list of predicate names.
+        manipulated_obj_predicates -- A list of booleans describing which predicates of the manipulated object are part of the model.
+        manipulated_predicate_idx -- Indices of the manipulated object predicates in the predicate vectors.
+        bandwidth_selector -- A 'density_optimisation.bandwidth_selection.BandwidthSelector' object that selects
+                              the bandwidths of the learned mappings; if None, a selector with
+                              the default parameters is used (default None).
+        processes -- Number of processes in which the mappings of the distinct predicates are learned;
+                     if None, as many processes as there are CPUs are used, while a value of 1
+                     learns the mappings in the calling process (default None).
+
+        '''
         self.predicates = list(predicates)
         self.manipulated_obj_predicates = np.array(manipulated_obj_predicates)
         self.manipulated_predicate_idx = np.array(manipulated_predicate_idx)
+        self.bandwidth_selector = bandwidth_selector
+        if self.bandwidth_selector is None:
+            self.bandwidth_selector = BandwidthSelector()
+        self.processes = processes
 
         self.object_count = -1
         self.predicate_count = len(self.predicates)
 
+        #a dictionary of 'BandwidthSelection' objects indexed by the names of the learned mappings
+        self.bandwidth_selections = dict()
+
     def learn_geometric_predicates(self, save_dir, object_key, instance_key, data, object_extraction_cb, predicate_calculation_cb, geometric_data_extraction_cb, entry_mapping_cb):
+        '''Learns the geometric mappings of the manipulated object predicates and saves them
+        to a single bundle file in 'save_dir' (see 'density_optimisation.mapping_bundle').
+
+        Returns:
+        mapping_file_names -- A list with the name of the bundle file.
+        data_file_names -- An empty list (the mapping data are stored in the bundle).
+        data_object_mappings -- A dictionary with the object mappings of each predicate.
+
+        '''
         dir_created = self._create_directory(save_dir)
         if not dir_created:
             return None
 
-        mapping_file_names = list()
-        data_file_names = list()
-
-        all_objects = list()
-        predicate_vectors = list()
-        labels = np.zeros(data.shape[0], dtype=bool)
-        for i in xrange(data.shape[0]):
-            objects = object_extraction_cb(data[i])
-            predicate_vectors.append(predicate_calculation_cb(objects))
-            all_objects.append(objects)
-            labels[i] = data[i,-1] > 0.
-        predicate_vectors = np.array(predicate_vectors)
-        self.object_count = len(objects)
+        all_objects = object_extraction_cb(data)
+        predicate_vectors = predicate_calculation_cb(all_objects)
+        labels = data[:,-1] > 0.
+        self.object_count = all_objects.shape[1]
         pos_labels_set = np.where(labels)[0]
 
         manipulated_pos_predicate_idx = self.manipulated_predicate_idx[np.where(self.manipulated_obj_predicates==True)[0]]
@@ -72,6 +95,11 @@ class GeometricLearner(object):
                 predicate_mapping_dict[predicate_idx] = [idx]
                 distinct_predicates.append(predicate_idx)
 
+        #the mappings of the distinct predicates are independent of each other,
+        #so each of them is learned by a separate task
+        tasks = list()
+        mapping_names = list()
+        mapping_indices = dict()
         for predicate_idx in predicate_mapping_dict:
             positive_data_idx = list()
             negative_data_idx = list()
@@ -94,43 +122,49 @@ class GeometricLearner(object):
                         negative_data_idx.append(np.where(predicate_vectors[:,manipulated_idx]==0)[0])
                         negative_data_object_mapping.append((obj1_idx, obj2_idx))
 
-            positive_data = list()
-            for i, obj_mapping_idx in enumerate(positive_data_object_mapping):
-                for j in positive_data_idx[i]:
-                    positive_data.append(geometric_data_extraction_cb(all_objects[j][obj_mapping_idx[0]], all_objects[j][obj_mapping_idx[1]]))
-            positive_data = np.array(positive_data)
-
-            negative_data = list()
-            for i, obj_mapping_idx in enumerate(negative_data_object_mapping):
-                for j in negative_data_idx[i]:
-                    negative_data.append(geometric_data_extraction_cb(all_objects[j][obj_mapping_idx[0]], all_objects[j][obj_mapping_idx[1]]))
-            negative_data = np.array(negative_data)
-
-            grid = GridSearchCV(KernelDensity(), {'bandwidth': np.linspace(0.01, 5.0, 150)}, cv=min(10, positive_data.shape[0]))
-            grid.fit(positive_data)
-            geom_given_positive = grid.best_estimator_
-
-            geom_given_negative = None
-            if negative_data.shape[0] > 0:
-                grid = GridSearchCV(KernelDensity(), {'bandwidth': np.linspace(0.01, 5.0, 150)}, cv=min(10, negative_data.shape[0]))
-                grid.fit(negative_data)
-                geom_given_negative = grid.best_estimator_
-
-            mapping_file_name = save_dir + '/geom_given_' + self.predicates[predicate_idx] + '_' + str(idx) + '.pkl'
-            data_file_name = save_dir + '/moving_' + self.predicates[predicate_idx] + '_' + str(idx) + '.npy'
-            mapping_file_names.append(mapping_file_name)
-            data_file_names.append(data_file_name)
-            joblib.dump(geom_given_positive, mapping_file_name)
-            np.save(data_file_name, positive_data)
-
-            mapping_file_name = save_dir + '/geom_given_not_' + self.predicates[predicate_idx] + '_' + str(idx) + '.pkl'
-            data_file_name = save_dir + '/moving_not_' + self.predicates[predicate_idx] + '_' + str(idx) + '.npy'
-            mapping_file_names.append(mapping_file_name)
-            data_file_names.append(data_file_name)
-            if geom_given_negative is not None:
-                joblib.dump(geom_given_negative, mapping_file_name)
-                np.save(data_file_name, negative_data)
+            mapping_names.append(self.predicates[predicate_idx] + '_' + str(idx))
+            mapping_indices[predicate_idx] = len(tasks)
+            tasks.append(((positive_data_idx, positive_data_object_mapping), (negative_data_idx, negative_data_object_mapping)))
+
+        processes = self.processes
+        if processes is None:
+            processes = cpu_count()
+        processes = min(processes, len(tasks))
+
+        if processes <= 1:
+            _set_learning_data((all_objects, geometric_data_extraction_cb, self.bandwidth_selector))
+            try:
+                results = map(_learn_predicate_mappings, tasks)
+            finally:
+                _set_learning_data(None)
+        else:
+            #the worker processes can't start processes of their own, so they select the bandwidths in a single process
+            worker_bandwidth_selector = copy(self.bandwidth_selector)
+            worker_bandwidth_selector.processes = 1
+            learning_data = (all_objects, geometric_data_extraction_cb, worker_bandwidth_selector)
+
+            #the workers get the objects when they are started rather than with each task; the learning data
+            #are pickled for the workers, so 'geometric_data_extraction_cb' has to be a module-level function
+            pool = Pool(processes, initializer=_set_learning_data, initargs=(learning_data,))
+            try:
+                results = pool.map(_learn_predicate_mappings, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        mappings = list()
+        not_mappings = list()
+        for mapping_name, ((positive_data, positive_selection), (negative_data, negative_selection)) in zip(mapping_names, results):
+            self.bandwidth_selections['geom_given_' + mapping_name] = positive_selection
+            mappings.append(MappingDensity(positive_data, positive_selection.bandwidth))
+            if negative_selection is not None:
+                self.bandwidth_selections['geom_given_not_' + mapping_name] = negative_selection
+                not_mappings.append(MappingDensity(negative_data, negative_selection.bandwidth))
+            else:
+                not_mappings.append(None)
 
+        entry_mappings = list()
+        entry_object_mappings = list()
         for idx in manipulated_pos_predicate_idx:
             predicate_idx = idx % self.predicate_count
             obj1_idx = object_mappings[idx][0]
@@ -138,8 +172,17 @@ class GeometricLearner(object):
             if self.predicates[predicate_idx] not in data_object_mappings:
                 data_object_mappings[self.predicates[predicate_idx]] = list()
             data_object_mappings[self.predicates[predicate_idx]].append((obj1_idx, obj2_idx))
+            entry_mappings.append(mapping_indices[predicate_idx])
+            entry_object_mappings.append((obj1_idx, obj2_idx))
+
+        bundle_file_name = save_dir + '/mappings' + mapping_bundle.bundle_extension
+        mapping_bundle.save_bundle(bundle_file_name, mapping_names, mappings, not_mappings, entry_mappings, entry_object_mappings)
 
-        return mapping_file_names, data_file_names, data_object_mappings
+        #the trees are built over the data in the order in which they are loaded from the bundle
+        _, pos_mapping_data, _, neg_mapping_data, _ = mapping_bundle.load_bundle(bundle_file_name)
+        kernel_trees.save_trees(pos_mapping_data + neg_mapping_data, bundle_file_name)
+
+        return [bundle_file_name], [], data_object_mappings
 
     def _create_directory(self, dir_name):
         if isdir(dir_name):
@@ -150,3 +193,54 @@ class GeometricLearner(object):
                 return True
             except OSError:
                 return False
+
+
+def _extract_geometric_data(all_objects, data_idx, data_object_mapping, geometric_data_extraction_cb):
+    '''Returns the geometric data of the object pairs in 'data_object_mapping'
+    for the data items whose indices are given in 'data_idx'.
+
+    Keyword arguments:
+    all_objects -- A 2D 'numpy' array of objects (see 'global_utils.extract_object_arrays').
+    data_idx -- A list in which the i-th element stores the data item indices for the i-th object pair.
+    data_object_mapping -- A list of object index pairs.
+    geometric_data_extraction_cb -- Function that extracts geometric data from two arrays of objects.
+
+    '''
+    geometric_data = list()
+    for i, obj_mapping_idx in enumerate(data_object_mapping):
+        if len(data_idx[i]) > 0:
+            objects = all_objects[data_idx[i]]
+            geometric_data.append(geometric_data_extraction_cb(objects[:,obj_mapping_idx[0]], objects[:,obj_mapping_idx[1]]))
+
+    if len(geometric_data) == 0:
+        return np.array(geometric_data)
+    return np.vstack(geometric_data)
+
+
+def _set_learning_data(learning_data):
+    global _learning_data
+    _learning_data = learning_data
+
+
+def _learn_predicate_mappings(task):
+    '''Extracts the data of the positive and the negative mapping of a predicate and selects their bandwidths.
+    'task' is a tuple with a (data indices, object mappings) tuple for each of the two mappings;
+    the negative mapping is only learned if there are negative data.
+
+    Returns:
+    A list with a (data, 'BandwidthSelection' object) tuple for each of the two mappings
+    (the selection is None for a mapping that isn't learned).
+
+    '''
+    all_objects, geometric_data_extraction_cb, bandwidth_selector = _learning_data
+    results = list()
+    for i, (data_idx, data_object_mapping) in enumerate(task):
+        data = _extract_geometric_data(all_objects, data_idx, data_object_mapping, geometric_data_extraction_cb)
+        if i > 0 and data.shape[0] == 0:
+            results.append((data, None))
+        else:
+            results.append((data, bandwidth_selector.select(data)))
+    return results
+
+
+_learning_data = None
@@ -17,10 +17,14 @@
     along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import os
+import time
+from glob import glob
+from collections import deque
 import numpy as np
 
 from utils.geometry import Vector, Rotator, Box
-from utils.predicates import PredicateLibrary
+from utils.predicates import PredicateLibrary, BatchPredicateLibrary
 from utils.object import ObjectData
 from utils.conversion import TypeConverter, Types
 
@@ -30,13 +34,111 @@ predicates = [PredicateLibrary.on, PredicateLibrary.leftOf, PredicateLibrary.rig
 PredicateLibrary.below, PredicateLibrary.behind, PredicateLibrary.inFrontOf, PredicateLibrary.ntpp, \
 PredicateLibrary.ntppi, PredicateLibrary.ec, PredicateLibrary.dc, PredicateLibrary.eq, PredicateLibrary.po]
 
+batch_predicates = [BatchPredicateLibrary.on, BatchPredicateLibrary.leftOf, BatchPredicateLibrary.rightOf, BatchPredicateLibrary.above, \
+BatchPredicateLibrary.below, BatchPredicateLibrary.behind, BatchPredicateLibrary.inFrontOf, BatchPredicateLibrary.ntpp, \
+BatchPredicateLibrary.ntppi, BatchPredicateLibrary.ec, BatchPredicateLibrary.dc, BatchPredicateLibrary.eq, BatchPredicateLibrary.po]
+
 predicate_names = ['on', 'leftOf', 'rightOf', 'above', 'below', \
 'behind', 'inFrontOf', 'ntpp', 'ntppi', 'ec', 'dc', 'eq', 'po']
 
 object_item_count = 24
+
+#the fields follow the order in which the object data are logged
+object_dtype = np.dtype([('init_position', float, (3,)), ('init_rotation', float, (3,)), \
+('position', float, (3,)), ('rotation', float, (3,)), \
+('init_bounding_box', float, (6,)), ('bounding_box', float, (6,))])
+
 predicate_acceptance_threshold = 0.9
 bit_noise_probability = 0.1
-
+log_cache_extension = '.npy'
+log_read_size = 1 << 16
+
+
+def load_log_data(file_name):
+    '''Returns the data stored in the log file 'file_name'.
+
+    The parsed data are cached in a binary file next to the log whose name
+    encodes the size and modification time of the log, such that the cache
+    is rebuilt whenever the log changes; a valid cache is memory-mapped
+    (read-only) instead of parsing the log again.
+
+    Keyword arguments:
+    file_name -- Path of a whitespace-separated log file.
+
+    '''
+    stats = os.stat(file_name)
+    cache_file_name = '%s.%d_%d%s' % (file_name, stats.st_size, int(stats.st_mtime * 1e6), log_cache_extension)
+    if os.path.isfile(cache_file_name):
+        return np.load(cache_file_name, mmap_mode='r')
+
+    data = np.genfromtxt(file_name)
+    for old_cache_file_name in glob(file_name + '.*_*' + log_cache_extension):
+        try:
+            os.remove(old_cache_file_name)
+        except OSError:
+            pass
+
+    try:
+        #we write to a temporary file first so that concurrent readers never see a partial cache
+        tmp_file_name = cache_file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as cache_file:
+            np.save(cache_file, data)
+        os.rename(tmp_file_name, cache_file_name)
+    except (IOError, OSError):
+        pass
+
+    return data
+
+def follow_log_data(file_name, chunk_size=100, poll_interval=1., idle_timeout=None):
+    '''Generator that yields the data items of the log file 'file_name' in chunks,
+    including the items that are appended to the log while it is being read
+    (e.g. while the simulation is still running in the random data collection mode).
+    Only complete lines are parsed, so a partially written item is read once it is complete.
+
+    Keyword arguments:
+    file_name -- Path of a whitespace-separated log file.
+    chunk_size -- Maximum number of data items in a single chunk (default 100).
+    poll_interval -- Time (in seconds) to wait before checking the log for new data (default 1).
+    idle_timeout -- Time (in seconds) after which the generator stops if no new data are
+                    appended to the log (default None, in which case the log is followed indefinitely).
+
+    Returns:
+    chunk -- A 2D 'numpy' array in which each row is a single data item.
+
+    '''
+    partial_line = ''
+    lines = deque()
+    last_data_time = time.time()
+    with open(file_name, 'r') as log_file:
+        while True:
+            #the log is read in blocks and only until a full chunk of lines
+            #is buffered, such that the memory use doesn't depend on the size of the log
+            new_data = ''
+            if len(lines) < chunk_size:
+                #seeking to the current position clears the end-of-file state of the file
+                log_file.seek(log_file.tell())
+                new_data = log_file.read(log_read_size)
+                if new_data:
+                    last_data_time = time.time()
+                    new_lines = (partial_line + new_data).split('\n')
+                    partial_line = new_lines.pop()
+                    lines.extend([line for line in new_lines if line.strip()])
+
+            if len(lines) >= chunk_size:
+                yield _parse_log_lines([lines.popleft() for _ in xrange(chunk_size)])
+            elif not new_data:
+                if len(lines) > 0:
+                    yield _parse_log_lines(lines)
+                    lines.clear()
+                if idle_timeout is not None and time.time() - last_data_time > idle_timeout:
+                    break
+                time.sleep(poll_interval)
+
+    if partial_line.strip():
+        yield _parse_log_lines([partial_line])
+
+def _parse_log_lines(lines):
+    return np.array([line.split() for line in lines], dtype=float)
 
 def extract_objects(data):
     object_count = len(data) / object_item_count
@@ -100,6 +202,79 @@ def calculate_predicate_values(objects):
 
     return np.array(predicate_vector)
 
+def extract_object_arrays(data):
+    '''Converts all rows of 'data' to a structured (data.shape[0], object_count) array
+    of type 'object_dtype' in one pass. The objects are ordered in the same way
+    as by 'extract_objects' and the array fields have the same values as
+    the corresponding 'ObjectData' attributes.
+
+    Keyword arguments:
+    data -- A 2D 'numpy' array in which each row is a single data item.
+
+    '''
+    object_count = data.shape[1] / object_item_count
+    #the objects are always copied, since 'data' may be a read-only (e.g. memory-mapped) array whose columns are modified below
+    objects = np.array(data[:,0:object_count*object_item_count], dtype=float, copy=True).view(object_dtype)
+
+    if object_count == 2:
+        #'extract_objects' uses the top of the second object's bounding box as its z coordinate
+        objects[:,1]['init_position'][:,2] = data[:,41]
+    elif object_count == 3:
+        #see 'extract_objects' for a description of the x coordinates
+        #and the ordering of the static objects
+        objects[:,1]['init_position'][:,0] = data[:,39]
+        objects[:,2]['init_position'][:,0] = data[:,60]
+        swap_idx = np.where(np.logical_not(data[:,39] < data[:,60]))[0]
+        objects[swap_idx,1:] = objects[swap_idx,2:0:-1]
+
+    return objects
+
+def calculate_predicate_matrix(objects):
+    '''Calculates the predicate vectors of all data items in 'objects' at once;
+    the i-th row of the result is equal to the vector returned by 'calculate_predicate_values'
+    for the objects of the i-th data item.
+
+    Keyword arguments:
+    objects -- A 2D 'numpy' array of type 'object_dtype' (see 'extract_object_arrays').
+
+    '''
+    return _calculate_predicate_matrix(objects['init_bounding_box'])
+
+def calculate_final_predicate_matrix(objects):
+    '''Batch version of 'calculate_final_predicate_values'.
+
+    Keyword arguments:
+    objects -- A 2D 'numpy' array of type 'object_dtype' (see 'extract_object_arrays').
+
+    '''
+    return _calculate_predicate_matrix(objects['bounding_box'])
+
+def _calculate_predicate_matrix(bounding_boxes):
+    sample_count = bounding_boxes.shape[0]
+    object_count = bounding_boxes.shape[1]
+    predicate_count = len(batch_predicates)
+    predicate_matrix = np.zeros((sample_count, (object_count * (object_count - 1) / 2) * predicate_count), dtype=int)
+
+    start_idx = 0
+    for i in xrange(object_count):
+        for j in xrange(i+1, object_count):
+            b_boxes1 = bounding_boxes[:,i]
+            b_boxes2 = bounding_boxes[:,j]
+            for k, p in enumerate(batch_predicates):
+                predicate_matrix[:,start_idx+k] = p(b_boxes1, b_boxes2)
+
+            #the interval tests don't describe polygons without an area,
+            #so we use the polygon predicates for the (rare) degenerate boxes
+            degenerate_idx = np.where(BatchPredicateLibrary.is_degenerate(b_boxes1) | BatchPredicateLibrary.is_degenerate(b_boxes2))[0]
+            for idx in degenerate_idx:
+                b_box1 = Box(*b_boxes1[idx])
+                b_box2 = Box(*b_boxes2[idx])
+                for k, p in enumerate(predicates):
+                    predicate_matrix[idx,start_idx+k] = p(b_box1, b_box2, return_type=Types.INT)
+            start_idx += predicate_count
+
+    return predicate_matrix
+
 def get_object_entry_list(object_count):
     entries = list()
     for i in xrange(object_count):
@@ -165,3 +340,57 @@ def extract_geometric_mapping_data(*args):
         q1[0], q1[1], q1[2], q1[3], q2[0], q2[1], q2[2], q2[3]]
 
     return np.array(data)
+
+def extract_geometric_mapping_matrix(*args):
+    '''Batch version of 'extract_geometric_mapping_data'; the i-th row of the result
+    stores the geometric mapping data of the i-th element(s) of the input arrays.
+
+    Keyword arguments:
+    args -- One or two one-dimensional 'numpy' arrays of type 'object_dtype'.
+
+    '''
+    data = list()
+    if len(args) == 1:
+        objects = args[0]
+        b_box_sizes = objects['init_bounding_box'][:,3:6] - objects['init_bounding_box'][:,0:3]
+        q = _quaternions_from_euler(objects['init_rotation'])
+        data = np.hstack((b_box_sizes, objects['init_position'], q))
+    elif len(args) == 2:
+        objects1 = args[0]
+        objects2 = args[1]
+
+        b_box1_sizes = objects1['init_bounding_box'][:,3:6] - objects1['init_bounding_box'][:,0:3]
+        b_box2_sizes = objects2['init_bounding_box'][:,3:6] - objects2['init_bounding_box'][:,0:3]
+        q1 = _quaternions_from_euler(objects1['init_rotation'])
+        q2 = _quaternions_from_euler(objects2['init_rotation'])
+        t_rel = objects1['init_position'] - objects2['init_position']
+
+        data = np.hstack((b_box1_sizes, b_box2_sizes, t_rel, q1, q2))
+
+    return np.array(data)
+
+def _quaternions_from_euler(rotations):
+    '''Vectorised version of 'transformations.quaternion_from_euler' for the default (sxyz) axes.
+
+    Keyword arguments:
+    rotations -- A (n, 3) 'numpy' array of (roll, pitch, yaw) angles in degrees.
+
+    '''
+    half_angles = np.radians(rotations) / 2.0
+    ci = np.cos(half_angles[:,0])
+    si = np.sin(half_angles[:,0])
+    cj = np.cos(half_angles[:,1])
+    sj = np.sin(half_angles[:,1])
+    ck = np.cos(half_angles[:,2])
+    sk = np.sin(half_angles[:,2])
+    cc = ci*ck
+    cs = ci*sk
+    sc = si*ck
+    ss = si*sk
+
+    q = np.empty((rotations.shape[0], 4))
+    q[:,0] = cj*cc + sj*ss
+    q[:,1] = cj*sc - sj*cs
+    q[:,2] = cj*ss + sj*cc
+    q[:,3] = cj*cs - sj*sc
+    return q
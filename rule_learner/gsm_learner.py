@@ -22,10 +22,11 @@ import numpy as np
 import global_utils
 from knowledge_base import KnowledgeBase
 from delta_memory.memory import DeltaMemory
+from delta_memory.storage import StorageTypes, create_storage
 
 def get_left_right_obj_idx(objects):
     left_obj_idx = right_obj_idx = -1
-    if objects[1].init_position.x < objects[2].init_position.x:
+    if objects[1]['init_position'][0] < objects[2]['init_position'][0]:
         left_obj_idx = 1
         right_obj_idx = 2
     else:
@@ -35,7 +36,7 @@ def get_left_right_obj_idx(objects):
 
 def get_below_above_obj_idx(objects):
     below_obj_idx = above_obj_idx = -1
-    if objects[1].init_bounding_box.min.y < objects[2].init_bounding_box.min.y:
+    if objects[1]['init_bounding_box'][1] < objects[2]['init_bounding_box'][1]:
         below_obj_idx = 1
         above_obj_idx = 2
     else:
@@ -43,11 +44,14 @@ def get_below_above_obj_idx(objects):
         above_obj_idx = 1
     return below_obj_idx, above_obj_idx
 
+#StorageTypes.SQLITE keeps the databases in files in the current directory
+storage_type = StorageTypes.COUCHDB
+
 kb_db_name = 'knowledge_base'
-kb = KnowledgeBase(kb_db_name)
+kb = KnowledgeBase(kb_db_name, create_storage(kb_db_name, storage_type))
 
 dm_db_name = 'delta_memory'
-dm = DeltaMemory(dm_db_name, kb)
+dm = DeltaMemory(dm_db_name, kb, create_storage(dm_db_name, storage_type))
 
 keys_file = file('keys.txt', 'r')
 object_key = keys_file.readline().rstrip('\n\r')
@@ -60,31 +64,29 @@ y_gsm_distribution = None
 x_gsm_boundaries = None
 y_gsm_boundaries = None
 
-data = np.genfromtxt('data/' + object_key + '_' + instance_key + '.log')
-objects = global_utils.extract_objects(data[0])
-if len(objects) > 2:
-    gsm_data = np.genfromtxt('data/' + object_key + '_' + instance_key + '_gsm.log')
+data = global_utils.load_log_data('data/' + object_key + '_' + instance_key + '.log')
+data_objects = global_utils.extract_object_arrays(data)
+if data_objects.shape[1] > 2:
+    gsm_data = global_utils.load_log_data('data/' + object_key + '_' + instance_key + '_gsm.log')
+    gsm_objects = global_utils.extract_object_arrays(gsm_data)
 
-    objects = global_utils.extract_objects(data[0])
+    objects = data_objects[0]
     left_obj_idx, right_obj_idx = get_left_right_obj_idx(objects)
-    delta_obj_x_diff = objects[right_obj_idx].init_bounding_box.min.x - objects[left_obj_idx].init_bounding_box.max.x
-    delta_left_x = objects[left_obj_idx].init_bounding_box.max.x
+    delta_obj_x_diff = objects[right_obj_idx]['init_bounding_box'][0] - objects[left_obj_idx]['init_bounding_box'][3]
+    delta_left_x = objects[left_obj_idx]['init_bounding_box'][3]
 
-    objects = global_utils.extract_objects(gsm_data[0])
+    objects = gsm_objects[0]
     left_obj_idx, right_obj_idx = get_left_right_obj_idx(objects)
-    x_obj_diff = objects[right_obj_idx].init_bounding_box.min.x - objects[left_obj_idx].init_bounding_box.max.x
-    left_x = objects[left_obj_idx].init_bounding_box.max.x
+    x_obj_diff = objects[right_obj_idx]['init_bounding_box'][0] - objects[left_obj_idx]['init_bounding_box'][3]
+    left_x = objects[left_obj_idx]['init_bounding_box'][3]
 
     #######################
     # creating model for X
     #######################
-    diff = [list(), list()]
-    success = [list(), list()]
-    for i in xrange(gsm_data.shape[0]):
-        objects = global_utils.extract_objects(gsm_data[i])
-        x_diff = objects[0].init_position.x - objects[left_obj_idx].init_bounding_box.max.x
-        diff[0].append(x_diff)
-        success[0].append(gsm_data[i,-1])
+    diff = [None, None]
+    success = [None, None]
+    diff[0] = gsm_objects[:,0]['init_position'][:,0] - gsm_objects[:,left_obj_idx]['init_bounding_box'][:,3]
+    success[0] = gsm_data[:,-1]
 
     bin_count = int(abs(np.ceil(x_obj_diff / gsm_resolution)))
     hist = np.histogram(diff[0], bins=bin_count, weights=success[0])
@@ -101,21 +103,18 @@ if len(objects) > 2:
     #######################
     # creating model for Y
     #######################
-    objects = global_utils.extract_objects(data[0])
+    objects = data_objects[0]
     below_obj_idx, above_obj_idx = get_below_above_obj_idx(objects)
-    delta_obj_y_diff = objects[above_obj_idx].init_position.y - objects[below_obj_idx].init_position.y
-    delta_below_y = objects[below_obj_idx].init_position.y
+    delta_obj_y_diff = objects[above_obj_idx]['init_position'][1] - objects[below_obj_idx]['init_position'][1]
+    delta_below_y = objects[below_obj_idx]['init_position'][1]
 
-    objects = global_utils.extract_objects(gsm_data[0])
+    objects = gsm_objects[0]
     below_obj_idx, above_obj_idx = get_below_above_obj_idx(objects)
-    y_obj_diff = objects[above_obj_idx].init_position.y - objects[below_obj_idx].init_position.y
-    below_y = objects[below_obj_idx].init_position.y
+    y_obj_diff = objects[above_obj_idx]['init_position'][1] - objects[below_obj_idx]['init_position'][1]
+    below_y = objects[below_obj_idx]['init_position'][1]
 
-    for i in xrange(gsm_data.shape[0]):
-        objects = global_utils.extract_objects(gsm_data[i])
-        y_diff = objects[0].init_position.y - objects[below_obj_idx].init_position.y
-        diff[1].append(y_diff)
-        success[1].append(gsm_data[i,-1])
+    diff[1] = gsm_objects[:,0]['init_position'][:,1] - gsm_objects[:,below_obj_idx]['init_position'][:,1]
+    success[1] = gsm_data[:,-1]
 
     bin_count = int(abs(np.ceil(y_obj_diff / gsm_resolution)))
     if bin_count == 0:
@@ -132,26 +131,21 @@ if len(objects) > 2:
         actual_y = below_y + y
         gsm_boundary = (actual_y - below_y + gamma_y * delta_below_y) / gamma_y - delta_below_y
         y_gsm_boundaries.append(gsm_boundary)
-elif len(objects) == 2:
-    objects = global_utils.extract_objects(data[0])
-    bb_sizes = [objects[1].init_bounding_box.max.x - objects[1].init_bounding_box.min.x, \
-    objects[1].init_bounding_box.max.y - objects[1].init_bounding_box.min.y]
+elif data_objects.shape[1] == 2:
+    objects = data_objects[0]
+    bb_sizes = [objects[1]['init_bounding_box'][3] - objects[1]['init_bounding_box'][0], \
+    objects[1]['init_bounding_box'][4] - objects[1]['init_bounding_box'][1]]
 
     #################
     # creating model
     #################
-    diff = [list(), list()]
-    success = [list(), list()]
-    for i in xrange(data.shape[0]):
-        objects = global_utils.extract_objects(data[i])
-        x_diff = objects[0].init_position.x - objects[1].init_bounding_box.min.x
-        y_diff = objects[0].init_position.y - objects[1].init_bounding_box.min.y
-
-        diff[0].append(x_diff)
-        success[0].append(data[i,-1])
-
-        diff[1].append(y_diff)
-        success[1].append(data[i,-1])
+    diff = [None, None]
+    success = [None, None]
+    diff[0] = data_objects[:,0]['init_position'][:,0] - data_objects[:,1]['init_bounding_box'][:,0]
+    success[0] = data[:,-1]
+
+    diff[1] = data_objects[:,0]['init_position'][:,1] - data_objects[:,1]['init_bounding_box'][:,1]
+    success[1] = data[:,-1]
 
     bin_count = int(np.ceil(bb_sizes[0] / gsm_resolution))
     hist = np.histogram(diff[0], bins=bin_count, weights=success[0])
@@ -17,33 +17,88 @@
     along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
 '''
 
-import couchdb
+import time
+from delta_memory.storage import StorageTypes, create_storage
 
 class KnowledgeBase(object):
-    '''
+    '''A hierarchy of object and instance categories, in which each category
+    is mapped to a list of its subcategories. The hierarchy is kept in memory
+    as a child -> parent dictionary and is only reloaded from the database
+    if the revision of the knowledge base document has changed.
+
     Author -- Alex Mitrevski
+
     '''
-    def __init__(self, db_name):
+    def __init__(self, db_name, storage=None, revision_check_interval=1.):
+        '''
+        Keyword arguments:
+        db_name -- Name of the knowledge base database.
+        storage -- A 'delta_memory.storage.Storage' object in which the knowledge base is kept;
+                   if None, a CouchDB database with the name 'db_name' is used (default None).
+        revision_check_interval -- Minimum time (in seconds) between two checks whether the knowledge base
+                                   has changed in the database; the knowledge base is checked
+                                   on every query if the interval is 0 (default 1).
+
+        '''
         self.db_name = db_name
-        self.db_server = couchdb.Server()
-        if self.db_name not in self.db_server:
+        self.storage = storage
+        if self.storage is None:
+            self.storage = create_storage(self.db_name, StorageTypes.COUCHDB)
+
+        if not self.storage.has_document('kb'):
             self._create_db()
-        self.kb = self.db_server[self.db_name]
 
-    def _create_db(self):
-        db = self.db_server.create(self.db_name)
+        self.revision_check_interval = revision_check_interval
+        self.revision = None
+        self.last_revision_check = None
+        self.parents = dict()
 
-        db['kb'] = { 'bottle' : ['ketchup_bottle'], \
+    def _create_db(self):
+        self.storage.save_document({ 'bottle' : ['ketchup_bottle'], \
         'book' : ['hardcover', 'paperback'], \
-        'planar_surface' : ['table', 'shelf', 'fridge_door'] }
+        'planar_surface' : ['table', 'shelf', 'fridge_door'] }, 'kb')
 
     def get_parent_key(self, key):
-        parent = None
+        self._update_hierarchy()
+        return self.parents.get(key, None)
+
+    def get_ancestor_keys(self, key):
+        '''Returns a list with the parent of 'key', the parent of the parent, and so forth.
+        '''
+        self._update_hierarchy()
+        ancestors = list()
+        parent = self.parents.get(key, None)
+
+        #the check for repeated keys prevents infinite loops in case of cycles in the hierarchy
+        while parent is not None and parent != key and parent not in ancestors:
+            ancestors.append(parent)
+            parent = self.parents.get(parent, None)
+        return ancestors
 
-        doc = self.kb['kb']
+    def _update_hierarchy(self):
+        '''Reloads the child -> parent dictionary if the knowledge base document has changed
+        and at least 'self.revision_check_interval' seconds have passed since the last check.
+        '''
+        current_time = time.time()
+        if self.last_revision_check is not None and current_time - self.last_revision_check < self.revision_check_interval:
+            return
+        self.last_revision_check = current_time
+
+        revision = self.storage.get_revision('kb')
+        if revision == self.revision:
+            return
+
+        doc = self.storage.get_document('kb')
+        parents = dict()
         for k,v in doc.iteritems():
-            if key in v:
-                parent = k
-                break
+            #we skip the metadata of the document (its ID and revision)
+            if k.startswith('_'):
+                continue
+
+            for child in v:
+                #the first parent is kept if a category has more than one
+                if child not in parents:
+                    parents[child] = k
 
-        return parent
+        self.parents = parents
+        self.revision = doc['_rev']
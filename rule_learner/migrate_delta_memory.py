@@ -0,0 +1,96 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+'''Converts a CouchDB delta memory database from the old layout, in which all symbolic
+and all geometric data are stored in two documents ('symbolic' and 'geometric'),
+to the layout used by 'delta_memory.memory.DeltaMemory', in which each object/instance pair
+has its own documents. The converted memory is either written to the same CouchDB database,
+replacing the old documents, or to an embedded database, leaving the CouchDB database unchanged.
+The script can be rerun safely if it is interrupted.
+'''
+
+import uuid
+
+from delta_memory.memory import MemoryDocumentKeys
+from delta_memory.storage import StorageTypes, CouchDBStorage, create_storage
+
+def save_document(storage, doc, doc_type, object_key=None, instance_key=None):
+    old_doc = storage.get_document(doc_type, object_key, instance_key)
+    if old_doc is not None:
+        doc['_rev'] = old_doc['_rev']
+    storage.save_document(doc, doc_type, object_key, instance_key)
+
+def migrate_documents(source, target, doc_type, index_type, links_type, convert_data_cb):
+    old_doc = source.get_document(doc_type)
+    index = dict()
+    for object_key, object_data in old_doc.iteritems():
+        if object_key == '_id' or object_key == '_rev':
+            continue
+
+        index[object_key] = list()
+        for instance_key, instance_data in object_data[MemoryDocumentKeys.DATA].iteritems():
+            index[object_key].append(instance_key)
+
+            doc = convert_data_cb(object_data, instance_key, instance_data)
+            doc[MemoryDocumentKeys.DELETED_INSTANCES] = object_data[MemoryDocumentKeys.DELETED_INSTANCES].get(instance_key, list())
+            save_document(target, doc, doc_type, object_key, instance_key)
+
+            links = object_data[MemoryDocumentKeys.LINKS].get(instance_key, dict())
+            save_document(target, { MemoryDocumentKeys.LINKS : links }, links_type, object_key, instance_key)
+    save_document(target, { MemoryDocumentKeys.OBJECTS : index, MemoryDocumentKeys.DATA_VERSION : uuid.uuid4().hex }, index_type)
+
+def convert_symbolic_data(object_data, instance_key, instance_data):
+    return { MemoryDocumentKeys.DELTA : instance_data[MemoryDocumentKeys.DELTA], MemoryDocumentKeys.FULL : instance_data[MemoryDocumentKeys.FULL] }
+
+def convert_geometric_data(object_data, instance_key, instance_data):
+    return { MemoryDocumentKeys.DATA : instance_data, \
+             MemoryDocumentKeys.DATA_FILE_NAMES : object_data[MemoryDocumentKeys.DATA_FILE_NAMES][instance_key], \
+             MemoryDocumentKeys.DATA_OBJECT_MAPPINGS : object_data[MemoryDocumentKeys.DATA_OBJECT_MAPPINGS][instance_key], \
+             MemoryDocumentKeys.DATA_VERSION : uuid.uuid4().hex }
+
+dm_db_name = 'delta_memory'
+
+#StorageTypes.SQLITE writes the converted memory to a file in the current directory
+target_storage_type = StorageTypes.COUCHDB
+
+source = CouchDBStorage(dm_db_name)
+if target_storage_type == StorageTypes.COUCHDB:
+    target = source
+else:
+    target = create_storage(dm_db_name, target_storage_type)
+
+if not source.has_document(MemoryDocumentKeys.SYMBOLIC_DATA) and not source.has_document(MemoryDocumentKeys.GEOMETRIC_DATA):
+    print '%s already uses the new memory layout' % dm_db_name
+else:
+    objects_doc = source.get_document(MemoryDocumentKeys.OBJECTS)
+    save_document(target, { MemoryDocumentKeys.OBJECTS : objects_doc[MemoryDocumentKeys.OBJECTS] }, MemoryDocumentKeys.OBJECTS)
+
+    #the old documents are only removed after they have been converted
+    #since 'DeltaMemory' uses the old symbolic document for recognising the old layout
+    if source.has_document(MemoryDocumentKeys.GEOMETRIC_DATA):
+        migrate_documents(source, target, MemoryDocumentKeys.GEOMETRIC_DATA, MemoryDocumentKeys.GEOMETRIC_INDEX, MemoryDocumentKeys.GEOMETRIC_LINKS, convert_geometric_data)
+        if target is source:
+            source.delete_document(MemoryDocumentKeys.GEOMETRIC_DATA)
+
+    if source.has_document(MemoryDocumentKeys.SYMBOLIC_DATA):
+        migrate_documents(source, target, MemoryDocumentKeys.SYMBOLIC_DATA, MemoryDocumentKeys.SYMBOLIC_INDEX, MemoryDocumentKeys.SYMBOLIC_LINKS, convert_symbolic_data)
+        if target is source:
+            source.delete_document(MemoryDocumentKeys.SYMBOLIC_DATA)
+
+    print 'Migrated %s to the new memory layout' % dm_db_name
@@ -0,0 +1,584 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from copy import deepcopy
+from multiprocessing import cpu_count
+import numpy as np
+
+import global_utils
+import density_optimisation.optimisation_utils as optimisation
+from density_optimisation.kernel_trees import TruncatedKernels
+from utils.object import ObjectData
+from knowledge_base import KnowledgeBase
+from delta_memory.memory import DeltaMemory
+from delta_memory.model_registry import ModelRegistry
+from delta_memory.storage import StorageTypes, create_storage
+from delta_memory.matches import GeometricMatchDescriptions
+
+import transformations as tf
+
+class PoseSolver(object):
+    '''Finds manipulated object poses using the learned delta models.
+    The models of a problem instance are loaded once and then reused
+    for all subsequent requests for the same instance.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, path, kb_db_name='knowledge_base', dm_db_name='delta_memory', max_model_bytes=512*1024*1024, storage_type=StorageTypes.COUCHDB, max_symbolic_distance=0, optimisation_starts=1, optimisation_processes=None, kernel_tolerance=None, persistent_pool=False):
+        '''
+        Keyword arguments:
+        path -- Path of the 'rule_learner' directory; the file names stored in the delta memory are relative to it.
+        kb_db_name -- Name of the knowledge base database (default 'knowledge_base').
+        dm_db_name -- Name of the delta memory database (default 'delta_memory').
+        max_model_bytes -- Upper bound on the total size (in bytes) of the mappings kept in memory (default 512 MB).
+        storage_type -- Type of the database storage; one of the 'delta_memory.storage.StorageTypes' constants.
+                        The files of the embedded storage are kept in 'path' (default StorageTypes.COUCHDB).
+        max_symbolic_distance -- Maximum number of predicates in which the symbolic representation of a pair
+                                 of static objects may differ from a memorised representation
+                                 for the two to match (default 0).
+        optimisation_starts -- Number of initial guesses that are optimised for each guess key;
+                               only the best optimised pose of each key is returned (default 1).
+        optimisation_processes -- Number of processes in which the initial guesses are optimised; if None,
+                                  as many processes as there are CPUs are used if 'optimisation_starts' is
+                                  larger than 1 and the guesses are optimised in the calling process otherwise (default None).
+        kernel_tolerance -- If given, the optimised function is approximated by leaving out the kernels
+                            of distant data points, such that the relative error of the kernel sums is at most
+                            the tolerance, using the trees stored next to the mapping data;
+                            if None, the kernels at all data points are used (default None).
+        persistent_pool -- If True, the worker processes used for optimising the initial guesses are started
+                           once and reused by all 'solve' calls until 'close' is called (default False).
+
+        '''
+        self.path = path
+        self.kb = KnowledgeBase(kb_db_name, create_storage(kb_db_name, storage_type, path))
+        self.dm = DeltaMemory(dm_db_name, self.kb, create_storage(dm_db_name, storage_type, path))
+        self.models = ModelRegistry(self.dm, path, max_model_bytes)
+        self.max_symbolic_distance = max_symbolic_distance
+        self.optimisation_starts = optimisation_starts
+        self.optimisation_processes = optimisation_processes
+        if self.optimisation_processes is None:
+            self.optimisation_processes = cpu_count() if optimisation_starts > 1 else 1
+        self.kernel_tolerance = kernel_tolerance
+
+        self.pool = None
+        if persistent_pool and self.optimisation_processes > 1:
+            self.pool = optimisation.create_optimisation_pool(self.optimisation_processes)
+
+    def close(self):
+        '''Stops the worker processes of the persistent pool (if there is one).
+        '''
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def solve(self, object_key, instance_key, instance_object_count, initial_data, bad_guesses_euler, use_gsm=True, seed=None):
+        '''Returns a 2D 'numpy' array of optimised manipulated object poses, one per row,
+        in the format of 'optimised_guess.log'; the poses are ranked by the value of the optimised function.
+
+        Keyword arguments:
+        object_key -- Key of the manipulated object.
+        instance_key -- Key of the problem instance.
+        instance_object_count -- Number of objects in the problem instance (1 for delta naught models).
+        initial_data -- A one-dimensional 'numpy' array in the format of 'initial_guess.log'.
+        bad_guesses_euler -- A 'numpy' array in the format of 'bad_guesses.log'.
+        use_gsm -- If True, the initial guesses are sampled from the geometric sampling model,
+                   as done by 'solve_delta.py'; otherwise, the initial data are used as guesses,
+                   as done by 'solve_delta_without_gsm.py' (default True).
+        seed -- Seed for sampling the initial guesses; if None, the global 'numpy' random state is used (default None).
+
+        '''
+        bad_guesses = self._convert_bad_guesses(bad_guesses_euler)
+        models = self.models.get_models(object_key, instance_key)
+        static_objects = self._get_static_objects(initial_data)
+
+        symb_dict = dict()
+        if instance_object_count > 1:
+            for i in xrange(len(static_objects)):
+                for j in xrange(len(static_objects)):
+                    if i != j:
+                        symb = global_utils.vector_to_string(global_utils.calculate_predicate_values([static_objects[i], static_objects[j]]))
+                        symb_dict[(i,j)] = symb
+
+        symb_matches, geom_matches = self.dm.find_matches(object_key, instance_key, static_objects, symb_dict, self.max_symbolic_distance)
+
+        rng = np.random
+        if seed is not None:
+            rng = np.random.RandomState(seed)
+
+        initial_states = list()
+        if use_gsm:
+            geom_data = self.dm.get_geometric_data(object_key, instance_key)
+            for _ in xrange(self.optimisation_starts):
+                #sampling the guesses may shift the static objects, so each start gets its own copy of them
+                start_static_objects = deepcopy(static_objects)
+                guess_list = self._get_gsm_guesses(object_key, instance_object_count, initial_data, start_static_objects, geom_matches, geom_data, rng)
+                initial_states.extend(self._get_gsm_initial_states(instance_object_count, initial_data, start_static_objects, guess_list, models, rng))
+        else:
+            guess_list = self._get_initial_guesses(instance_object_count, initial_data, static_objects, geom_matches)
+            for _ in xrange(self.optimisation_starts):
+                initial_states.extend(self._get_initial_states(instance_object_count, initial_data, static_objects, guess_list, models, rng))
+
+        truncated_kernels = None
+        if self.kernel_tolerance is not None:
+            pos_data_trees, neg_data_trees = self.models.get_data_trees(object_key, instance_key)
+            truncated_kernels = TruncatedKernels(pos_data_trees, neg_data_trees, self.kernel_tolerance)
+
+        return self._optimise_initial_states(instance_object_count, initial_states, models, bad_guesses, truncated_kernels)
+
+    def _convert_bad_guesses(self, bad_guesses_euler):
+        '''Converts the Euler angles of the poses in 'bad_guesses_euler' to quaternions.
+        '''
+        if len(bad_guesses_euler.shape) == 1 and bad_guesses_euler.shape[0] != 0:
+            bad_guesses_euler = bad_guesses_euler[np.newaxis]
+        bad_guesses = list()
+        for i, guess in enumerate(bad_guesses_euler):
+            bad_guess_q = np.zeros(7)
+            bad_guess_q[0:3] = guess[0:3]
+            q = tf.quaternion_from_euler(np.radians(guess[3]), np.radians(guess[4]), np.radians(guess[5]))
+            bad_guess_q[3:] = np.array([q[0], q[1], q[2], q[3]])
+            bad_guesses.append(bad_guess_q)
+        return np.array(bad_guesses)
+
+    def _get_static_objects(self, initial_data):
+        #we divide by twelve because we have both initial pose and bounding box data;
+        #we subtract one after the division because we don't want to count the manipulated object
+        static_objects_count = len(initial_data) / 12 - 1
+        static_objects = list()
+
+        for i in xrange(static_objects_count):
+            start_idx = (i+1) * 12
+
+            obj = ObjectData(initial_data[start_idx], initial_data[start_idx+1], initial_data[start_idx+2], \
+            initial_data[start_idx+3], initial_data[start_idx+4], initial_data[start_idx+5], \
+            initial_data[start_idx+6], initial_data[start_idx+7], initial_data[start_idx+8], \
+            initial_data[start_idx+9], initial_data[start_idx+10], initial_data[start_idx+11])
+
+            static_objects.append(obj)
+        return static_objects
+
+    def _get_gsm_guesses(self, object_key, instance_object_count, initial_data, static_objects, geom_matches, geom_data, rng):
+        '''Returns a dictionary of initial guesses sampled from the geometric sampling model.
+        '''
+        #a list of all initial guesses (in case we have multiple matchings)
+        guess_list = dict()
+
+        if instance_object_count > 1:
+            #we create a list that stores the positions of the manipulated object and all static objects
+            #(the position of the manipulated object is just a guess for initialising the optimisation)
+            initial_guess = np.zeros(9)
+
+            gsm_distribution = np.array(geom_data[2])
+            gsm_cumsum_x = np.cumsum(gsm_distribution[0])
+            gsm_cumsum_y = np.cumsum(gsm_distribution[1])
+            gsm_boundaries = np.array(geom_data[3])
+
+            for key, matches in geom_matches.iteritems():
+                if len(matches) == 1:
+                    if matches[0].match_description == GeometricMatchDescriptions.DANGEROUS:
+                        continue
+
+                    left_object = None
+                    right_object = None
+                    guess_obj_key = None
+                    if static_objects[key[0]].init_position.x < static_objects[key[1]].init_position.x:
+                        left_object = static_objects[key[0]]
+                        right_object = static_objects[key[1]]
+                        guess_obj_key = tuple((key[1], key[0]))
+                    else:
+                        right_object = static_objects[key[0]]
+                        left_object = static_objects[key[1]]
+                        guess_obj_key = tuple((key[0], key[1]))
+
+                    #enlarging the geometric sampling distribution so that it covers the region between the current objects
+                    left_x = left_object.init_bounding_box.max.x
+                    delta_diff_x = abs(self.dm.get_geometric_data(object_key, matches[0].match_index)[0])
+                    obj_diff_x = right_object.init_bounding_box.min.x - left_object.init_bounding_box.max.x
+                    gamma = obj_diff_x / delta_diff_x
+                    distribution_boundaries_x = np.zeros(len(gsm_boundaries[0]))
+                    for i, x in enumerate(gsm_boundaries[0]):
+                        boundary = gamma * x + left_x
+                        distribution_boundaries_x[i] = boundary
+
+                    #importance sampling from the geometric sampling model; this should give us
+                    #an initial guess that maximises the probability of execution success
+                    r = rng.uniform()
+                    r_greater = np.where(r > gsm_cumsum_x)[0]
+                    guess_bin_x = 0
+                    if len(r_greater) > 0:
+                        guess_bin_x = r_greater[-1] + 1
+
+
+                    below_object = None
+                    above_object = None
+                    if static_objects[key[0]].init_position.y < static_objects[key[1]].init_position.y:
+                        below_object = static_objects[key[0]]
+                        above_object = static_objects[key[1]]
+                    else:
+                        above_object = static_objects[key[0]]
+                        below_object = static_objects[key[1]]
+
+                    #enlarging the geometric sampling distribution so that it covers the region between the current objects
+                    below_y = below_object.init_position.y
+                    delta_diff_y = abs(self.dm.get_geometric_data(object_key, matches[0].match_index)[1])
+                    obj_diff_y = above_object.init_position.y - below_object.init_position.y
+                    if abs(delta_diff_y) < 1e-100:
+                        delta_diff_y = 1.
+                    gamma = obj_diff_y / delta_diff_y
+                    distribution_boundaries_y = np.zeros(len(gsm_boundaries[1]))
+                    for i, y in enumerate(gsm_boundaries[1]):
+                        boundary = gamma * y + below_y
+                        distribution_boundaries_y[i] = boundary
+
+                    #importance sampling from the geometric sampling model; this should give us
+                    #an initial guess that maximises the probability of execution success
+                    r = rng.uniform()
+                    r_greater = np.where(r > gsm_cumsum_y)[0]
+                    guess_bin_y = 0
+                    if len(r_greater) > 0:
+                        guess_bin_y = r_greater[-1] + 1
+
+                    #shifting the objects to positions around the guess such that the distance
+                    #between the new positions will match the training data distance
+                    if matches[0].match_description == GeometricMatchDescriptions.FARTHER:
+                        left_object.init_bounding_box.max.x = distribution_boundaries_x[guess_bin_x] - gsm_boundaries[0][guess_bin_x]
+                        right_object.init_bounding_box.min.x = left_object.init_bounding_box.max.x + delta_diff_x
+
+                    initial_guess[0] = rng.uniform(distribution_boundaries_x[guess_bin_x], distribution_boundaries_x[guess_bin_x+1])
+                    initial_guess[1] = rng.uniform(distribution_boundaries_y[guess_bin_y], distribution_boundaries_y[guess_bin_y+1])
+                    initial_guess[2] = initial_data[2]
+
+                    initial_guess[3] = right_object.init_bounding_box.min.x
+                    initial_guess[4] = right_object.init_position.y
+                    initial_guess[5] = right_object.init_position.z
+
+                    initial_guess[6] = left_object.init_bounding_box.max.x
+                    initial_guess[7] = left_object.init_position.y
+                    initial_guess[8] = left_object.init_position.z
+
+                    guess_list[guess_obj_key] = np.array(initial_guess)
+                else:
+                    #take the most appropriate match from the list of matches
+                    pass
+        else:
+            delta_bb_size_x = geom_data[0]
+            delta_bb_size_y = geom_data[1]
+
+            gsm_distribution_x = np.array(geom_data[2][0])
+            gsm_distribution_y = np.array(geom_data[2][1])
+            gsm_cumsum_x = np.cumsum(gsm_distribution_x)
+            gsm_cumsum_y = np.cumsum(gsm_distribution_y)
+            gsm_boundaries_x = np.array(geom_data[3][0])
+            gsm_boundaries_y = np.array(geom_data[3][1])
+
+            for k, obj in enumerate(static_objects):
+                #enlarging the geometric sampling distribution so that it covers the region between the current objects
+                min_x = obj.init_bounding_box.min.x
+                min_y = obj.init_bounding_box.min.y
+
+                bb_size_x = obj.init_bounding_box.max.x - obj.init_bounding_box.min.x
+                bb_size_y = obj.init_bounding_box.max.y - obj.init_bounding_box.min.y
+
+                gamma_x = bb_size_x / delta_bb_size_x
+                gamma_y = bb_size_y / delta_bb_size_y
+
+                distribution_boundaries_x = np.zeros(len(gsm_boundaries_x))
+                for i, x in enumerate(gsm_boundaries_x):
+                    boundary = gamma_x * x + min_x
+                    distribution_boundaries_x[i] = boundary
+
+                distribution_boundaries_y = np.zeros(len(gsm_boundaries_y))
+                for i, y in enumerate(gsm_boundaries_y):
+                    boundary = gamma_y * y + min_y
+                    distribution_boundaries_y[i] = boundary
+
+                #importance sampling from the geometric sampling model; this should give us
+                #an initial guess that maximises the probability of execution success
+                r = rng.uniform()
+                r_greater = np.where(r > gsm_cumsum_x)[0]
+                guess_bin_x = 0
+                if len(r_greater) > 0:
+                    guess_bin_x = r_greater[-1] + 1
+
+                r = rng.uniform()
+                r_greater = np.where(r > gsm_cumsum_y)[0]
+                guess_bin_y = 0
+                if len(r_greater) > 0:
+                    guess_bin_y = r_greater[-1] + 1
+
+                initial_guess = np.zeros(6)
+                initial_guess[0] = rng.uniform(distribution_boundaries_x[guess_bin_x], distribution_boundaries_x[guess_bin_x+1])
+                initial_guess[1] = rng.uniform(distribution_boundaries_y[guess_bin_y], distribution_boundaries_y[guess_bin_y+1])
+                initial_guess[2] = initial_data[2]
+
+                initial_guess[3] = initial_data[9]
+                initial_guess[4] = initial_data[10]
+                initial_guess[5] = initial_data[23]
+
+                guess_list[k] = np.array(initial_guess)
+
+        return guess_list
+
+    def _get_gsm_initial_states(self, instance_object_count, initial_data, static_objects, guess_list, models, rng):
+        '''Returns a list of (guess key, initial optimisation state) tuples, one for each guess in 'guess_list';
+        the orientation of the manipulated object is taken from a random sample of the positive mapping data.
+        '''
+        pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings = models
+
+        initial_states = list()
+        for key, guess in guess_list.iteritems():
+            if instance_object_count > 1:
+                x0 = np.zeros(30)
+
+                data_idx = rng.randint(0, len(pos_mapping_data))
+                initial_guess_idx = rng.randint(0, pos_mapping_data[data_idx].shape[0])
+
+                static_z = guess[5]
+                guess[2] = pos_mapping_data[data_idx][initial_guess_idx,8] + static_z
+
+                #bounding boxes
+                x0[0:3] = [initial_data[6] - initial_data[3], initial_data[7] - initial_data[4], initial_data[8] - initial_data[5]]
+                x0[3:6] = [static_objects[key[0]].init_bounding_box.max.x - static_objects[key[0]].init_bounding_box.min.x, \
+                static_objects[key[0]].init_bounding_box.max.y - static_objects[key[0]].init_bounding_box.min.y, \
+                static_objects[key[0]].init_bounding_box.max.z - static_objects[key[0]].init_bounding_box.min.z]
+                x0[6:9] = [static_objects[key[1]].init_bounding_box.max.x - static_objects[key[1]].init_bounding_box.min.x, \
+                static_objects[key[1]].init_bounding_box.max.y - static_objects[key[1]].init_bounding_box.min.y, \
+                static_objects[key[1]].init_bounding_box.max.z - static_objects[key[1]].init_bounding_box.min.z]
+
+                #positions
+                x0[9:12] = guess[0:3]
+                x0[12:15] = guess[3:6]
+                x0[15:18] = guess[6:]
+
+                #orientations
+                x0[18:22] = pos_mapping_data[data_idx][initial_guess_idx][9:13]
+                x0[22:26] = tf.quaternion_from_euler(static_objects[key[0]].init_rotation.roll, static_objects[key[0]].init_rotation.pitch, static_objects[key[0]].init_rotation.yaw)
+                x0[26:] = tf.quaternion_from_euler(static_objects[key[1]].init_rotation.roll, static_objects[key[1]].init_rotation.pitch, static_objects[key[1]].init_rotation.yaw)
+
+                #we swap the positions of the static objects if they are not in the order preserved by the training data
+                if (object_mappings[0][1] == 1 and int(np.sign(guess[0] - guess[3])) != int(np.sign(pos_mapping_data[data_idx][initial_guess_idx][6]))) \
+                or (object_mappings[0][1] == 2 and int(np.sign(guess[0] - guess[6])) != int(np.sign(pos_mapping_data[data_idx][initial_guess_idx][6]))):
+                    x0[3:6] = [static_objects[key[1]].init_bounding_box.max.x - static_objects[key[1]].init_bounding_box.min.x, \
+                    static_objects[key[1]].init_bounding_box.max.y - static_objects[key[1]].init_bounding_box.min.y, \
+                    static_objects[key[1]].init_bounding_box.max.z - static_objects[key[1]].init_bounding_box.min.z]
+                    x0[6:9] = [static_objects[key[0]].init_bounding_box.max.x - static_objects[key[0]].init_bounding_box.min.x, \
+                    static_objects[key[0]].init_bounding_box.max.y - static_objects[key[0]].init_bounding_box.min.y, \
+                    static_objects[key[0]].init_bounding_box.max.z - static_objects[key[0]].init_bounding_box.min.z]
+
+                    x0[12:15] = guess[6:]
+                    x0[15:18] = guess[3:6]
+
+                    x0[22:26] = tf.quaternion_from_euler(static_objects[key[1]].init_rotation.roll, static_objects[key[1]].init_rotation.pitch, static_objects[key[1]].init_rotation.yaw)
+                    x0[26:] = tf.quaternion_from_euler(static_objects[key[0]].init_rotation.roll, static_objects[key[0]].init_rotation.pitch, static_objects[key[0]].init_rotation.yaw)
+
+                initial_states.append((key, x0))
+            else:
+                x0 = np.zeros(20)
+
+                data_idx = rng.randint(0, len(pos_mapping_data))
+                initial_guess_idx = rng.randint(0, pos_mapping_data[data_idx].shape[0])
+
+                static_z = guess[5]
+                guess[2] = pos_mapping_data[data_idx][initial_guess_idx,8] + static_z
+
+                #bounding boxes
+                x0[0:3] = [initial_data[6] - initial_data[3], initial_data[7] - initial_data[4], initial_data[8] - initial_data[5]]
+                x0[3:6] = [static_objects[key].init_bounding_box.max.x - static_objects[key].init_bounding_box.min.x, \
+                static_objects[key].init_bounding_box.max.y - static_objects[key].init_bounding_box.min.y, \
+                static_objects[key].init_bounding_box.max.z - static_objects[key].init_bounding_box.min.z]
+
+                #positions
+                x0[6:9] = guess[0:3]
+                x0[9:12] = guess[3:6]
+
+                #orientations
+                x0[12:16] = pos_mapping_data[data_idx][initial_guess_idx][9:13]
+                x0[16:] = tf.quaternion_from_euler(static_objects[key].init_rotation.roll, static_objects[key].init_rotation.pitch, static_objects[key].init_rotation.yaw)
+
+                initial_states.append((key, x0))
+
+        return initial_states
+
+    def _get_initial_guesses(self, instance_object_count, initial_data, static_objects, geom_matches):
+        '''Returns a dictionary of initial guesses that start at the initial manipulated object pose.
+        '''
+        #a list of all initial guesses (in case we have multiple matchings)
+        guess_list = dict()
+
+        if instance_object_count > 1:
+            #we create a list that stores the positions of the manipulated object and all static objects
+            #(the position of the manipulated object is just a guess for initialising the optimisation)
+            initial_guess = np.zeros(9)
+
+            for key, matches in geom_matches.iteritems():
+                if len(matches) == 1:
+                    if matches[0].match_description == GeometricMatchDescriptions.DANGEROUS:
+                        continue
+
+                    left_object = None
+                    right_object = None
+                    guess_obj_key = None
+                    if static_objects[key[0]].init_position.x < static_objects[key[1]].init_position.x:
+                        left_object = static_objects[key[0]]
+                        right_object = static_objects[key[1]]
+                        guess_obj_key = tuple((key[1], key[0]))
+                    else:
+                        right_object = static_objects[key[0]]
+                        left_object = static_objects[key[1]]
+                        guess_obj_key = tuple((key[0], key[1]))
+
+                    initial_guess[0] = initial_data[0]
+                    initial_guess[1] = initial_data[1]
+                    initial_guess[2] = initial_data[2]
+
+                    initial_guess[3] = right_object.init_bounding_box.min.x
+                    initial_guess[4] = right_object.init_position.y
+                    initial_guess[5] = right_object.init_position.z
+
+                    initial_guess[6] = left_object.init_bounding_box.max.x
+                    initial_guess[7] = left_object.init_position.y
+                    initial_guess[8] = left_object.init_position.z
+
+                    guess_list[guess_obj_key] = np.array(initial_guess)
+                else:
+                    #take the most appropriate match from the list of matches
+                    pass
+        else:
+            initial_guess = np.zeros(6)
+            initial_guess[0] = initial_data[0]
+            initial_guess[1] = initial_data[1]
+            initial_guess[2] = initial_data[2]
+
+            initial_guess[3] = initial_data[12]
+            initial_guess[4] = initial_data[13]
+            initial_guess[5] = initial_data[23]
+
+            guess_list[0] = np.array(initial_guess)
+
+        return guess_list
+
+    def _get_initial_states(self, instance_object_count, initial_data, static_objects, guess_list, models, rng):
+        '''Returns a list of (guess key, initial optimisation state) tuples, one for each guess in 'guess_list';
+        the orientation of the manipulated object is taken from a random sample of the positive mapping data.
+        '''
+        pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings = models
+
+        initial_states = list()
+        for key, guess in guess_list.iteritems():
+            if instance_object_count > 1:
+                x0 = np.zeros(30)
+                initial_guess_idx = rng.randint(0, pos_mapping_data[0].shape[0])
+
+                #bounding boxes
+                x0[0:3] = [initial_data[9] - initial_data[6], initial_data[10] - initial_data[7], initial_data[11] - initial_data[8]]
+                x0[3:6] = [static_objects[key[0]].init_bounding_box.max.x - static_objects[key[0]].init_bounding_box.min.x, \
+                static_objects[key[0]].init_bounding_box.max.y - static_objects[key[0]].init_bounding_box.min.y, \
+                static_objects[key[0]].init_bounding_box.max.z - static_objects[key[0]].init_bounding_box.min.z]
+                x0[6:9] = [static_objects[key[1]].init_bounding_box.max.x - static_objects[key[1]].init_bounding_box.min.x, \
+                static_objects[key[1]].init_bounding_box.max.y - static_objects[key[1]].init_bounding_box.min.y, \
+                static_objects[key[1]].init_bounding_box.max.z - static_objects[key[1]].init_bounding_box.min.z]
+
+                #positions
+                x0[9:12] = guess[0:3]
+                x0[12:15] = guess[3:6]
+                x0[15:18] = guess[6:]
+
+                #orientations
+                x0[18:22] = pos_mapping_data[0][initial_guess_idx][9:13]
+                x0[22:26] = tf.quaternion_from_euler(static_objects[key[0]].init_rotation.roll, static_objects[key[0]].init_rotation.pitch, static_objects[key[0]].init_rotation.yaw)
+                x0[26:] = tf.quaternion_from_euler(static_objects[key[1]].init_rotation.roll, static_objects[key[1]].init_rotation.pitch, static_objects[key[1]].init_rotation.yaw)
+
+                #we swap the positions of the static objects if they are not in the order preserved by the training data
+                if (object_mappings[0][1] == 1 and int(np.sign(guess[0] - guess[3])) != int(np.sign(pos_mapping_data[0][initial_guess_idx][6]))) \
+                or (object_mappings[0][1] == 2 and int(np.sign(guess[0] - guess[6])) != int(np.sign(pos_mapping_data[0][initial_guess_idx][6]))):
+                    x0[3:6] = [static_objects[key[1]].init_bounding_box.max.x - static_objects[key[1]].init_bounding_box.min.x, \
+                    static_objects[key[1]].init_bounding_box.max.y - static_objects[key[1]].init_bounding_box.min.y, \
+                    static_objects[key[1]].init_bounding_box.max.z - static_objects[key[1]].init_bounding_box.min.z]
+                    x0[6:9] = [static_objects[key[0]].init_bounding_box.max.x - static_objects[key[0]].init_bounding_box.min.x, \
+                    static_objects[key[0]].init_bounding_box.max.y - static_objects[key[0]].init_bounding_box.min.y, \
+                    static_objects[key[0]].init_bounding_box.max.z - static_objects[key[0]].init_bounding_box.min.z]
+
+                    x0[12:15] = guess[6:]
+                    x0[15:18] = guess[3:6]
+
+                    x0[22:26] = tf.quaternion_from_euler(static_objects[key[1]].init_rotation.roll, static_objects[key[1]].init_rotation.pitch, static_objects[key[1]].init_rotation.yaw)
+                    x0[26:] = tf.quaternion_from_euler(static_objects[key[0]].init_rotation.roll, static_objects[key[0]].init_rotation.pitch, static_objects[key[0]].init_rotation.yaw)
+
+                initial_states.append((key, x0))
+            else:
+                x0 = np.zeros(20)
+                initial_guess_idx = rng.randint(0, pos_mapping_data[0].shape[0])
+
+                #bounding boxes
+                x0[0:3] = [initial_data[6] - initial_data[3], initial_data[7] - initial_data[4], initial_data[8] - initial_data[5]]
+                x0[3:6] = [static_objects[key].init_bounding_box.max.x - static_objects[key].init_bounding_box.min.x, \
+                static_objects[key].init_bounding_box.max.y - static_objects[key].init_bounding_box.min.y, \
+                static_objects[key].init_bounding_box.max.z - static_objects[key].init_bounding_box.min.z]
+
+                #positions
+                x0[6:9] = guess[0:3]
+                x0[9:12] = guess[3:6]
+
+                #orientations
+                x0[12:16] = pos_mapping_data[0][initial_guess_idx][9:13]
+                x0[16:] = tf.quaternion_from_euler(static_objects[key].init_rotation.roll, static_objects[key].init_rotation.pitch, static_objects[key].init_rotation.yaw)
+
+                initial_states.append((key, x0))
+
+        return initial_states
+
+    def _optimise_initial_states(self, instance_object_count, initial_states, models, bad_guesses, truncated_kernels=None):
+        '''Optimises the initial states and returns a 2D 'numpy' array with the best
+        optimised manipulated object pose of each guess key, ranked by the value of the optimised function.
+        '''
+        pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings = models
+        if len(initial_states) == 0:
+            return np.array([])
+
+        if instance_object_count > 1:
+            non_constant_elements = np.array([9,10,11,18,19,20,21])
+            position_idx = 9
+            rotation_idx = 18
+        else:
+            non_constant_elements = np.array([6,7,8,12,13,14,15])
+            position_idx = 6
+            rotation_idx = 12
+
+        initial_guesses = np.array([x0 for _, x0 in initial_states])
+        states, _, guess_indices = optimisation.find_geometric_states(initial_guesses, pos_mappings, pos_mapping_data, neg_mappings, neg_mapping_data, object_mappings, non_constant_elements, bad_guesses, sign=-1., processes=self.optimisation_processes, truncated_kernels=truncated_kernels, pool=self.pool)
+
+        #the states are ranked, so the first state of a guess key is the best one
+        optimised_keys = set()
+        optimised_data = list()
+        for x_opt, guess_idx in zip(states, guess_indices):
+            key = initial_states[guess_idx][0]
+            if key in optimised_keys:
+                continue
+            optimised_keys.add(key)
+
+            r = np.array(tf.euler_from_quaternion(x_opt[rotation_idx:rotation_idx+4]))
+            data = np.zeros(6)
+            data[0:3] = x_opt[position_idx:position_idx+3]
+            data[3] = np.degrees(r[0])
+            data[4] = np.degrees(r[1])
+            data[5] = np.degrees(r[2])
+            optimised_data.append(data)
+
+        return np.array(optimised_data)
@@ -25,103 +25,103 @@ from knowledge_base import KnowledgeBase
 from symbolic_learner import RuleEvolver, RuleOptimiser
 from geometric_learner import GeometricLearner
 from delta_memory.memory import DeltaMemory
-
-kb_db_name = 'knowledge_base'
-kb = KnowledgeBase(kb_db_name)
-
-dm_db_name = 'delta_memory'
-dm = DeltaMemory(dm_db_name, kb)
-
-keys_file = file('keys.txt', 'r')
-object_key = keys_file.readline().rstrip('\n\r')
-instance_key = keys_file.readline().rstrip('\n\r')
-keys_file.close()
-
-data = np.genfromtxt('data/' + object_key + '_' + instance_key + '.log')
-
-rule_optimiser = RuleOptimiser(FitnessFunctionLibrary.vector_fitness_positive, restart_count=10, max_iterations=200)
-precondition_vector = rule_optimiser.learn_rules(data, global_utils.extract_objects, global_utils.calculate_predicate_values, global_utils.predicate_names)
-
-static_obj_predicates, static_predicate_idx = rule_optimiser.get_preconditions_static(precondition_vector, global_utils.get_object_entry_list)
-manipulated_obj_predicates, manipulated_predicate_idx = rule_optimiser.get_preconditions_manipulated(precondition_vector, global_utils.get_object_entry_list)
-
-geom_learner = GeometricLearner(global_utils.predicate_names, manipulated_obj_predicates, manipulated_predicate_idx)
-geom_data_save_dir = 'data/learned_mappings/' + object_key + '_' + instance_key
-data_pointers = geom_learner.learn_geometric_predicates(geom_data_save_dir, object_key, instance_key, data, global_utils.extract_objects, global_utils.calculate_predicate_values, global_utils.extract_geometric_mapping_data, global_utils.get_object_entry_list)
-
-########################
-# saving data to memory
-########################
-dm.add_object(object_key)
-
-#######################
-# saving symbolic data
-#######################
-symb_data_delta = ''
-for p in static_obj_predicates:
-    if p:
-        symb_data_delta += '1'
-    else:
-        symb_data_delta += '0'
-
-symb_data_full = ''
-for p in precondition_vector:
-    if p:
-        symb_data_full += '1'
-    else:
-        symb_data_full += '0'
-
-dm.add_symbolic_data(object_key, instance_key, symb_data_delta, symb_data_full)
-
-########################
-# saving geometric data
-########################
-geom_data_file_names = list()
-geom_data_object_mappings = list()
-if data_pointers is not None:
-    geom_data_file_names = data_pointers[0] + data_pointers[1]
-    geom_data_object_mappings = data_pointers[2]
-
-geom_data = list()
-objects = global_utils.extract_objects(data[0])
-if len(objects) > 2:
-    p_data = data[np.where(data[:,-1]>0)[0]]
-    rel_dist = np.zeros((p_data.shape[0],2))
-    orientations = np.zeros((p_data.shape[0],3))
-
-    left_object_idx = -1
-    right_object_idx = -1
-    objects = global_utils.extract_objects(p_data[0])
-    if objects[1].init_position.x < objects[2].init_position.x:
-        left_object_idx = 1
-        right_object_idx = 2
-    else:
-        right_object_idx = 1
-        left_object_idx = 2
-
-    behind_object_idx = -1
-    in_front_of_object_idx = -1
-    if objects[1].init_position.y < objects[2].init_position.y:
-        behind_object_idx = 1
-        in_front_of_object_idx = 2
-    else:
-        in_front_of_object_idx = 2
-        behind_object_idx = 1
-
-    for i in xrange(p_data.shape[0]):
-        objects = global_utils.extract_objects(p_data[i])
-        rel_dist[i,0] = objects[right_object_idx].init_bounding_box.max.x - objects[left_object_idx].init_bounding_box.min.x
-        rel_dist[i,1] = objects[in_front_of_object_idx].init_position.y - objects[behind_object_idx].init_position.y
-    geom_data = list(np.mean(rel_dist, axis=0))
-elif len(objects) == 2:
-    p_data = data[np.where(data[:,-1]>0)[0]]
-    bounding_box_sizes = np.zeros((p_data.shape[0],2))
-    orientations = np.zeros((p_data.shape[0],3))
-
-    for i in xrange(p_data.shape[0]):
-        objects = global_utils.extract_objects(p_data[i])
-        bounding_box_sizes[i,0] = objects[1].init_bounding_box.max.x - objects[1].init_bounding_box.min.x
-        bounding_box_sizes[i,1] = objects[1].init_bounding_box.max.y - objects[1].init_bounding_box.min.y
-    geom_data = list(np.mean(bounding_box_sizes, axis=0))
-
-dm.add_geometric_data(object_key, instance_key, geom_data, geom_data_file_names, geom_data_object_mappings)
+from delta_memory.storage import StorageTypes, create_storage
+
+#StorageTypes.SQLITE keeps the databases in files in the current directory
+storage_type = StorageTypes.COUCHDB
+
+if __name__ == '__main__':
+    kb_db_name = 'knowledge_base'
+    kb = KnowledgeBase(kb_db_name, create_storage(kb_db_name, storage_type))
+
+    dm_db_name = 'delta_memory'
+    dm = DeltaMemory(dm_db_name, kb, create_storage(dm_db_name, storage_type))
+
+    keys_file = file('keys.txt', 'r')
+    object_key = keys_file.readline().rstrip('\n\r')
+    instance_key = keys_file.readline().rstrip('\n\r')
+    keys_file.close()
+
+    data = global_utils.load_log_data('data/' + object_key + '_' + instance_key + '.log')
+
+    rule_optimiser = RuleOptimiser(FitnessFunctionLibrary.vector_fitness_positive, restart_count=10, max_iterations=200)
+    precondition_vector = rule_optimiser.learn_rules(data, global_utils.extract_object_arrays, global_utils.calculate_predicate_matrix, global_utils.predicate_names)
+
+    static_obj_predicates, static_predicate_idx = rule_optimiser.get_preconditions_static(precondition_vector, global_utils.get_object_entry_list)
+    manipulated_obj_predicates, manipulated_predicate_idx = rule_optimiser.get_preconditions_manipulated(precondition_vector, global_utils.get_object_entry_list)
+
+    geom_learner = GeometricLearner(global_utils.predicate_names, manipulated_obj_predicates, manipulated_predicate_idx)
+    geom_data_save_dir = 'data/learned_mappings/' + object_key + '_' + instance_key
+    data_pointers = geom_learner.learn_geometric_predicates(geom_data_save_dir, object_key, instance_key, data, global_utils.extract_object_arrays, global_utils.calculate_predicate_matrix, global_utils.extract_geometric_mapping_matrix, global_utils.get_object_entry_list)
+    for mapping_file_name, selection in sorted(geom_learner.bandwidth_selections.iteritems()):
+        print 'Selected bandwidth %f for %s in %.2f s (%d evaluated bandwidths)' % (selection.bandwidth, mapping_file_name, selection.selection_time, selection.evaluations)
+
+    ########################
+    # saving data to memory
+    ########################
+    dm.add_object(object_key)
+
+    #######################
+    # saving symbolic data
+    #######################
+    symb_data_delta = ''
+    for p in static_obj_predicates:
+        if p:
+            symb_data_delta += '1'
+        else:
+            symb_data_delta += '0'
+
+    symb_data_full = ''
+    for p in precondition_vector:
+        if p:
+            symb_data_full += '1'
+        else:
+            symb_data_full += '0'
+
+    dm.add_symbolic_data(object_key, instance_key, symb_data_delta, symb_data_full)
+
+    ########################
+    # saving geometric data
+    ########################
+    geom_data_file_names = list()
+    geom_data_object_mappings = list()
+    if data_pointers is not None:
+        geom_data_file_names = data_pointers[0] + data_pointers[1]
+        geom_data_object_mappings = data_pointers[2]
+
+    geom_data = list()
+    objects = global_utils.extract_object_arrays(data)
+    if objects.shape[1] > 2:
+        p_objects = objects[np.where(data[:,-1]>0)[0]]
+
+        left_object_idx = -1
+        right_object_idx = -1
+        if p_objects[0,1]['init_position'][0] < p_objects[0,2]['init_position'][0]:
+            left_object_idx = 1
+            right_object_idx = 2
+        else:
+            right_object_idx = 1
+            left_object_idx = 2
+
+        behind_object_idx = -1
+        in_front_of_object_idx = -1
+        if p_objects[0,1]['init_position'][1] < p_objects[0,2]['init_position'][1]:
+            behind_object_idx = 1
+            in_front_of_object_idx = 2
+        else:
+            in_front_of_object_idx = 2
+            behind_object_idx = 1
+
+        rel_dist = np.zeros((p_objects.shape[0],2))
+        rel_dist[:,0] = p_objects[:,right_object_idx]['init_bounding_box'][:,3] - p_objects[:,left_object_idx]['init_bounding_box'][:,0]
+        rel_dist[:,1] = p_objects[:,in_front_of_object_idx]['init_position'][:,1] - p_objects[:,behind_object_idx]['init_position'][:,1]
+        geom_data = list(np.mean(rel_dist, axis=0))
+    elif objects.shape[1] == 2:
+        p_objects = objects[np.where(data[:,-1]>0)[0]]
+
+        bounding_box_sizes = np.zeros((p_objects.shape[0],2))
+        bounding_box_sizes[:,0] = p_objects[:,1]['init_bounding_box'][:,3] - p_objects[:,1]['init_bounding_box'][:,0]
+        bounding_box_sizes[:,1] = p_objects[:,1]['init_bounding_box'][:,4] - p_objects[:,1]['init_bounding_box'][:,1]
+        geom_data = list(np.mean(bounding_box_sizes, axis=0))
+
+    dm.add_geometric_data(object_key, instance_key, geom_data, geom_data_file_names, geom_data_object_mappings)
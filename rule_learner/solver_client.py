@@ -0,0 +1,122 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import socket
+from multiprocessing.connection import Client
+
+'''Client side of the pose solver service (see 'solver_service.py').
+This module only depends on the standard library so that the solver
+scripts can contact the service without loading any of the learning packages.
+
+Author -- Alex Mitrevski
+
+'''
+
+#the service listens on a Unix socket in the 'rule_learner' directory that only the user running the service
+#can connect to, since the requests and responses are pickled (see 'solver_service.create_listener')
+service_address = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solver_service.sock')
+probe_timeout = 0.5
+#time in seconds that a client waits for the optimised poses before solving the problem itself
+response_timeout = 300.
+
+class SolverRequestKeys(object):
+    OBJECT = 'object_key'
+    INSTANCE = 'instance_key'
+    INSTANCE_OBJECT_COUNT = 'instance_object_count'
+    INITIAL_DATA = 'initial_data'
+    BAD_GUESSES = 'bad_guesses'
+    USE_GSM = 'use_gsm'
+    SEED = 'seed'
+
+class SolverResponseStatus(object):
+    OK = 'ok'
+    ERROR = 'error'
+
+
+def service_running(address=service_address):
+    '''Returns True if a solver service accepts connections at 'address'.
+
+    Keyword arguments:
+    address -- Path of the Unix socket of the service (default 'service_address').
+
+    '''
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(probe_timeout)
+    try:
+        probe.connect(address)
+        return True
+    except socket.error:
+        return False
+    finally:
+        probe.close()
+
+
+def request_optimised_poses(object_key, instance_key, instance_object_count, initial_data, bad_guesses_euler, use_gsm=True, seed=None, address=service_address, timeout=response_timeout):
+    '''Sends a pose optimisation request to the solver service.
+
+    Keyword arguments:
+    object_key -- Key of the manipulated object.
+    instance_key -- Key of the problem instance.
+    instance_object_count -- Number of objects in the problem instance.
+    initial_data -- A one-dimensional 'numpy' array in the format of 'initial_guess.log'.
+    bad_guesses_euler -- A 'numpy' array in the format of 'bad_guesses.log'.
+    use_gsm -- Whether the geometric sampling model should be used for the initial guesses (default True).
+    seed -- Seed for sampling the initial guesses; if None, the guesses aren't reproducible (default None).
+    address -- Path of the Unix socket of the service (default 'service_address').
+    timeout -- Time in seconds to wait for the response (default 'response_timeout').
+
+    Returns:
+    A 2D 'numpy' array in the format of 'optimised_guess.log' or None if the service
+    is not running, couldn't process the request, or didn't respond within 'timeout' seconds.
+
+    '''
+    #'Client' keeps retrying for several seconds if nobody is listening,
+    #so we check whether the service is running before connecting
+    if not service_running(address):
+        return None
+
+    request = { SolverRequestKeys.OBJECT : object_key, \
+    SolverRequestKeys.INSTANCE : instance_key, \
+    SolverRequestKeys.INSTANCE_OBJECT_COUNT : instance_object_count, \
+    SolverRequestKeys.INITIAL_DATA : initial_data, \
+    SolverRequestKeys.BAD_GUESSES : bad_guesses_euler, \
+    SolverRequestKeys.USE_GSM : use_gsm, \
+    SolverRequestKeys.SEED : seed }
+
+    try:
+        connection = Client(address)
+    except (socket.error, EOFError):
+        return None
+
+    try:
+        connection.send(request)
+        #a service that hangs shouldn't block the simulation, which solves the problem itself instead
+        if not connection.poll(timeout):
+            return None
+        status, result = connection.recv()
+    except (IOError, EOFError):
+        return None
+    finally:
+        connection.close()
+
+    if status != SolverResponseStatus.OK:
+        print 'Solver service error: ', result
+        return None
+    return result
@@ -0,0 +1,110 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+from multiprocessing.connection import Listener
+
+import solver_client
+from solver_client import SolverRequestKeys, SolverResponseStatus
+from pose_solver import PoseSolver
+from delta_memory.storage import StorageTypes
+
+'''Long-lived pose solver. The service keeps the database connections
+and the learned models in memory and answers the requests sent by
+'solve_delta.py' and 'solve_delta_without_gsm.py', which fall back
+to solving the problem themselves if the service is not running.
+
+Author -- Alex Mitrevski
+
+'''
+
+path = 'path to rule_learner'
+storage_type = StorageTypes.COUCHDB
+optimisation_starts = 1
+#if None, the guesses are optimised on all CPUs if optimisation_starts is larger than 1 and in a single process otherwise
+optimisation_processes = None
+kernel_tolerance = None
+#time in seconds within which a client has to send its request after connecting
+request_timeout = 5.
+
+
+def create_listener(address):
+    '''Returns a 'multiprocessing.connection.Listener' on the Unix socket 'address',
+    which is only accessible by the user running the service; a socket left behind
+    by a service that is no longer running is removed.
+
+    Keyword arguments:
+    address -- Path of the Unix socket.
+
+    '''
+    if solver_client.service_running(address):
+        raise RuntimeError('A solver service is already running at ' + address)
+    if os.path.exists(address):
+        os.remove(address)
+
+    #the socket is created with permissions 0600 rather than restricted after it has been created,
+    #since the requests are unpickled and anyone who can connect could thus run code as the service user
+    old_umask = os.umask(0o177)
+    try:
+        listener = Listener(address, family='AF_UNIX')
+    finally:
+        os.umask(old_umask)
+    return listener
+
+
+if __name__ == '__main__':
+    #the worker processes are started once, before any models are loaded, and reused by all requests
+    solver = PoseSolver(path, storage_type=storage_type, optimisation_starts=optimisation_starts, optimisation_processes=optimisation_processes, kernel_tolerance=kernel_tolerance, persistent_pool=True)
+    try:
+        listener = create_listener(solver_client.service_address)
+        print 'Pose solver service listening on %s' % solver_client.service_address
+
+        try:
+            while True:
+                try:
+                    connection = listener.accept()
+                except (EOFError, IOError):
+                    continue
+
+                try:
+                    #the requests are handled one at a time, so clients that don't send a request in time are dropped;
+                    #connections that only check whether the service is running are closed without sending anything
+                    if not connection.poll(request_timeout):
+                        continue
+                    request = connection.recv()
+                    try:
+                        optimised_data = solver.solve(request[SolverRequestKeys.OBJECT], \
+                        request[SolverRequestKeys.INSTANCE], \
+                        request[SolverRequestKeys.INSTANCE_OBJECT_COUNT], \
+                        request[SolverRequestKeys.INITIAL_DATA], \
+                        request[SolverRequestKeys.BAD_GUESSES], \
+                        use_gsm=request[SolverRequestKeys.USE_GSM], \
+                        seed=request.get(SolverRequestKeys.SEED))
+                        connection.send((SolverResponseStatus.OK, optimised_data))
+                    except Exception as e:
+                        #a failed request shouldn't stop the service
+                        connection.send((SolverResponseStatus.ERROR, repr(e)))
+                except (IOError, EOFError):
+                    pass
+                finally:
+                    connection.close()
+        finally:
+            listener.close()
+    finally:
+        solver.close()
@@ -0,0 +1,49 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+'''Bit-packed binary vectors: each row of a binary matrix is stored in
+an array of 64-bit words, such that the Hamming distances between vectors
+can be computed by XOR-ing the words and counting the set bits.
+
+Author -- Alex Mitrevski
+
+'''
+def pack_bits(data):
+    '''Returns a 2D 'numpy' uint64 array in which the i-th row stores the bits of the i-th row of 'data'
+    (a 2D binary array); the rows are padded with zeros to a multiple of 64 bits.
+    '''
+    data = np.asarray(data) != 0
+    packed = np.packbits(data, axis=1)
+    padding = (-packed.shape[1]) % 8
+    if padding > 0:
+        packed = np.hstack((packed, np.zeros((packed.shape[0], padding), dtype=np.uint8)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def popcount(words):
+    '''Returns a 'numpy' array with the number of set bits in each word of 'words' (a 'numpy' uint64 array).
+    '''
+    words = np.ascontiguousarray(words)
+    byte_counts = _byte_popcounts[words.view(np.uint8)]
+    return np.sum(byte_counts.reshape(words.shape + (8,)), axis=-1, dtype=np.int64)
+
+
+_byte_popcounts = np.array([bin(i).count('1') for i in xrange(256)], dtype=np.uint8)
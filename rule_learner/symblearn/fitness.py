@@ -52,3 +52,198 @@ class FitnessFunctionLibrary(object):
         cost = np.sum(np.abs(v - pos_data))
         fitness = 1. - (cost / max_errors)
         return fitness
+
+    @staticmethod
+    def get_count_fitness(fitness_callback, pos_data, neg_data, eta=0.1):
+        '''Returns a 'CountFitness' object that computes the same fitness as 'fitness_callback'
+        from the column counts of the data or None if 'fitness_callback' doesn't have a column count equivalent.
+
+        Keyword arguments:
+        fitness_callback -- One of the fitness functions of 'FitnessFunctionLibrary'.
+        pos_data -- A 2D binary integer 'numpy' array with positive symbolic training data.
+        neg_data -- A 2D binary integer 'numpy' array with negative symbolic training data (can be None).
+        eta -- The value of eta used by 'vector_fitness_sum' (default 0.1).
+
+        '''
+        if fitness_callback is FitnessFunctionLibrary.gene_fitness_positive or fitness_callback is FitnessFunctionLibrary.vector_fitness_positive:
+            return CountFitness(pos_data, eta=0.)
+        if fitness_callback is FitnessFunctionLibrary.vector_fitness_sum:
+            return CountFitness(pos_data, neg_data, eta)
+        return None
+
+    @staticmethod
+    def get_running_fitness(fitness_callback, eta=0.1):
+        '''Returns a 'RunningFitness' object that computes the same fitness as 'fitness_callback'
+        from running statistics of the training data or None if 'fitness_callback' doesn't have a running equivalent.
+
+        Keyword arguments:
+        fitness_callback -- One of the fitness functions of 'FitnessFunctionLibrary'.
+        eta -- The value of eta used by 'vector_fitness_sum' (default 0.1).
+
+        '''
+        if fitness_callback is FitnessFunctionLibrary.vector_fitness_positive:
+            return RunningFitness(eta=0., use_negative_data=False)
+        if fitness_callback is FitnessFunctionLibrary.vector_fitness_sum:
+            return RunningFitness(eta)
+        return None
+
+    @staticmethod
+    def get_callback_reference(fitness_callback):
+        '''Returns a picklable reference to 'fitness_callback', namely its name if it is one
+        of the fitness functions of 'FitnessFunctionLibrary' (static methods can't be pickled)
+        and 'fitness_callback' itself otherwise (which is picklable if it is a module-level function).
+
+        Keyword arguments:
+        fitness_callback -- A fitness function (can be None).
+
+        '''
+        for name in ('gene_fitness_positive', 'vector_fitness_sum', 'vector_fitness_positive'):
+            if fitness_callback is getattr(FitnessFunctionLibrary, name):
+                return name
+        return fitness_callback
+
+    @staticmethod
+    def get_callback(callback_reference):
+        '''Returns the fitness function referenced by 'callback_reference'
+        (see 'FitnessFunctionLibrary.get_callback_reference').
+        '''
+        if isinstance(callback_reference, str):
+            return getattr(FitnessFunctionLibrary, callback_reference)
+        return callback_reference
+
+
+class ColumnCounts(object):
+    '''The number of set bits in each column of a binary matrix, from which
+    the summed Hamming distances between vectors and the rows of the matrix are computed.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, data):
+        '''
+        Keyword arguments:
+        data -- A 2D binary 'numpy' array.
+
+        '''
+        data = np.asarray(data)
+        self.row_count = data.shape[0]
+        self.bit_count = data.shape[1]
+        self.column_counts = np.sum(data != 0, axis=0).astype(np.int64)
+
+    def hamming_sums(self, vectors):
+        '''Returns a 'numpy' array whose i-th element is the sum of the Hamming distances between
+        the i-th row of 'vectors' (a 2D binary array) and all rows of the matrix.
+        '''
+        if self.row_count == 0:
+            return np.zeros(vectors.shape[0], dtype=np.int64)
+
+        #a set bit differs from the rows in which it isn't set and a cleared bit differs from the rows in which it is set
+        vectors = np.asarray(vectors != 0, dtype=np.int64)
+        return np.dot(vectors, self.row_count - 2 * self.column_counts) + np.sum(self.column_counts)
+
+
+class CountFitness(object):
+    '''Computes the fitness of 'FitnessFunctionLibrary.vector_fitness_sum' (which is equal to the fitness
+    of 'FitnessFunctionLibrary.vector_fitness_positive' if eta is 0) for whole populations of vectors at once,
+    using the summed Hamming distances between the vectors and the training data, which are computed
+    from the column counts of the training data (see 'ColumnCounts.hamming_sums').
+    The fitness changes caused by flipping single bits of a vector are computed from the
+    column counts of the training data, without going through the data.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, pos_data, neg_data=None, eta=0.1):
+        self.pos_counts = ColumnCounts(pos_data)
+        self.max_pos_errors = self.pos_counts.row_count * self.pos_counts.bit_count * 1.
+        self.eta = eta
+
+        self.neg_counts = None
+        self.max_neg_errors = 1.
+        if neg_data is not None:
+            self.neg_counts = ColumnCounts(neg_data)
+            self.max_neg_errors = self.neg_counts.row_count * self.neg_counts.bit_count * 1.
+
+    def population_fitness(self, vectors):
+        '''Returns a 'numpy' array with the fitness of each row of 'vectors' (a 2D binary array).
+        '''
+        positive_errors = self.pos_counts.hamming_sums(vectors)
+        negative_agreements = 0.
+        if self.neg_counts is not None:
+            negative_agreements = self.neg_counts.row_count * self.neg_counts.bit_count - self.neg_counts.hamming_sums(vectors)
+        return 1. - (1. - self.eta) * (positive_errors / self.max_pos_errors) - self.eta * (negative_agreements / self.max_neg_errors)
+
+    def fitness(self, v):
+        '''Returns the fitness of the one-dimensional binary array 'v'.
+        '''
+        return self.population_fitness(np.asarray(v)[np.newaxis])[0]
+
+    def flip_delta(self, v, bit_idx):
+        '''Returns the change of the fitness of 'v' caused by flipping its bit at index 'bit_idx'.
+        '''
+        #setting a bit adds an error for each positive vector in which the bit isn't set and removes one
+        #for each vector in which it is set; clearing the bit has the opposite effect
+        sign = 1 if v[bit_idx] == 0 else -1
+        positive_error_change = sign * (self.pos_counts.row_count - 2 * self.pos_counts.column_counts[bit_idx])
+        negative_agreement_change = 0.
+        if self.neg_counts is not None:
+            negative_agreement_change = sign * (2 * self.neg_counts.column_counts[bit_idx] - self.neg_counts.row_count)
+        return -(1. - self.eta) * (positive_error_change / self.max_pos_errors) - self.eta * (negative_agreement_change / self.max_neg_errors)
+
+    def flip_deltas(self, v):
+        '''Returns a 'numpy' array whose i-th element is the change of the fitness of 'v' caused by flipping its i-th bit.
+        '''
+        signs = 1 - 2 * (np.asarray(v) != 0)
+        positive_error_changes = signs * (self.pos_counts.row_count - 2 * self.pos_counts.column_counts)
+        negative_agreement_changes = 0.
+        if self.neg_counts is not None:
+            negative_agreement_changes = signs * (2 * self.neg_counts.column_counts - self.neg_counts.row_count)
+        return -(1. - self.eta) * (positive_error_changes / self.max_pos_errors) - self.eta * (negative_agreement_changes / self.max_neg_errors)
+
+
+class RunningFitness(object):
+    '''Computes the fitness of 'FitnessFunctionLibrary.vector_fitness_sum' (which is equal to the fitness
+    of 'FitnessFunctionLibrary.vector_fitness_positive' if eta is 0 and negative data are not used)
+    from the row and column counts of training data that are added in chunks, such that the data don't need to be stored.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, eta=0.1, use_negative_data=True):
+        '''
+        Keyword arguments:
+        eta -- The weight of the negative data agreements (default 0.1).
+        use_negative_data -- Determines whether negative data should be taken into account (default True).
+
+        '''
+        self.eta = eta
+        self.use_negative_data = use_negative_data
+        self.pos_count = 0
+        self.neg_count = 0
+        self.pos_column_counts = None
+        self.neg_column_counts = None
+
+    def update(self, pos_data, neg_data):
+        '''Adds the rows of 'pos_data' and 'neg_data' (2D binary 'numpy' arrays) to the statistics.
+        '''
+        if self.pos_column_counts is None:
+            self.pos_column_counts = np.zeros(pos_data.shape[1], dtype=np.int64)
+            self.neg_column_counts = np.zeros(neg_data.shape[1], dtype=np.int64)
+
+        self.pos_count += pos_data.shape[0]
+        self.pos_column_counts += np.sum(pos_data != 0, axis=0)
+        self.neg_count += neg_data.shape[0]
+        self.neg_column_counts += np.sum(neg_data != 0, axis=0)
+
+    def fitness(self, v):
+        '''Returns the fitness of the one-dimensional binary array 'v' on the data added so far.
+        '''
+        v = np.asarray(v) != 0
+        max_pos_errors = self.pos_count * len(v) * 1.
+        positive_errors = np.sum(np.where(v, self.pos_count - self.pos_column_counts, self.pos_column_counts))
+        negative_agreements = 0.
+        max_neg_errors = 1.
+        if self.use_negative_data:
+            negative_agreements = np.sum(np.where(v, self.neg_column_counts, self.neg_count - self.neg_column_counts))
+            max_neg_errors = self.neg_count * len(v) * 1.
+        return 1. - (1. - self.eta) * (positive_errors / max_pos_errors) - self.eta * (negative_agreements / max_neg_errors)
@@ -0,0 +1,168 @@
+'''
+    Copyright 2017 by Alex Mitrevski <aleksandar.mitrevski@h-brs.de>
+
+    This file is part of delta-execution-models.
+
+    delta-execution-models is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    delta-execution-models is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+from scipy.misc import comb
+
+from bitsets import pack_bits, popcount
+
+'''k-DNF kernels evaluated on whole blocks of vectors: the number of same
+elements of each pair of vectors is obtained from the popcounts of the
+bit-packed vectors and the kernel values are looked up in a table of binomial sums.
+
+Author -- Alex Mitrevski
+
+'''
+def kdnf_table(max_same_bits_count, k):
+    '''Returns a one-dimensional 'numpy' array whose s-th element is the value of
+    the k-DNF kernel for two vectors that have s same bits, i.e. sum_{i=0}^{k} C(s, i).
+
+    Keyword arguments:
+    max_same_bits_count -- The largest number of same bits (normally the vector length).
+    k -- The k value of the k-DNF kernel.
+
+    '''
+    same_bits_counts = np.arange(max_same_bits_count+1)[:,np.newaxis]
+    return np.sum(comb(same_bits_counts, np.arange(k+1)[np.newaxis,:]), axis=1)
+
+
+def same_element_counts(x1, x2):
+    '''Returns a 2D 'numpy' array whose (i,j)-th element is the number of same elements of x1[i] and x2[j].
+    Binary vectors (e.g. with 0/1 or -1/1 elements) are compared by XOR-ing their bit-packed
+    representations; vectors with more distinct elements are compared value by value.
+
+    Keyword arguments:
+    x1 -- A 2D 'numpy' array.
+    x2 -- A 2D 'numpy' array with the same number of columns as 'x1'.
+
+    '''
+    x1 = np.asarray(x1)
+    x2 = np.asarray(x2)
+    if x1.shape[0] == 0 or x2.shape[0] == 0:
+        return np.zeros((x1.shape[0], x2.shape[0]), dtype=np.int64)
+
+    values = np.union1d(np.unique(x1), np.unique(x2))
+    if len(values) <= 2:
+        different_counts = _pairwise_popcounts(pack_bits(x1 == values[-1]), pack_bits(x2 == values[-1]), np.bitwise_xor)
+        return x1.shape[1] - different_counts
+
+    counts = np.zeros((x1.shape[0], x2.shape[0]), dtype=np.int64)
+    for value in values:
+        counts += _pairwise_popcounts(pack_bits(x1 == value), pack_bits(x2 == value), np.bitwise_and)
+    return counts
+
+
+def _pairwise_popcounts(words1, words2, operation):
+    '''Returns a 2D 'numpy' array whose (i,j)-th element is the number of set
+    bits of operation(words1[i], words2[j]), where 'words1' and 'words2' are bit-packed vectors.
+    '''
+    counts = np.zeros((words1.shape[0], words2.shape[0]), dtype=np.int64)
+    if words1.shape[0] == 0 or words2.shape[0] == 0:
+        return counts
+
+    #the rows of 'words1' are processed in chunks that bound the size of the combined words
+    chunk_size = max(1, max_chunk_words // (words2.shape[0] * words2.shape[1]))
+    for start_idx in xrange(0, words1.shape[0], chunk_size):
+        chunk = words1[start_idx:start_idx+chunk_size]
+        combined_words = operation(chunk[:,np.newaxis,:], words2[np.newaxis,:,:])
+        counts[start_idx:start_idx+chunk_size] = np.sum(popcount(combined_words), axis=2)
+    return counts
+
+
+class KDNFKernel(object):
+    '''A k-DNF kernel K(x1, x2) = sum_{i=0}^{k} C(s, i), where s is the number of same elements of x1 and x2.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, k, vector_length):
+        '''
+        Keyword arguments:
+        k -- The k value of the kernel.
+        vector_length -- The length of the vectors on which the kernel is evaluated.
+
+        '''
+        self.k = k
+        self.vector_length = vector_length
+        self.table = kdnf_table(vector_length, k)
+
+    def __call__(self, x1, x2):
+        '''Returns the kernel value for the one-dimensional 'numpy' arrays 'x1' and 'x2'.
+        '''
+        return self.evaluate(np.asarray(x1)[np.newaxis], np.asarray(x2)[np.newaxis])[0,0]
+
+    def evaluate(self, x1, x2):
+        '''Returns a 2D 'numpy' array whose (i,j)-th element is the kernel value for x1[i] and x2[j].
+
+        Keyword arguments:
+        x1 -- A 2D 'numpy' array with 'self.vector_length' columns.
+        x2 -- A 2D 'numpy' array with 'self.vector_length' columns.
+
+        '''
+        return self.table[same_element_counts(x1, x2)]
+
+
+class KernelGramMatrix(object):
+    '''A Gram matrix of a set of training vectors; the matrix
+    is extended incrementally when new training vectors are added.
+
+    Author -- Alex Mitrevski
+
+    '''
+    def __init__(self, kernel):
+        '''
+        Keyword arguments:
+        kernel -- A kernel object with an 'evaluate' method (e.g. a 'KDNFKernel').
+
+        '''
+        self.kernel = kernel
+        self.features = None
+        self.matrix = None
+
+    def extend(self, features):
+        '''Adds the rows of 'features' (a 2D 'numpy' array) to the training vectors;
+        only the kernel values involving the new vectors are calculated.
+        '''
+        features = np.array(features)
+        if self.features is None:
+            self.features = features
+            self.matrix = self.kernel.evaluate(features, features)
+            return
+
+        old_vector_count = self.features.shape[0]
+        self.features = np.vstack((self.features, features))
+        new_matrix = np.zeros((self.features.shape[0], self.features.shape[0]))
+        new_matrix[:old_vector_count,:old_vector_count] = self.matrix
+        new_kernel_values = self.kernel.evaluate(self.features, features)
+        new_matrix[:,old_vector_count:] = new_kernel_values
+        new_matrix[old_vector_count:,:] = new_kernel_values.T
+        self.matrix = new_matrix
+
+    def covers(self, features):
+        '''Returns True if the training vectors of the matrix are the
+        first rows of 'features' (a 2D 'numpy' array) and False otherwise.
+        '''
+        if self.features is None:
+            return False
+        vector_count = self.features.shape[0]
+        return features.shape[0] >= vector_count and features.shape[1] == self.features.shape[1] \
+               and np.array_equal(features[:vector_count], self.features)
+
+
+max_chunk_words = 1 << 20
@@ -19,13 +19,15 @@
 
 import numpy as np
 
+from fitness import FitnessFunctionLibrary
+
 class Evolver(object):
     '''Implements a simple evolutionary algorithm for symbolic learning.
 
     Author -- Alex Mitrevski
 
     '''
-    def __init__(self, pos_fitness_data, neg_fitness_data, population_count, gene_length, object_count, pos_fitness_gt_data=None, neg_fitness_gt_data=None):
+    def __init__(self, pos_fitness_data, neg_fitness_data, population_count, gene_length, object_count, pos_fitness_gt_data=None, neg_fitness_gt_data=None, rng=None):
         '''
         Keyword arguments:
         pos_fitness_data -- A 2D binary integer 'numpy' array with positive symbolic training data.
@@ -35,6 +37,7 @@ class Evolver(object):
         object_count -- The number of distinct objects whose relations are encoded by the training data.
         pos_fitness_gt_data -- A 2D binary integer 'numpy' array with positive symbolic training data; used for the purpose of comparison if the training data are noisy.
         neg_fitness_gt_data -- A 2D binary integer 'numpy' array with negative symbolic training data; used for the purpose of comparison if the training data are noisy.
+        rng -- A 'numpy.random.RandomState' object used by the algorithm (default None, in which case the global 'numpy' random state is used).
 
         '''
         self.population = None
@@ -58,6 +61,14 @@ class Evolver(object):
         self.mutation_probability = -1.
         self.mutation_max_element_count = 0
 
+        #'fitness.CountFitness' objects used instead of the fitness callback if it has a column count equivalent
+        self.count_fitness = None
+        self.count_gt_fitness = None
+
+        self.rng = np.random
+        if rng is not None:
+            self.rng = rng
+
     def evolve(self, fitness_callback, max_iterations=100, mutation_probability=-1, mutation_max_element_count=0):
         '''Runs an evolutionary algorithm for learning a population of symbolic models covering the training data.
 
@@ -78,6 +89,10 @@ class Evolver(object):
         fitness_per_iteration = np.zeros(max_iterations)
         gt_fitness_per_iteration = np.zeros(max_iterations)
 
+        self.count_fitness = FitnessFunctionLibrary.get_count_fitness(fitness_callback, self.pos_fitness_data, self.neg_fitness_data)
+        if self.noisy_data:
+            self.count_gt_fitness = FitnessFunctionLibrary.get_count_fitness(fitness_callback, self.pos_fitness_gt_data, self.neg_fitness_gt_data)
+
         self._generate_initial_population()
         for i in xrange(max_iterations):
             total_fitness = self._calculate_fitness(fitness_callback)
@@ -98,49 +113,67 @@ class Evolver(object):
     def _generate_initial_population(self):
         '''Generates a random initial population of genes.
         '''
-        self.population = np.random.randint(0, 2, (self.population_count, self.gene_length))        
+        self.population = self.rng.randint(0, 2, (self.population_count, self.gene_length))        
 
     def _calculate_fitness(self, fitness_callback):
-        self.gene_fitness = fitness_callback(self.pos_fitness_data, self.neg_fitness_data, self.population)
+        if self.count_fitness is not None:
+            self.gene_fitness = self.count_fitness.population_fitness(self.population)
+        else:
+            self.gene_fitness = fitness_callback(self.pos_fitness_data, self.neg_fitness_data, self.population)
         total_fitness = np.sum(self.gene_fitness) / len(self.gene_fitness)
         self.gene_fitness = self.gene_fitness / np.sum(self.gene_fitness)
         return total_fitness
 
     def _calculate_gt_fitness(self, fitness_callback):
-        gene_fitness = fitness_callback(self.pos_fitness_gt_data, self.neg_fitness_gt_data, self.population)
+        if self.count_gt_fitness is not None:
+            gene_fitness = self.count_gt_fitness.population_fitness(self.population)
+        else:
+            gene_fitness = fitness_callback(self.pos_fitness_gt_data, self.neg_fitness_gt_data, self.population)
         total_fitness = np.sum(gene_fitness) / len(gene_fitness)
         return total_fitness
 
     def _crossover(self):
-        population_copy = np.array(self.population)
+        '''Replaces the population with a population of offspring. The genes are divided into
+        'self.gene_segment_count' segments; for each segment, an offspring takes the elements to
+        the left of a random crossover point from one parent and the elements to the right of it
+        from another parent, while the element at the crossover point is left unchanged.
+        The whole population is processed at once using boolean masks.
+        '''
         sampling_array = self._create_sampling_array()
-        for i in xrange(self.population_count):
-            gene1_index, gene2_index = self._choose_individuals(sampling_array)
-            gene = population_copy[i]
-            for j in xrange(self.gene_segment_count):
-                segment_left_index = self.gene_segment_size * j
-                segment_right_index = self.gene_segment_size * (j+1) - 1
-                crossover_index = np.random.randint(segment_left_index, segment_right_index)
-                gene[segment_left_index:crossover_index] = self.population[gene1_index, segment_left_index:crossover_index]
-                gene[crossover_index+1:segment_right_index+1] = self.population[gene2_index, crossover_index+1:segment_right_index+1]
-            population_copy[i] = gene
+        gene1_indices, gene2_indices = self._choose_individuals(sampling_array, self.population_count)
+
+        #a crossover point is chosen for each segment of each offspring
+        segment_left_indices = np.arange(self.gene_segment_count) * self.gene_segment_size
+        crossover_indices = segment_left_indices + self.rng.randint(0, self.gene_segment_size-1, (self.population_count, self.gene_segment_count))
+
+        #the elements that are not in any segment are not changed
+        element_indices = np.arange(self.gene_length)
+        segment_element_count = self.gene_segment_count * self.gene_segment_size
+        element_segments = np.minimum(element_indices // self.gene_segment_size, self.gene_segment_count-1)
+        element_crossover_indices = crossover_indices[:, element_segments]
+        segment_elements = element_indices < segment_element_count
+        gene1_mask = (element_indices < element_crossover_indices) & segment_elements
+        gene2_mask = (element_indices > element_crossover_indices) & segment_elements
+
+        population_copy = np.array(self.population)
+        population_copy[gene1_mask] = self.population[gene1_indices][gene1_mask]
+        population_copy[gene2_mask] = self.population[gene2_indices][gene2_mask]
         self.population = population_copy
 
     def _mutate(self):
-        for i in xrange(self.population_count):
-            mutate_prob = np.random.uniform()
-            if mutate_prob < self.mutation_probability:
-                mutation_element_count = np.random.randint(0, self.mutation_max_element_count+1)
-                mutated_elements = list()
-                for i in xrange(mutation_element_count):
-                    selected = False
-                    element_index = -1
-                    while not selected:
-                        element_index = np.random.randint(0, self.gene_length)
-                        if element_index not in mutated_elements:
-                            selected = True
-                    mutated_elements.append(element_index)
-                    self.population[i, element_index] = 1 - self.population[i, element_index]
+        '''Mutates each gene with probability 'self.mutation_probability' by flipping
+        between 0 and 'self.mutation_max_element_count' distinct randomly chosen elements.
+        '''
+        mutated_genes = np.where(self.rng.uniform(size=self.population_count) < self.mutation_probability)[0]
+        mutation_element_counts = self.rng.randint(0, self.mutation_max_element_count+1, len(mutated_genes))
+
+        #the first elements of a random permutation of the element indices are flipped in each mutated gene
+        element_permutations = np.argsort(self.rng.uniform(size=(len(mutated_genes), self.gene_length)), axis=1)
+        mutated_elements = element_permutations[:, :self.mutation_max_element_count]
+        mutation_mask = np.arange(mutated_elements.shape[1]) < mutation_element_counts[:, np.newaxis]
+        gene_indices = np.repeat(mutated_genes[:, np.newaxis], mutated_elements.shape[1], axis=1)[mutation_mask]
+        element_indices = mutated_elements[mutation_mask]
+        self.population[gene_indices, element_indices] = 1 - self.population[gene_indices, element_indices]
 
     def _create_sampling_array(self):
         '''Returns a cumulative gene fitness sum.
@@ -149,20 +182,18 @@ class Evolver(object):
         sampling_array[1:] = np.cumsum(self.gene_fitness)
         return sampling_array
 
-    def _choose_individuals(self, sampling_array):
-        '''Returns two gene indices sampled according to the distribution encoded by 'sampling_array'.
+    def _choose_individuals(self, sampling_array, pair_count=1):
+        '''Returns two arrays of 'pair_count' gene indices sampled according to the distribution encoded by 'sampling_array'.
 
         Keyword arguments:
         sampling_array -- A cumulative array encoding a gene fitness distribution.
+        pair_count -- The number of gene pairs that should be sampled (default 1).
 
         '''
-        sampling_p = np.random.uniform(0, sampling_array[-1])
-        gene1 = np.argmin(sampling_array < sampling_p) - 1
-
-        sampling_p = np.random.uniform(0, sampling_array[-1])
-        gene2 = np.argmin(sampling_array < sampling_p) - 1
-
-        return gene1, gene2
+        sampling_p = self.rng.uniform(0, sampling_array[-1], (2, pair_count))
+        genes = np.searchsorted(sampling_array, sampling_p, side='left') - 1
+        genes = np.clip(genes, 0, self.population_count-1)
+        return genes[0], genes[1]
 
 
 class RuleFinder(object):
@@ -171,17 +202,26 @@ class RuleFinder(object):
     Author -- Alex Mitrevski
 
     '''
-    def __init__(self, pos_fitness_data, neg_fitness_data):
+    def __init__(self, pos_fitness_data, neg_fitness_data, rng=None):
         '''
         Keyword arguments:
         pos_fitness_data -- A 2D binary integer 'numpy' array with positive symbolic training data.
         neg_fitness_data -- A 2D binary integer 'numpy' array with negative symbolic training data.
+        rng -- A 'numpy.random.RandomState' object used by the algorithm (default None, in which case the global 'numpy' random state is used).
 
         '''
         self.pos_fitness_data = np.array(pos_fitness_data)
         self.neg_fitness_data = np.array(neg_fitness_data)
 
-    def learn_precondition_vector(self, fitness_callback, max_iterations, initial_guess=None, vectors_to_avoid=None, eta=0.1, evaluation_fitness_cb=None):
+        #the count fitness (which stores the column counts of the training data) is reused by all runs with the same fitness parameters
+        self.count_fitness = None
+        self.count_fitness_params = None
+
+        self.rng = np.random
+        if rng is not None:
+            self.rng = rng
+
+    def learn_precondition_vector(self, fitness_callback, max_iterations, initial_guess=None, vectors_to_avoid=None, eta=0.1, evaluation_fitness_cb=None, steepest_ascent=False):
         '''Runs hill climbing for learning a symbolic model covering the training data.
 
         Keyword arguments:
@@ -192,8 +232,14 @@ class RuleFinder(object):
         vectors_to_avoid -- A 2D 'numpy' array of vectors that the algorithm should try to avoid (default None).
         eta -- The value of eta used when there are vectors that should be avoided (default 0.1).
         evaluation_fitness_cb -- A fitness function that can be used for comparison when there are vectors that should be avoided (default None).
+        steepest_ascent -- If True, the bit whose flip improves the fitness the most is flipped at each iteration
+                           and the search stops as soon as no flip improves the fitness; otherwise,
+                           a random bit is flipped if that improves the fitness (default False).
 
         '''
+        #with a count fitness, the fitness of the neighbours is computed incrementally from the current fitness
+        count_fitness = self._get_count_fitness(fitness_callback, vectors_to_avoid, eta)
+
         current_p = self._get_initial_state(initial_guess)
         fitness = self._calculate_fitness(fitness_callback, current_p, vectors_to_avoid, eta)
         current_fitness = fitness
@@ -205,10 +251,26 @@ class RuleFinder(object):
 
         iteration_counter = 0
         while iteration_counter < max_iterations:
-            #we generate a random neighbour of the current state
-            neighbour = self._generate_neighbour(current_p)
-            neighbour_fitness = self._calculate_fitness(fitness_callback, neighbour, vectors_to_avoid, eta)
-            delta_fitness = neighbour_fitness - current_fitness
+            if steepest_ascent:
+                #we take the neighbour of the current state with the largest fitness
+                delta_fitnesses = self._calculate_flip_deltas(fitness_callback, count_fitness, current_p, current_fitness, vectors_to_avoid, eta)
+                bit_idx = np.argmax(delta_fitnesses)
+                delta_fitness = delta_fitnesses[bit_idx]
+                if delta_fitness <= 0:
+                    break
+
+                neighbour = np.array(current_p)
+                neighbour[bit_idx] = 1 - neighbour[bit_idx]
+                neighbour_fitness = current_fitness + delta_fitness
+            else:
+                #we generate a random neighbour of the current state
+                neighbour, bit_idx = self._generate_neighbour(current_p)
+                if count_fitness is not None:
+                    delta_fitness = count_fitness.flip_delta(current_p, bit_idx)
+                    neighbour_fitness = current_fitness + delta_fitness
+                else:
+                    neighbour_fitness = self._calculate_fitness(fitness_callback, neighbour, vectors_to_avoid, eta)
+                    delta_fitness = neighbour_fitness - current_fitness
 
             #we move to the neighbour only if it improves the fitness
             if delta_fitness > 0:
@@ -232,22 +294,51 @@ class RuleFinder(object):
         '''
         p = None
         if initial_guess is None:
-            p = np.random.randint(0, 2, self.pos_fitness_data.shape[1])
+            p = self.rng.randint(0, 2, self.pos_fitness_data.shape[1])
         else:
             p = np.array(initial_guess)
         return p
 
     def _generate_neighbour(self, p):
         '''Chooses a random element in 'p' and flips its state.
+        Returns the neighbour and the index of the flipped element.
 
         Keyword arguments:
         p -- A one-dimensional 'numpy' array representing the symbolic model at the current iteration of the algorithm.
 
         '''
         neighbour = np.array(p)
-        bit_idx = np.random.randint(0, self.pos_fitness_data.shape[1])
+        bit_idx = self.rng.randint(0, self.pos_fitness_data.shape[1])
         neighbour[bit_idx] = 1 - neighbour[bit_idx]
-        return neighbour
+        return neighbour, bit_idx
+
+    def _get_count_fitness(self, fitness_callback, vectors_to_avoid, eta):
+        '''Returns a 'fitness.CountFitness' object equivalent to 'fitness_callback' (None if
+        there is no column count equivalent); the object is only created if the fitness parameters change.
+        '''
+        params = (fitness_callback, vectors_to_avoid, eta)
+        if self.count_fitness_params is None or self.count_fitness_params[0] is not fitness_callback \
+        or self.count_fitness_params[1] is not vectors_to_avoid or self.count_fitness_params[2] != eta:
+            if vectors_to_avoid is None:
+                self.count_fitness = FitnessFunctionLibrary.get_count_fitness(fitness_callback, self.pos_fitness_data, None)
+            else:
+                self.count_fitness = FitnessFunctionLibrary.get_count_fitness(fitness_callback, self.pos_fitness_data, vectors_to_avoid, eta)
+            self.count_fitness_params = params
+        return self.count_fitness
+
+    def _calculate_flip_deltas(self, fitness_callback, count_fitness, p, fitness, vectors_to_avoid, eta):
+        '''Returns a 'numpy' array whose i-th element is the fitness change caused by flipping the i-th element of 'p';
+        without a count fitness, the fitness of each neighbour of 'p' is calculated separately.
+        '''
+        if count_fitness is not None:
+            return count_fitness.flip_deltas(p)
+
+        delta_fitnesses = np.zeros(len(p))
+        for i in xrange(len(p)):
+            neighbour = np.array(p)
+            neighbour[i] = 1 - neighbour[i]
+            delta_fitnesses[i] = self._calculate_fitness(fitness_callback, neighbour, vectors_to_avoid, eta) - fitness
+        return delta_fitnesses
 
     def _calculate_fitness(self, fitness_callback, p, vectors_to_avoid, eta):
         if vectors_to_avoid is None:
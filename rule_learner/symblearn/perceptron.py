@@ -21,6 +21,8 @@ import numpy as np
 from scipy.misc import comb
 from copy import deepcopy
 
+from kernels import KDNFKernel, KernelGramMatrix
+
 class DataContainer(object):
     def __init__(self, data, labels):
         self.features = np.array(data)
@@ -51,6 +53,10 @@ class VotedPerceptron(object):
         self.correct_prediction_counters = None
         self.data = None
 
+        #a 'KernelGramMatrix' of the training data, which is reused if
+        #the perceptron is trained again on an extended training set
+        self.gram_matrix = None
+
     def train(self, data, iterations=1, kernel_k=2):
         '''Trains the voted perceptron using 'data'.
 
@@ -63,15 +69,14 @@ class VotedPerceptron(object):
         self.data = deepcopy(data)
         self.misclassification_counters = np.zeros(data.features.shape[0], dtype=np.int32)
         self.correct_prediction_counters = np.zeros(data.features.shape[0], dtype=np.int32)
+        self._update_gram_matrix(kernel_k)
+        kernel_values = self.gram_matrix.matrix
 
         k = 0
         training_vector_count = self.data.features.shape[0]
         for _ in xrange(iterations):
             for i in xrange(training_vector_count):
-                s = 0
-                for j in xrange(i+1):
-                    if self.misclassification_counters[j] != 0:
-                        s += (self.misclassification_counters[j] * self.data.labels[j] * KernelFunctionsLibrary.kDNF(self.data.features[j], self.data.features[i], kernel_k))
+                s = np.dot(self.misclassification_counters[:i+1] * self.data.labels[:i+1], kernel_values[:i+1,i])
                 prediction = np.sign(s)
                 if prediction == self.data.labels[i]:
                     self.correct_prediction_counters[k] += 1
@@ -88,15 +93,7 @@ class VotedPerceptron(object):
         kernel_k -- The k value of the k-DNF kernel (default 2).
 
         '''
-        training_vector_count = self.data.features.shape[0]
-        s = 0
-        for i in xrange(training_vector_count):
-            if self.correct_prediction_counters[i] > 0:
-                s_internal = 0
-                for j in xrange(i+1):
-                    if self.misclassification_counters[j] > 0:
-                        s_internal += (self.misclassification_counters[j] * self.data.labels[j] * KernelFunctionsLibrary.kDNF(self.data.features[j], x, kernel_k))
-                s += (self.correct_prediction_counters[i] * np.sign(s_internal))
+        s = self._calculate_supports(np.array(x)[np.newaxis], kernel_k)[0]
         prediction = np.sign(s)
         return prediction
 
@@ -107,16 +104,26 @@ class VotedPerceptron(object):
         kernel_k -- The k value of the k-DNF kernel.
 
         '''
-        training_vector_count = self.data.features.shape[0]
-        s = 0
-        for i in xrange(training_vector_count):
-            if self.correct_prediction_counters[i] > 0:
-                s_internal = 0
-                for j in xrange(i+1):
-                    if self.misclassification_counters[j] > 0:
-                        s_internal += (self.misclassification_counters[j] * self.data.labels[j] * KernelFunctionsLibrary.kDNF(self.data.features[j], x, kernel_k))
-                s += (self.correct_prediction_counters[i] * np.sign(s_internal))
-        return s
+        return self._calculate_supports(np.array(x)[np.newaxis], kernel_k)[0]
+
+    def _calculate_supports(self, rules, kernel_k):
+        '''Returns a 'numpy' array with the support of each row of 'rules' based on the training data.
+
+        rules -- A 2D 'numpy' array whose rows represent precondition rules.
+        kernel_k -- The k value of the k-DNF kernel.
+
+        '''
+        kernel_values = self._calculate_kernel_values(rules, kernel_k)
+
+        #the internal sum of the i-th vote is taken over the first i+1 training vectors,
+        #so the sums of all votes are the cumulative sums over the training vectors
+        weights = self.misclassification_counters * self.data.labels
+        weights[self.misclassification_counters <= 0] = 0
+        internal_sums = np.cumsum(weights[:,np.newaxis] * kernel_values, axis=0)
+
+        votes = np.array(self.correct_prediction_counters)
+        votes[self.correct_prediction_counters <= 0] = 0
+        return np.dot(votes, np.sign(internal_sums))
 
     def _rule_covers_negative_examples(self, rule, kernel_k):
         '''Returns True if 'rule' predicts a negative data sample to be positive and False otherwise.
@@ -126,12 +133,31 @@ class VotedPerceptron(object):
         kernel_k -- The k value of the k-DNF kernel.
 
         '''
-        for i,v in enumerate(self.data.features):
-            prediction = np.sign(KernelFunctionsLibrary.kDNF(rule, v, kernel_k))
-            actual_label = self.data.labels[i]
-            if actual_label == -1 and prediction == 1:
-                return True
-        return False
+        predictions = np.sign(self._calculate_kernel_values(np.array(rule)[np.newaxis], kernel_k)[:,0])
+        return np.any((self.data.labels == -1) & (predictions == 1))
+
+    def _calculate_kernel_values(self, x, kernel_k):
+        '''Returns a 2D 'numpy' array whose (i,j)-th element is the value of the
+        k-DNF kernel for the i-th training vector and the j-th row of 'x'.
+        '''
+        if self.gram_matrix is not None and self.gram_matrix.kernel.k == kernel_k:
+            kernel = self.gram_matrix.kernel
+        else:
+            kernel = KDNFKernel(kernel_k, self.data.features.shape[1])
+        return kernel.evaluate(self.data.features, x)
+
+    def _update_gram_matrix(self, kernel_k):
+        '''Makes sure that 'self.gram_matrix' is a k-DNF Gram matrix of the current training data;
+        the existing matrix is only extended if the training data extend its training vectors.
+        '''
+        if self.gram_matrix is not None and self.gram_matrix.kernel.k == kernel_k \
+        and self.gram_matrix.covers(self.data.features):
+            known_vector_count = self.gram_matrix.features.shape[0]
+            if known_vector_count < self.data.features.shape[0]:
+                self.gram_matrix.extend(self.data.features[known_vector_count:])
+        else:
+            self.gram_matrix = KernelGramMatrix(KDNFKernel(kernel_k, self.data.features.shape[1]))
+            self.gram_matrix.extend(self.data.features)
 
     def extract_precondition_vector(self, kernel_k=2):
         '''Extracts a precondition vector using the perceptron's
@@ -142,11 +168,8 @@ class VotedPerceptron(object):
 
         '''
         support_vectors = np.array(self.data.features[np.where(self.misclassification_counters>0)[0],:])
-        rule_support = np.zeros(support_vectors.shape[0])
         print support_vectors.shape[0]
-        for i,p in enumerate(support_vectors):
-            print i
-            rule_support[i] = self._calculate_support(p, kernel_k)
+        rule_support = self._calculate_supports(support_vectors, kernel_k)
 
         prec_vector_len = support_vectors.shape[1]
         support_v = support_vectors[np.argmax(rule_support)]
@@ -167,9 +190,7 @@ class VotedPerceptron(object):
                 new_rules[new_rule_counter] = new_prec
                 new_rule_counter += 1
 
-            rule_support = np.zeros(new_rule_count)
-            for i,p in enumerate(new_rules):
-                rule_support[i] = self._calculate_support(p, kernel_k)
+            rule_support = self._calculate_supports(new_rules, kernel_k)
 
             support_delta = current_rule_support - rule_support
             argmin_delta = np.argmin(support_delta)
@@ -30,6 +30,13 @@ class StatLearn(object):
     Author -- Alex Mitrevski
 
     '''
+    def __init__(self):
+        #the distinct predicate values seen so far (in ascending order) and a
+        #2D array whose (i,j)-th element is the number of times the i-th predicate had the j-th value
+        self.values = np.zeros(0, dtype=np.int64)
+        self.value_counts = None
+        self.row_count = 0
+
     def extract_rules(self, data, acceptance_threshold=0.9):
         '''Extracts a precondition set from 'data'.
 
@@ -42,64 +49,102 @@ class StatLearn(object):
         precondition_values -- A 'numpy' integer array of length 'data.shape[1]' storing the values of the preconditions; the value of the predicates that are not preconditions will always be 0.
 
         '''
-        precondition_vector = np.zeros(data.shape[1], dtype=np.int32)
-        precondition_values = np.zeros(data.shape[1], dtype=np.int32)
-        for i in xrange(data.shape[1]):
-            predicate_value_prob = self._calculate_prob(data[:,i])
-            predicate_entropy = self._entropy(predicate_value_prob)
-            if predicate_entropy < acceptance_threshold:
-                precondition_value = self._max_prob_value(predicate_value_prob)
-                if precondition_value != 0:
-                    precondition_vector[i] = 1
-                    precondition_values[i] = precondition_value
-        return precondition_vector, precondition_values
+        self.reset()
+        self.add_data(data)
+        return self.get_rules(acceptance_threshold)
+
+    def reset(self):
+        '''Discards the predicate value statistics.
+        '''
+        self.values = np.zeros(0, dtype=np.int64)
+        self.value_counts = None
+        self.row_count = 0
+
+    def add_data(self, data):
+        '''Adds the training examples in 'data' (a 2D 'numpy' array of symbolic relations
+        in which each row is a separate training example) to the predicate value statistics.
+        '''
+        data = np.asarray(data)
+        if self.value_counts is None:
+            self.value_counts = np.zeros((data.shape[1], 0), dtype=np.int64)
+        if data.shape[0] == 0:
+            return
+
+        #the statistics are extended with the values that haven't been seen before
+        values = np.union1d(self.values, np.unique(data))
+        if len(values) > len(self.values):
+            value_counts = np.zeros((data.shape[1], len(values)), dtype=np.int64)
+            value_counts[:, np.searchsorted(values, self.values)] = self.value_counts
+            self.values = values
+            self.value_counts = value_counts
+
+        value_indices = np.searchsorted(self.values, data)
+        count_indices = np.arange(data.shape[1]) * len(self.values) + value_indices
+        self.value_counts += np.bincount(count_indices.ravel(), minlength=self.value_counts.size).reshape(self.value_counts.shape)
+        self.row_count += data.shape[0]
+
+    def get_entropies(self):
+        '''Returns a 'numpy' array with the entropies of the value distributions of the individual predicates
+        (an empty array if no data have been added and an array of zeros if only empty data have been added).
+        '''
+        if self.value_counts is None:
+            return np.zeros(0)
+        if self.row_count == 0:
+            return np.zeros(self.value_counts.shape[0])
+
+        value_prob = self._calculate_prob()
+        return self._entropy(value_prob)
 
-    def _calculate_prob(self, data):
-        '''Calculates the probabilities of the individual values of a given predicate.
+    def get_rules(self, acceptance_threshold=0.9):
+        '''Extracts a precondition set from the training examples added so far.
 
         Keyword arguments:
-        data -- A one-dimensional 'numpy' array storing the observed values of a given predicate.
+        acceptance_threshold -- Threshold that controls the acceptance of the potential preconditions (default 0.9).
 
         Returns:
-        prob -- A dictionary in which the keys represent predicate values and the values are the probabilities of the predicate values.
+        precondition_vector -- A binary 'numpy' integer array whose value of 1 at a given index indicates that the predicate is a precondition of the respective action.
+        precondition_values -- A 'numpy' integer array storing the values of the preconditions; the value of the predicates that are not preconditions will always be 0.
 
         '''
-        prob = dict()
-        values = dict()
-        for d in data:
-            if d in values:
-                values[d] += 1
-            else:
-                values[d] = 1
-
-        for k,v in values.iteritems():
-            prob[k] = v / (len(data) * 1.)
+        predicate_count = 0
+        if self.value_counts is not None:
+            predicate_count = self.value_counts.shape[0]
+
+        precondition_vector = np.zeros(predicate_count, dtype=np.int32)
+        precondition_values = np.zeros(predicate_count, dtype=np.int32)
+        if self.row_count == 0:
+            return precondition_vector, precondition_values
+
+        value_prob = self._calculate_prob()
+        predicate_entropies = self._entropy(value_prob)
+        max_prob_values = self._max_prob_value(value_prob)
+        preconditions = (predicate_entropies < acceptance_threshold) & (max_prob_values != 0)
+        precondition_vector[preconditions] = 1
+        precondition_values[preconditions] = max_prob_values[preconditions]
+        return precondition_vector, precondition_values
 
-        return prob
+    def _calculate_prob(self):
+        '''Returns a 2D 'numpy' array whose (i,j)-th element is the probability that the i-th predicate has the value 'self.values[j]'.
+        '''
+        return self.value_counts / (self.row_count * 1.)
 
     def _entropy(self, value_prob):
-        '''Calculates the entropy of the input probability distribution.
+        '''Calculates the entropies of the input probability distributions.
 
         Keyword arguments:
-        value_prob -- A dictionary in which the keys represent predicate values and the values are the probabilities of the predicate values.
+        value_prob -- A 2D 'numpy' array in which each row is a probability distribution over 'self.values'.
 
         '''
-        entropy = 0.
-        for v in value_prob:
-            entropy = entropy + value_prob[v] * np.log2(value_prob[v])
-        return -entropy
+        log_prob = np.zeros(value_prob.shape)
+        observed_values = value_prob > 0
+        log_prob[observed_values] = np.log2(value_prob[observed_values])
+        return -np.sum(value_prob * log_prob, axis=1)
 
     def _max_prob_value(self, value_prob):
-        '''Returns the key of the input dictionary with the maximum value.
+        '''Returns a 'numpy' array with the most probable value of each input probability distribution.
 
         Keyword arguments:
-        value_prob -- A dictionary in which the keys represent predicate values and the values are the probabilities of the predicate values.
+        value_prob -- A 2D 'numpy' array in which each row is a probability distribution over 'self.values'.
 
         '''
-        max_prob = -1.
-        max_value = -1
-        for v, prob in value_prob.iteritems():
-            if prob > max_prob:
-                max_prob = prob
-                max_value = v
-        return max_value
+        return self.values[np.argmax(value_prob, axis=1)]
@@ -18,10 +18,12 @@
 '''
 
 import numpy as np
+from multiprocessing import Pool, cpu_count
 
 from symblearn.local_search import Evolver, RuleFinder
 from symblearn.stat_learn import StatLearn
 from symblearn.perceptron import VotedPerceptron, DataContainer
+from symblearn.fitness import FitnessFunctionLibrary
 
 class RuleLearner(object):
     '''
@@ -39,22 +41,22 @@ class RuleLearner(object):
         pass
 
     def _convert_data(self, data, object_extraction_cb, predicate_calculation_cb):
-        p_data = data[np.where(data[:,-1]>0)]
-        n_data = data[np.where(np.abs(data[:,-1])<1e-10)]
-
-        p_predicate_vectors = list()
-        n_predicate_vectors = list()
-        for i in xrange(p_data.shape[0]):
-            objects = object_extraction_cb(p_data[i])
-            p_predicate_vectors.append(predicate_calculation_cb(objects))
-
-        for i in xrange(n_data.shape[0]):
-            objects = object_extraction_cb(n_data[i])
-            n_predicate_vectors.append(predicate_calculation_cb(objects))
-
-        self.object_count = len(objects)
-        p_predicate_vectors = np.array(p_predicate_vectors)
-        n_predicate_vectors = np.array(n_predicate_vectors)
+        '''Returns the predicate vectors of the positive and negative items in 'data'.
+
+        Keyword arguments:
+        data -- A 2D 'numpy' array in which each row is a single data item.
+        object_extraction_cb -- Function that extracts the objects of all data items at once
+                                (e.g. 'global_utils.extract_object_arrays').
+        predicate_calculation_cb -- Function that calculates a predicate matrix from the extracted objects
+                                    (e.g. 'global_utils.calculate_predicate_matrix').
+
+        '''
+        objects = object_extraction_cb(data)
+        predicate_vectors = predicate_calculation_cb(objects)
+        self.object_count = objects.shape[1]
+
+        p_predicate_vectors = predicate_vectors[np.where(data[:,-1]>0)]
+        n_predicate_vectors = predicate_vectors[np.where(np.abs(data[:,-1])<1e-10)]
         return p_predicate_vectors, n_predicate_vectors
 
     def _get_object_names(self):
@@ -122,7 +124,8 @@ class RuleEvolver(RuleLearner):
     Author -- Alex Mitrevski
     '''
     def __init__(self, training_fitness_cb, population_size=500, generation_count=100, population_count=5, \
-    predicate_acceptance_p=0.9, mutation_probability=-1, mutation_max_element_count=0, debug=False, vector_fitness_cb=None):
+    predicate_acceptance_p=0.9, mutation_probability=-1, mutation_max_element_count=0, debug=False, vector_fitness_cb=None, \
+    processes=None, seed=None):
         super(RuleEvolver, self).__init__(training_fitness_cb, vector_fitness_cb, predicate_acceptance_p, debug)
 
         self.population_size = population_size
@@ -131,16 +134,23 @@ class RuleEvolver(RuleLearner):
         self.mutation_probability = mutation_probability
         self.mutation_max_element_count = mutation_max_element_count
 
+        #the populations are evolved in parallel by 'processes' processes (all CPUs if None);
+        #each population has its own random state, whose seed is derived from 'seed'
+        self.processes = processes
+        self.seed = seed
+
     def learn_rules(self, data, object_extraction_cb, predicate_calculation_cb, gt_data=None):
         p_predicate_vectors, n_predicate_vectors = self._convert_data(data, object_extraction_cb, predicate_calculation_cb)
         predicate_vector_length = p_predicate_vectors.shape[1]
 
-        rule_evolver = Evolver(p_predicate_vectors, n_predicate_vectors, self.population_size, predicate_vector_length, self.object_count)
+        learning_problem = (p_predicate_vectors, n_predicate_vectors, self.population_size, predicate_vector_length, self.object_count, \
+                            FitnessFunctionLibrary.get_callback_reference(self.training_fitness_cb), self.generation_count)
+        runs = _get_runs(self.population_count, self.seed)
+        results = _run_learning_problem(_set_evolution_problem, learning_problem, _evolve_population, runs, self.processes)
+
         fitness_per_iteration = np.zeros((self.population_count, self.generation_count))
         population_preconditions = np.zeros((self.population_count, predicate_vector_length))
-        for i in xrange(self.population_count):
-            print i+1
-            rule_population, fitness = rule_evolver.evolve(self.training_fitness_cb, self.generation_count)
+        for i, (rule_population, fitness) in enumerate(results):
             population_preconditions[i] = self._get_full_precondition_vector(rule_population)
             fitness_per_iteration[i] = fitness
 
@@ -166,7 +176,8 @@ class RuleOptimiser(RuleLearner):
     Author -- Alex Mitrevski
     '''
     def __init__(self, vector_fitness_cb, predicate_acceptance_p=0.9, restart_count=10, \
-    max_iterations=1000, initial_guess=None, vectors_to_avoid=None, eta=0.1, evaluation_fitness_cb=None, debug=False):
+    max_iterations=1000, initial_guess=None, vectors_to_avoid=None, eta=0.1, evaluation_fitness_cb=None, debug=False, steepest_ascent=False, \
+    processes=None, seed=None):
         super(RuleOptimiser, self).__init__(None, vector_fitness_cb, predicate_acceptance_p, debug)
         self.restart_count = restart_count
         self.max_iterations = max_iterations
@@ -174,16 +185,30 @@ class RuleOptimiser(RuleLearner):
         self.vectors_to_avoid = vectors_to_avoid
         self.eta = eta
         self.evaluation_fitness_cb = evaluation_fitness_cb
+        self.steepest_ascent = steepest_ascent
+
+        #the restarts are run in parallel by 'processes' processes (all CPUs if None);
+        #each restart has its own random state, whose seed is derived from 'seed'
+        self.processes = processes
+        self.seed = seed
 
     def learn_rules(self, data, object_extraction_cb, predicate_calculation_cb, gt_data=None):
         p_predicate_vectors, n_predicate_vectors = self._convert_data(data, object_extraction_cb, predicate_calculation_cb)
         predicate_vector_length = p_predicate_vectors.shape[1]
 
+        learning_parameters = {'fitness_callback': FitnessFunctionLibrary.get_callback_reference(self.vector_fitness_cb),
+                               'max_iterations': self.max_iterations,
+                               'initial_guess': self.initial_guess,
+                               'vectors_to_avoid': self.vectors_to_avoid,
+                               'eta': self.eta,
+                               'evaluation_fitness_cb': FitnessFunctionLibrary.get_callback_reference(self.evaluation_fitness_cb),
+                               'steepest_ascent': self.steepest_ascent}
+        learning_problem = (p_predicate_vectors, n_predicate_vectors, learning_parameters)
+        runs = _get_runs(self.restart_count, self.seed)
+        results = _run_learning_problem(_set_optimisation_problem, learning_problem, _find_precondition_vector, runs, self.processes)
+
         precondition_candidates = np.zeros((self.restart_count, predicate_vector_length))
-        rule_finder = RuleFinder(p_predicate_vectors, n_predicate_vectors)
-        for i in xrange(self.restart_count):
-            print i+1
-            precondition_vector,_ = rule_finder.learn_precondition_vector(self.vector_fitness_cb, self.max_iterations, initial_guess=self.initial_guess, vectors_to_avoid=self.vectors_to_avoid, eta=self.eta, evaluation_fitness_cb=self.evaluation_fitness_cb)
+        for i, precondition_vector in enumerate(results):
             precondition_candidates[i] = precondition_vector
 
         precondition_prob = np.sum(precondition_candidates, axis=0) / (precondition_candidates.shape[0] * 1.)
@@ -207,11 +232,37 @@ class RuleStatLearner(RuleLearner):
     '''
     def __init__(self, predicate_acceptance_p=0.9, debug=False, vector_fitness_cb=None):
         super(RuleStatLearner, self).__init__(None, vector_fitness_cb, predicate_acceptance_p, debug)
+        self.stat_learner = StatLearn()
+
+    def add_data(self, data, object_extraction_cb, predicate_calculation_cb):
+        '''Adds the positive data items in 'data' (e.g. newly collected trials) to the predicate value
+        statistics; the precondition vector can then be extracted again using 'self.get_precondition_vector'.
+
+        Keyword arguments:
+        data -- A 2D 'numpy' array in which each row is a single data item.
+        object_extraction_cb -- Function that extracts the objects of all data items at once
+                                (e.g. 'global_utils.extract_object_arrays').
+        predicate_calculation_cb -- Function that calculates a predicate matrix from the extracted objects
+                                    (e.g. 'global_utils.calculate_predicate_matrix').
+
+        '''
+        p_predicate_vectors,_ = self._convert_data(data, object_extraction_cb, predicate_calculation_cb)
+        self.stat_learner.add_data(p_predicate_vectors)
+
+    def get_precondition_vector(self):
+        '''Returns the precondition vector extracted from the data added so far.
+        '''
+        precondition_vector,_ = self.stat_learner.get_rules(self.predicate_acceptance_p)
+        return precondition_vector
+
+    def get_entropies(self):
+        '''Returns the entropies of the predicate value distributions of the data added so far.
+        '''
+        return self.stat_learner.get_entropies()
 
     def learn_rules(self, data, object_extraction_cb, predicate_calculation_cb, gt_data=None):
         p_predicate_vectors, n_predicate_vectors = self._convert_data(data, object_extraction_cb, predicate_calculation_cb)
-        rule_learner = StatLearn()
-        precondition_vector,_ = rule_learner.extract_rules(p_predicate_vectors, self.predicate_acceptance_p)
+        precondition_vector,_ = self.stat_learner.extract_rules(p_predicate_vectors, self.predicate_acceptance_p)
 
         if not self.debug:
             return precondition_vector
@@ -234,18 +285,9 @@ class RuleLearnerMourao(RuleLearner):
 
     def learn_rules(self, data, object_extraction_cb, predicate_calculation_cb, final_predicate_calculation_cb, gt_data=None):
         p_predicate_vectors, n_predicate_vectors = self._convert_data(data, object_extraction_cb, predicate_calculation_cb)
-        predicate_vectors = list()
-        output_vectors = list()
-
-        for i in xrange(data.shape[0]):
-            objects = object_extraction_cb(data[i])
-            predicate_vector = predicate_calculation_cb(objects)
-            final_predicate_vector = final_predicate_calculation_cb(objects)
+        predicate_vectors = predicate_calculation_cb(object_extraction_cb(data))
+        predicate_vectors[np.where(predicate_vectors==0)] = -1
 
-            predicate_vector[np.where(predicate_vector==0)[0]] = -1
-            predicate_vectors.append(predicate_vector)
-
-        predicate_vectors = np.array(predicate_vectors)
         labels = np.array(data[:,-1], dtype=np.int32)
         labels[np.where(labels==0)[0]] = -1
 
@@ -274,40 +316,200 @@ class RuleLearnerOnline(RuleLearner):
     def __init__(self, predicate_acceptance_p=0.9, debug=False, vector_fitness_cb=None):
         super(RuleLearnerOnline, self).__init__(None, vector_fitness_cb, predicate_acceptance_p, debug)
 
-    def learn_rules(self, data, object_extraction_cb, predicate_calculation_cb, gt_data=None):
-        objects = object_extraction_cb(data[0])
-        self.object_count = len(objects)
+        #the precondition state has the value 1 for predicates that have to hold, 0 for predicates that
+        #must not hold, and -1 for predicates whose value doesn't matter; it is None before
+        #the first positive data item is seen
+        self.precondition_state = None
+
+        #running statistics of the data seen so far, such that the fitness can be computed without storing the data
+        self.running_fitness = None
+        if vector_fitness_cb is not None:
+            self.running_fitness = FitnessFunctionLibrary.get_running_fitness(vector_fitness_cb)
+
+    def reset(self):
+        '''Discards the precondition vector and fitness statistics learned so far.
+        '''
+        self.precondition_state = None
+        if self.running_fitness is not None:
+            self.running_fitness = FitnessFunctionLibrary.get_running_fitness(self.vector_fitness_cb)
+
+    def partial_fit(self, data, object_extraction_cb, predicate_calculation_cb):
+        '''Updates the precondition vector and the running fitness statistics with the data items in 'data'.
+
+        Keyword arguments:
+        data -- A 2D 'numpy' array in which each row is a single data item.
+        object_extraction_cb -- Function that extracts the objects of all data items at once
+                                (e.g. 'global_utils.extract_object_arrays').
+        predicate_calculation_cb -- Function that calculates a predicate matrix from the extracted objects
+                                    (e.g. 'global_utils.calculate_predicate_matrix').
+
+        '''
+        if data.shape[0] == 0:
+            return
+
+        objects = object_extraction_cb(data)
+        predicate_vectors = predicate_calculation_cb(objects)
+        self.object_count = objects.shape[1]
 
-        precondition_vector = None
         for i in xrange(data.shape[0]):
-            objects = object_extraction_cb(data[i])
-            predicates = predicate_calculation_cb(objects)
-
-            if precondition_vector is not None:
+            predicates = predicate_vectors[i]
+            if self.precondition_state is not None:
                 if data[i,-1] > 0:
-                    for j,p in enumerate(predicates):
-                        if (p != 1 and precondition_vector[j] == 1) or (p != 0 and precondition_vector[j] == 0):
-                            precondition_vector[j] = -1
+                    inconsistent = ((predicates != 1) & (self.precondition_state == 1)) | ((predicates != 0) & (self.precondition_state == 0))
+                    self.precondition_state[inconsistent] = -1
                 else:
-                    for j,p in enumerate(predicates):
-                        if (p == 1 and precondition_vector[j] != 1):
-                            precondition_vector[j] = 0
-            else:
-                if data[i,-1] > 0:
-                    precondition_vector = np.array(predicates)
-                    idx = np.where(predicates==0)
-                    precondition_vector[idx] = -1
-
+                    self.precondition_state[(predicates == 1) & (self.precondition_state != 1)] = 0
+            elif data[i,-1] > 0:
+                self.precondition_state = np.array(predicates)
+                self.precondition_state[np.where(predicates==0)] = -1
+
+        if self.running_fitness is not None:
+            p_predicate_vectors = predicate_vectors[np.where(data[:,-1]>0)]
+            n_predicate_vectors = predicate_vectors[np.where(np.abs(data[:,-1])<1e-10)]
+            self.running_fitness.update(p_predicate_vectors, n_predicate_vectors)
+
+    def get_precondition_vector(self):
+        '''Returns the precondition vector learned from the data seen so far
+        (None if no positive data items have been seen).
+        '''
+        if self.precondition_state is None:
+            return None
+
+        precondition_vector = np.array(self.precondition_state)
         precondition_vector[np.where(precondition_vector==-1)[0]] = 0
+        return precondition_vector
+
+    def get_fitness(self):
+        '''Returns the fitness of the current precondition vector on the data seen so far
+        (None if the fitness can't be computed from running statistics or no positive data items have been seen).
+        '''
+        precondition_vector = self.get_precondition_vector()
+        if self.running_fitness is None or precondition_vector is None:
+            return None
+        return self.running_fitness.fitness(precondition_vector)
+
+    def learn_rules_from_stream(self, data_chunks, object_extraction_cb, predicate_calculation_cb, update_cb=None):
+        '''Learns a precondition vector from a stream of data chunks (e.g. the chunks generated by 'global_utils.follow_log_data'),
+        such that only a single chunk of data is kept in memory at a time. Returns the precondition vector learned from all chunks.
+
+        Keyword arguments:
+        data_chunks -- An iterable of 2D 'numpy' arrays in which each row is a single data item.
+        object_extraction_cb -- Function that extracts the objects of all data items at once
+                                (e.g. 'global_utils.extract_object_arrays').
+        predicate_calculation_cb -- Function that calculates a predicate matrix from the extracted objects
+                                    (e.g. 'global_utils.calculate_predicate_matrix').
+        update_cb -- Function called with the current precondition vector and its
+                     fitness (as returned by 'self.get_fitness') after each chunk (default None).
+
+        '''
+        for data in data_chunks:
+            self.partial_fit(data, object_extraction_cb, predicate_calculation_cb)
+            if update_cb is not None:
+                update_cb(self.get_precondition_vector(), self.get_fitness())
+        return self.get_precondition_vector()
+
+    def learn_rules(self, data, object_extraction_cb, predicate_calculation_cb, gt_data=None):
+        self.reset()
+        self.partial_fit(data, object_extraction_cb, predicate_calculation_cb)
+        precondition_vector = self.get_precondition_vector()
 
         if not self.debug:
             return precondition_vector
         else:
-            p_predicate_vectors, n_predicate_vectors = self._convert_data(data, object_extraction_cb, predicate_calculation_cb)
-            fitness = self.vector_fitness_cb(p_predicate_vectors, n_predicate_vectors, np.array(precondition_vector, dtype=np.int32))
+            fitness = self.get_fitness()
+            if fitness is None:
+                p_predicate_vectors, n_predicate_vectors = self._convert_data(data, object_extraction_cb, predicate_calculation_cb)
+                fitness = self.vector_fitness_cb(p_predicate_vectors, n_predicate_vectors, np.array(precondition_vector, dtype=np.int32))
             if gt_data is None:
                 return precondition_vector, fitness
             else:
                 gt_p_predicate_vectors, gt_n_predicate_vectors = self._convert_data(gt_data, object_extraction_cb, predicate_calculation_cb)
                 gt_fitness = self.vector_fitness_cb(gt_p_predicate_vectors, gt_n_predicate_vectors, np.array(precondition_vector, dtype=np.int32))
                 return precondition_vector, fitness, gt_fitness
+
+
+def _get_runs(run_count, seed):
+    '''Returns a list of (run index, seed) tuples for 'run_count' independent learning runs;
+    the run seeds are derived from 'seed' (or from the global 'numpy' random state if 'seed' is None),
+    such that the results don't depend on the number of processes that execute the runs.
+    '''
+    rng = np.random
+    if seed is not None:
+        rng = np.random.RandomState(seed)
+    run_seeds = rng.randint(0, 2**31 - 1, run_count)
+    return [(i, run_seed) for i, run_seed in enumerate(run_seeds)]
+
+
+def _run_learning_problem(set_learning_problem, learning_problem, run_function, runs, processes):
+    '''Returns a list with the results of 'run_function' for each element of 'runs';
+    the runs are executed by a pool of 'processes' processes (all CPUs if None), each of which
+    creates the learning algorithm by calling 'set_learning_problem' with 'learning_problem' when it is started.
+    '''
+    if processes is None:
+        processes = cpu_count()
+    processes = min(processes, len(runs))
+
+    if processes <= 1:
+        set_learning_problem(learning_problem)
+        try:
+            results = map(run_function, runs)
+        finally:
+            _clear_learning_problem()
+    else:
+        #the learning problem only contains data and picklable references to the fitness callbacks,
+        #so the workers can be started with any start method (the data are sent once per worker rather than with each run)
+        pool = Pool(processes, initializer=set_learning_problem, initargs=(learning_problem,))
+        try:
+            results = pool.map(run_function, runs)
+        finally:
+            pool.close()
+            pool.join()
+    return results
+
+
+def _set_optimisation_problem(learning_problem):
+    '''Creates the 'RuleFinder' of a 'RuleOptimiser' from 'learning_problem', a tuple
+    (positive vectors, negative vectors, dictionary of 'RuleFinder.learn_precondition_vector' arguments).
+    '''
+    global _learning_problem
+    p_predicate_vectors, n_predicate_vectors, learning_parameters = learning_problem
+    learning_parameters = dict(learning_parameters)
+    learning_parameters['fitness_callback'] = FitnessFunctionLibrary.get_callback(learning_parameters['fitness_callback'])
+    learning_parameters['evaluation_fitness_cb'] = FitnessFunctionLibrary.get_callback(learning_parameters['evaluation_fitness_cb'])
+    _learning_problem = (RuleFinder(p_predicate_vectors, n_predicate_vectors), learning_parameters)
+
+
+def _set_evolution_problem(learning_problem):
+    '''Creates the 'Evolver' of a 'RuleEvolver' from 'learning_problem', a tuple (positive vectors, negative vectors,
+    population size, gene length, object count, training fitness callback reference, generation count).
+    '''
+    global _learning_problem
+    p_predicate_vectors, n_predicate_vectors, population_size, gene_length, object_count, training_fitness_cb, generation_count = learning_problem
+    rule_evolver = Evolver(p_predicate_vectors, n_predicate_vectors, population_size, gene_length, object_count)
+    _learning_problem = (rule_evolver, FitnessFunctionLibrary.get_callback(training_fitness_cb), generation_count)
+
+
+def _clear_learning_problem():
+    global _learning_problem
+    _learning_problem = None
+
+
+def _find_precondition_vector(run):
+    '''Runs a single hill climbing restart of a 'RuleOptimiser' and returns the learned precondition vector.
+    '''
+    run_idx, seed = run
+    print run_idx+1
+    rule_finder, learning_parameters = _learning_problem
+    rule_finder.rng = np.random.RandomState(seed)
+    precondition_vector,_ = rule_finder.learn_precondition_vector(**learning_parameters)
+    return precondition_vector
+
+
+def _evolve_population(run):
+    '''Evolves a single population of a 'RuleEvolver' and returns a tuple (final population, fitness per generation).
+    '''
+    run_idx, seed = run
+    print run_idx+1
+    rule_evolver, training_fitness_cb, generation_count = _learning_problem
+    rule_evolver.rng = np.random.RandomState(seed)
+    return rule_evolver.evolve(training_fitness_cb, generation_count)
@@ -17,6 +17,7 @@
     along with delta-execution-models. If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import numpy as np
 from shapely.geometry import Polygon
 from conversion import TypeConverter, Types
 
@@ -97,3 +98,123 @@ class PredicateLibrary(object):
     def po(b_box1, b_box2, return_type=Types.BOOL):
         obj1, obj2 = PredicateLibrary.create_polygons(b_box1, b_box2)
         return TypeConverter.return_correct_type(obj1.intersects(obj2) and not obj1.within(obj2) and not obj2.within(obj1), return_type)
+
+
+class BatchPredicateLibrary(object):
+    '''An interface to vectorised versions of the predicates in 'PredicateLibrary'.
+
+    Each predicate takes two arrays of bounding boxes of shape (..., 6),
+    where the last axis stores (min_x, min_y, min_z, max_x, max_y, max_z),
+    and returns a boolean array of shape (...). The region connection predicates
+    are expressed as interval comparisons between the x-y projections of the boxes,
+    which gives the same results as the polygon operations in 'PredicateLibrary'
+    as long as the projections are not degenerate (see 'is_degenerate').
+
+    Author -- Alex Mitrevski
+
+    '''
+    @staticmethod
+    def get_intervals(b_boxes):
+        '''Returns the x and y intervals covered by the x-y projections of 'b_boxes'.
+
+        Keyword arguments:
+        b_boxes -- A 'numpy' array of bounding boxes of shape (..., 6).
+
+        '''
+        x_min = np.minimum(b_boxes[...,0], b_boxes[...,3])
+        x_max = np.maximum(b_boxes[...,0], b_boxes[...,3])
+        y_min = np.minimum(b_boxes[...,1], b_boxes[...,4])
+        y_max = np.maximum(b_boxes[...,1], b_boxes[...,4])
+        return x_min, x_max, y_min, y_max
+
+    @staticmethod
+    def is_degenerate(b_boxes):
+        '''Returns True for the boxes whose x-y projections have no area;
+        'PredicateLibrary' should be used for such boxes.
+
+        Keyword arguments:
+        b_boxes -- A 'numpy' array of bounding boxes of shape (..., 6).
+
+        '''
+        x_min, x_max, y_min, y_max = BatchPredicateLibrary.get_intervals(b_boxes)
+        return np.logical_not(np.logical_and(x_min < x_max, y_min < y_max))
+
+    @staticmethod
+    def within(b_boxes1, b_boxes2):
+        x1_min, x1_max, y1_min, y1_max = BatchPredicateLibrary.get_intervals(b_boxes1)
+        x2_min, x2_max, y2_min, y2_max = BatchPredicateLibrary.get_intervals(b_boxes2)
+        return (x2_min <= x1_min) & (x1_max <= x2_max) & (y2_min <= y1_min) & (y1_max <= y2_max)
+
+    @staticmethod
+    def equals(b_boxes1, b_boxes2):
+        x1_min, x1_max, y1_min, y1_max = BatchPredicateLibrary.get_intervals(b_boxes1)
+        x2_min, x2_max, y2_min, y2_max = BatchPredicateLibrary.get_intervals(b_boxes2)
+        return (x1_min == x2_min) & (x1_max == x2_max) & (y1_min == y2_min) & (y1_max == y2_max)
+
+    @staticmethod
+    def intersects(b_boxes1, b_boxes2):
+        x1_min, x1_max, y1_min, y1_max = BatchPredicateLibrary.get_intervals(b_boxes1)
+        x2_min, x2_max, y2_min, y2_max = BatchPredicateLibrary.get_intervals(b_boxes2)
+        return (x1_min <= x2_max) & (x2_min <= x1_max) & (y1_min <= y2_max) & (y2_min <= y1_max)
+
+    @staticmethod
+    def interiors_intersect(b_boxes1, b_boxes2):
+        x1_min, x1_max, y1_min, y1_max = BatchPredicateLibrary.get_intervals(b_boxes1)
+        x2_min, x2_max, y2_min, y2_max = BatchPredicateLibrary.get_intervals(b_boxes2)
+        return (x1_min < x2_max) & (x2_min < x1_max) & (y1_min < y2_max) & (y2_min < y1_max)
+
+    @staticmethod
+    def on(b_boxes1, b_boxes2):
+        return np.abs(b_boxes1[...,2] - b_boxes2[...,5]) < 1e-5
+
+    @staticmethod
+    def onTable(b_boxes1, b_boxes2):
+        return np.abs(b_boxes1[...,2] - b_boxes2[...,2]) < 5
+
+    @staticmethod
+    def leftOf(b_boxes1, b_boxes2):
+        return b_boxes1[...,3] < b_boxes2[...,0]
+
+    @staticmethod
+    def rightOf(b_boxes1, b_boxes2):
+        return b_boxes1[...,0] > b_boxes2[...,3]
+
+    @staticmethod
+    def above(b_boxes1, b_boxes2):
+        return b_boxes1[...,2] > b_boxes2[...,5]
+
+    @staticmethod
+    def below(b_boxes1, b_boxes2):
+        return b_boxes1[...,5] < b_boxes2[...,2]
+
+    @staticmethod
+    def behind(b_boxes1, b_boxes2):
+        return b_boxes1[...,4] < b_boxes2[...,1]
+
+    @staticmethod
+    def inFrontOf(b_boxes1, b_boxes2):
+        return b_boxes1[...,1] > b_boxes2[...,4]
+
+    @staticmethod
+    def ntpp(b_boxes1, b_boxes2):
+        return BatchPredicateLibrary.within(b_boxes1, b_boxes2) & ~BatchPredicateLibrary.equals(b_boxes1, b_boxes2)
+
+    @staticmethod
+    def ntppi(b_boxes1, b_boxes2):
+        return BatchPredicateLibrary.within(b_boxes2, b_boxes1) & ~BatchPredicateLibrary.equals(b_boxes1, b_boxes2)
+
+    @staticmethod
+    def ec(b_boxes1, b_boxes2):
+        return BatchPredicateLibrary.intersects(b_boxes1, b_boxes2) & ~BatchPredicateLibrary.interiors_intersect(b_boxes1, b_boxes2)
+
+    @staticmethod
+    def dc(b_boxes1, b_boxes2):
+        return ~BatchPredicateLibrary.intersects(b_boxes1, b_boxes2)
+
+    @staticmethod
+    def eq(b_boxes1, b_boxes2):
+        return BatchPredicateLibrary.equals(b_boxes1, b_boxes2)
+
+    @staticmethod
+    def po(b_boxes1, b_boxes2):
+        return BatchPredicateLibrary.intersects(b_boxes1, b_boxes2) & ~BatchPredicateLibrary.within(b_boxes1, b_boxes2) & ~BatchPredicateLibrary.within(b_boxes2, b_boxes1)